@@ -4,9 +4,8 @@ different combinations, relations, and formats of data from the database.
 """
 from peewee import *
 from mpl_toolkits.basemap import Basemap, pyproj
-from datetime import date,datetime
 from orm.icoads_data_tables import *
-from icoads3.create_dictionary import load_yearly_intervals
+from icoads3 import pentad_calendar
 import numpy as np
 import matplotlib.pyplot as plt
 import math
@@ -20,8 +19,80 @@ import pickle
 writing = False #  FLAG FOR OCEAN_BOX_TABLES
 # ---------------  
 from orm.ocean_box_tables import *
+from orm.column_store import ColumnStore, store_location, year_range
+from orm.obs_summary import summary_exists, summary_values
+from orm.scaled_values import value_sql, value_between, stored_bounds
+from orm.obs_partitions import obs_source, obs_tables, obs_scales
+from orm.spatial_index import position_source
+from orm.box_keys import box_key, box_indices, name_key, name_keys, box_name
+from orm.day_numbers import day_number, day_dates
+from orm.query_params import Params
 from merge_box_obs import box_lookup
 
+# columnar store read by the analysis functions in place of the obsdata table,
+# None to query the table, see use_column_store()
+column_store = None
+
+def use_column_store(location=store_location):
+    """Read observations from the columnar store at location, see 
+    'orm/column_store.py', or from the obsdata table again if location is None.
+    Results then come back as NumPy arrays.
+    """
+    global column_store
+    column_store = ColumnStore(location) if location else None
+
+# aggregates of whole years answered from the summary table, when built, see
+# use_summary()
+summary = True
+
+def use_summary(on=True):
+    """Answer aggregates of whole years, e.g., mean_sst_by_year(), from the 
+    summary of observations per box, year and pentad, see 
+    'orm/obs_summary.py', or always from the observations if not on.
+    """
+    global summary
+    summary = on
+
+def summary_ready():
+    """Whether the summary table answers the aggregates."""
+    return summary and summary_exists(db_box)
+
+def obs_values():
+    """SQL expressions of the float values of obsdata, lon_obs, lat_obs and
+    sst, whether the tables store them as scaled integers or not, see 
+    'orm/scaled_values.py'.  Used as format fields of the queries, whose
+    obsdata tables are those of the requested years, see obs_source() in
+    'orm/obs_partitions.py'.
+    """
+    scales = obs_scales(db_box)
+    return dict((c,value_sql(c,scales)) for c in ('lon_obs','lat_obs','sst'))
+
+def box_sql(names,params):
+    """SQL condition on the box key of obsdata, for a box name or a list of
+    names, e.g., 'box = ?', see 'orm/box_keys.py'.  The keys are added to 
+    params, see 'orm/query_params.py'.
+    """
+    keys = name_keys(names)
+    if len(keys) == 1:
+        return 'box = {}'.format(params(keys[0]))
+    return 'box in {}'.format(params.set(keys))
+
+def date_years(dates):
+    """Years of datetime64 dates as strings, like strftime('%Y',date)."""
+    return (dates.astype('datetime64[Y]').astype(int)+1970).astype(str)
+
+def store_yearly_means(names,years,pentads=None):
+    """Mean sst, number of observations and year, for each year with data in 
+    the columnar store.
+    """
+    avg_ssts,counts,yrs = list(),list(),list()
+    for year,cols in column_store.partitions(years,names,pentads,['sst']):
+        if cols['sst'].size:
+            avg_ssts.append(cols['sst'].mean())
+            counts.append(cols['sst'].size)
+            yrs.append(str(year))
+    return np.array(avg_ssts),np.array(counts),np.array(yrs)
+
 def pickle_list(lst,file='save.p'):
     pickle.dump(lst, open( file, "wb" ) )
 
@@ -30,22 +101,11 @@ def load_pickle_list(file='save.p'):
 
 def conv_pent_hmth(pentad):
     """Input pentad, output the corresponding half month."""
-    pentad = str(pentad)
-    d = load_yearly_intervals()
-    # print(d,'\n')
-    for month in d:
-        for hmth in d[month]:
-            if pentad in d[month][hmth]['pentads']:
-                return hmth
+    return int(pentad_calendar.pentad_half_months(int(pentad)))
 
 def conv_hmth_pentad(hmonth):
     """Input half-month, return set of corresponding pentads."""
-    hmonth = str(hmonth)
-    d = load_yearly_intervals()
-    for month in d:
-        for hmth in d[month]:
-            if hmth == hmonth:
-                return(d[month][hmth]['pentads'])
+    return pentad_calendar.half_month_pentads(hmonth)
 
 def str_fmt_join(variable,delimit="','"):
     """Simple string formatting code for joining strings for reuse in sql
@@ -68,53 +128,73 @@ def process_years(years):
     date_max = str(years[1])+'-12-31'
     return date_min,date_max
 
+def process_days(years):
+    """First and last day numbers of years, see process_years() and 
+    'orm/day_numbers.py'.
+    """
+    return tuple(day_number(d) for d in process_years(years))
+
 def box_sst_data(names,years,pentads=None):
     """Get all data for box in the years specified."""
-    date_min,date_max = process_years(years)
-    sql = "select lon_obs,lat_obs,sst,date "\
-    + "from obsdata "\
-    + "where name in ('{}') ".format(str_fmt_join(names))\
-    + "and date between '{}' and '{}' ".format(date_min,date_max)
+    if column_store:
+        cols = column_store.select(years,names,pentads,
+            ['lon','lat','sst','date'])
+        return cols['lon'],cols['lat'],cols['sst'],cols['date']
+    day_min,day_max = process_days(years)
+    params = Params()
+    sql = "select {lon_obs},{lat_obs},{sst},day ".format(**obs_values())\
+    + "from {} ".format(obs_source(db_box,years))\
+    + "where {} ".format(box_sql(names,params))\
+    + "and day between {} and {} ".format(params(day_min),params(day_max))
     if pentads:
-        sql = sql + "and pentad in ('{}') ".format(str_fmt_join(pentads))    
+        sql = sql + "and pentad in {} ".format(params.set(pentads))
     sql = sql + ";"
     # print(sql)
     try:
-        lon_obs,lat_obs,sst,date = zip(*db_box.execute_sql(sql))
+        lon_obs,lat_obs,sst,days = zip(*db_box.execute_sql(sql,params.values))
     except:
-        lon_obs,lat_obs,sst,date = list(),list(),list(),list()
-    return lon_obs,lat_obs,sst,date
+        lon_obs,lat_obs,sst,days = list(),list(),list(),list()
+    return lon_obs,lat_obs,sst,day_dates(days)
 
 def data_locations(name,years):
     """Get locations of data for in a box in a given range of years."""
-    date_min,date_max = process_years(years)
-    sql = "select lon_obs,lat_obs "\
-    + "from obsdata "\
-    + "where name = '{}' ".format(name)\
-    + "and date between '{}' and '{}' ".format(date_min,date_max)\
+    if column_store:
+        cols = column_store.select(years,name,columns=['lon','lat'])
+        return cols['lon'],cols['lat']
+    day_min,day_max = process_days(years)
+    params = Params()
+    sql = "select {lon_obs},{lat_obs} ".format(**obs_values())\
+    + "from {} ".format(obs_source(db_box,years))\
+    + "where {} ".format(box_sql(name,params))\
+    + "and day between {} and {} ".format(params(day_min),params(day_max))\
     + ";"
     # print(sql)
     try:
-        lon_obs,lat_obs = zip(*db_box.execute_sql(sql))
+        lon_obs,lat_obs = zip(*db_box.execute_sql(sql,params.values))
     except:
         lon_obs,lat_obs = list(),list()
     return lon_obs,lat_obs
 
 def sst_year_hmonth(name,years):
-    date_min,date_max = process_years(years)
-    sql = "select sst, strftime('%Y',date), pentad "\
-    + "from obsdata "\
-    + "where name = '{}' ".format(name)\
-    + "and date between '{}' and '{}' ".format(date_min,date_max)
-    sql = sql + "order by strftime('%Y',date);"
+    if column_store:
+        cols = column_store.select(years,name,columns=['sst','date','pentad'])
+        hmonths = pentad_calendar.pentad_half_months(cols['pentad']).tolist()
+        return cols['sst'],date_years(cols['date']),hmonths
+    day_min,day_max = process_days(years)
+    params = Params()
+    sql = "select {sst}, cast(year as text), pentad ".format(**obs_values())\
+    + "from {} ".format(obs_source(db_box,years))\
+    + "where {} ".format(box_sql(name,params))\
+    + "and day between {} and {} ".format(params(day_min),params(day_max))
+    sql = sql + "order by year;"
     # print(sql)
-    ssts,yrs,pentads= zip(*db_box.execute_sql(sql))
-    hmonths = [conv_pent_hmth(int(p)) for p in pentads]
+    ssts,yrs,pentads= zip(*db_box.execute_sql(sql,params.values))
+    hmonths = pentad_calendar.pentad_half_months(pentads).tolist()
     return ssts,yrs,hmonths
 
 def mean_sst_by_half_month(name, years):
-    """If half-month data not in database (currently it is not, 10/5/2016),
-    get half months from the pentad information.
+    """Half months are taken from the pentad information, since databases
+    loaded before half_mth was filled during ingest have it null.
 
     Returns:
         years of the series
@@ -158,59 +238,93 @@ def mean_sst_by_year(names,years,pentads=None):
     """Gives avg sst series for specified year, as well as number of obs per 
     year.  Optionally, can specify the pentad.
     """
-    date_min,date_max = process_years(years)
+    if column_store:
+        return store_yearly_means(names,years,pentads)
+    params = Params()
+    if summary_ready():
+        first,last = year_range(years)
+        sql = "select {mean}, {count}, cast(year as text) ".format(
+            **summary_values())\
+        + "from obssummary "\
+        + "where {} ".format(box_sql(names,params))\
+        + "and year between {} and {} ".format(params(first),params(last))
+        if pentads:
+            sql = sql + "and pentad in {} ".format(params.set(pentads))
+        sql = sql + "group by year;"
+        avg_ssts,counts,yrs = zip(*db_box.execute_sql(sql,params.values))
+        return avg_ssts,counts,yrs
+    day_min,day_max = process_days(years)
     # if names:
     if isinstance(names,str):
         names = [names]
-    name_query = " and name in ('{}') ".format(str_fmt_join(names))
 
-    sql = "select avg(sst), count(*), strftime('%Y',date) "\
-    + "from obsdata "\
-    + "where name in ('{}') ".format(str_fmt_join(names))\
-    + "and date between '{}' and '{}' ".format(date_min,date_max)
+    sql = "select avg({sst}), count(*), cast(year as text) ".format(
+        **obs_values())\
+    + "from {} ".format(obs_source(db_box,years))\
+    + "where {} ".format(box_sql(names,params))\
+    + "and day between {} and {} ".format(params(day_min),params(day_max))
     if pentads:
-        sql = sql + "and pentad in ({}) ".format(','.join(map(str,pentads)))
-    sql = sql + "group by strftime('%Y',date);"
+        sql = sql + "and pentad in {} ".format(params.set(pentads))
+    sql = sql + "group by year;"
     # print(sql)
-    avg_ssts,counts,yrs= zip(*db_box.execute_sql(sql))
+    avg_ssts,counts,yrs= zip(*db_box.execute_sql(sql,params.values))
     return avg_ssts,counts,yrs
 
 def mean_sst_by_pentad(names,years):
     """Retrieve avg(sst) for each pentad over the specified years.  Can specify
     'name' fields to focus on a specific box.
     """
-    date_min,date_max = process_years(years)
+    if column_store:
+        # sums and counts by pentad, accumulated year by year
+        sums,counts = np.zeros(74),np.zeros(74,dtype=np.int64)
+        for year,cols in column_store.partitions(years,names or None,
+                columns=['pentad','sst']):
+            sums += np.bincount(cols['pentad'],cols['sst'],minlength=74)
+            counts += np.bincount(cols['pentad'],minlength=74)
+        pentads = np.flatnonzero(counts)
+        return pentads,sums[pentads]/counts[pentads]
+    day_min,day_max = process_days(years)
+    if isinstance(names,str):
+        names = [names]
+    params = Params()
+    if summary_ready():
+        first,last = year_range(years)
+        sql = "select pentad, {mean} ".format(**summary_values())\
+        + "from obssummary "\
+        + "where year between {} and {} ".format(params(first),params(last))
+        if names:
+            sql = sql + " and {} ".format(box_sql(names,params))
+        sql = sql + "group by pentad;"
+        pentads, avg_ssts = zip(*db_box.execute_sql(sql,params.values))
+        return pentads,avg_ssts
+    sql = "select pentad, avg({sst}) ".format(**obs_values())\
+    + "from {} ".format(obs_source(db_box,years))\
+    + "where day between {} and {} ".format(params(day_min),params(day_max))
     if names:
-        if isinstance(names,str):
-            names = [names]
-        name_query = " and name in ('{}') ".format("','".join(names))
-    else:
-        name_query = ''
-    sql = "select pentad, avg(sst) "\
-    + "from obsdata "\
-    + "where date between '{}' and '{}' ".format(date_min,date_max)\
-    + name_query \
-    + "group by pentad;"
+        sql = sql + " and {} ".format(box_sql(names,params))
+    sql = sql + "group by pentad;"
     # print(sql)
-    pentads, avg_ssts = zip(*db_box.execute_sql(sql))
+    pentads, avg_ssts = zip(*db_box.execute_sql(sql,params.values))
     return pentads,avg_ssts
 
 def all_sst_by_pentad(years,name=None):
     """Retrieve sst data for each pentad over the specified years.  Can specify
     'name' fields to focus on a specific box.
     """
-    date_min,date_max = process_years(years)
+    if column_store:
+        cols = column_store.select(years,name or None,
+            columns=['pentad','sst'])
+        return cols['pentad'],cols['sst']
+    day_min,day_max = process_days(years)
+    params = Params()
+    sql = "select pentad, {sst} ".format(**obs_values())\
+    + "from {} ".format(obs_source(db_box,years))\
+    + "where day between {} and {} ".format(params(day_min),params(day_max))
     if name:
-        name_query = " and name = '{}' ".format(name)
-    else:
-        name_query = ''
-    sql = "select pentad, sst "\
-    + "from obsdata "\
-    + "where date between '{}' and '{}' ".format(date_min,date_max)\
-    + name_query \
-    + ';'
+        sql = sql + " and {} ".format(box_sql(name,params))
+    sql = sql + ';'
     # print(sql)
-    pentads, all_ssts = zip(*db_box.execute_sql(sql))
+    pentads, all_ssts = zip(*db_box.execute_sql(sql,params.values))
     return pentads,all_ssts
 
 def sst_spread_by_pentad(years,name=None):
@@ -223,17 +337,36 @@ def dense_boxes(years,limit=10):
     """Retrieve boxes in order of most populated to least populated with 
     data.
     """
-    date_min,date_max = process_years(years)
-    sql = "select name, count(name) "\
-    + "from obsdata "\
-    + "where date between '{}' and '{}' ".format(date_min,date_max)\
-    + "group by name "\
-    + "having count(name) > 0 "\
-    + "order by count(name) desc "\
-    + "limit {};".format(limit)
+    if column_store:
+        counts = np.zeros(len(column_store.names),dtype=np.int64)
+        for year,cols in column_store.partitions(years,columns=['name']):
+            counts += np.bincount(cols['name'],minlength=counts.size)
+        codes = np.argsort(-counts,kind='stable')[:limit]
+        codes = codes[counts[codes] > 0]
+        return column_store.decode_names(codes),counts[codes]
+    params = Params()
+    if summary_ready():
+        first,last = year_range(years)
+        sql = "select box, {count} ".format(**summary_values())\
+        + "from obssummary "\
+        + "where year between {} and {} ".format(params(first),params(last))\
+        + "group by box "\
+        + "having {count} > 0 order by {count} desc ".format(
+            **summary_values())\
+        + "limit {};".format(params(limit))
+        keys, counts = zip(*db_box.execute_sql(sql,params.values))
+        return box_name(keys), counts
+    day_min,day_max = process_days(years)
+    sql = "select box, count(box) "\
+    + "from {} ".format(obs_source(db_box,years))\
+    + "where day between {} and {} ".format(params(day_min),params(day_max))\
+    + "group by box "\
+    + "having count(box) > 0 "\
+    + "order by count(box) desc "\
+    + "limit {};".format(params(limit))
     # print(sql)
-    name, counts = zip(*db_box.execute_sql(sql))
-    return name, counts
+    keys, counts = zip(*db_box.execute_sql(sql,params.values))
+    return box_name(keys), counts
 
 def haversine(lon1,lat1,lon2,lat2):
     """Same function as in earth_angle_calcs.
@@ -256,31 +389,42 @@ def radius_stats(radius,name,years,pentad=None):
     # Find center of box
     sql_center = "select box_center_lon,box_center_lat "\
     + "from box "\
-    + "where name = '{}';".format(name)
-    lon1,lat1 = list(db_box.execute_sql(sql_center))[0]
+    + "where box_id = ?;"
+    lon1,lat1 = list(db_box.execute_sql(sql_center,(name_key(name),)))[0]
     
     # Narrow search range for observations within radius
     zonal_dist = 111.19 # 111.19 km at equator corresponds 1 degree
     zonal_dist = 0.9 * zonal_dist # increase search a little
     degrees = radius/zonal_dist
 
-    # Find nearby data
-    sql = "select name,lon_obs,lat_obs,sst,date,pentad "\
-    + "from obsdata "\
+    # Find nearby data; conditions on the stored columns, so indexes apply.
+    # Candidates from the R*Trees of the positions, if built, see 
+    # 'orm/spatial_index.py'
+    scales = obs_scales(db_box)
+    params = Params()
+    source = position_source(db_box,obs_tables(db_box,years),
+        stored_bounds('lat_obs',lat1-degrees,lat1+degrees,scales),
+        stored_bounds('lon_obs',lon1-degrees,lon1+degrees,scales),params)
+    sql = "select box,{lon_obs},{lat_obs},{sst},day,pentad ".format(
+        **obs_values())\
+    + "from {} ".format(source or obs_source(db_box,years))\
     + "where ("\
-    + "  strftime('%Y',date) between '{}' and '{}' ".format(years[0],years[1])\
-    + "  and lon_obs between {} and {} ".format(lon1-degrees,lon1+degrees)\
-    + "  and lat_obs between {} and {} ".format(lat1-degrees,lat1+degrees)
+    + "  day between {} and {} ".format(*map(params,process_days(years)))\
+    + "  and {} ".format(value_between('lon_obs',lon1-degrees,lon1+degrees,
+        scales,params))\
+    + "  and {} ".format(value_between('lat_obs',lat1-degrees,lat1+degrees,
+        scales,params))
     if pentad:
-        sql = sql + " and pentad = {} ".format(pentad)
+        sql = sql + " and pentad = {} ".format(params(int(pentad)))
     sql = sql + ") "\
     + ";"
     # Add data to output
     results = list()
-    for data in db_box.execute_sql(sql):
+    for data in db_box.execute_sql(sql,params.values):
         distance = haversine(lon1,lat1,data[1],data[2])
         if distance <= radius:
-            results.append(data)
+            results.append((box_name(data[0]),)+tuple(data[1:4])
+                +(np.datetime64(data[4],'D'),data[5]))
     return results
 
 def radius_stat_profiles(name,years,pentad=None,magnitudes=(0,4),filename=None):
@@ -315,17 +459,18 @@ def box_centers(names):
     return its box center coordinates, (lon,lat), and the box name.
     """
     if isinstance(names,(list,tuple)):
-        sql = "select box_center_lon,box_center_lat "\
-        + "from box where name in ('{}'); ".format("','".join(names))
+        params = Params()
+        sql = "select box_id,box_center_lon,box_center_lat "\
+        + "from box where box_id in {}; ".format(params.set(name_keys(names)))
         # print(sql)
         output = list()
-        for center,name in zip(db_box.execute_sql(sql),names):
-            output.append((center[0],center[1],name))
+        for key,lon,lat in db_box.execute_sql(sql,params.values):
+            output.append((lon,lat,box_name(key)))
         return output
     else:    
         sql = "select box_center_lon,box_center_lat,box_side "\
-        + "from box where name = '{}'; ".format(names)
-        c_lon,c_lat,box_size = zip(*db_box.execute_sql(sql))
+        + "from box where box_id = ?; "
+        c_lon,c_lat,box_size = zip(*db_box.execute_sql(sql,(name_key(names),)))
         return c_lon[0],c_lat[0],box_size[0]
 
 def boxes_within_radius(center,radius):
@@ -333,7 +478,7 @@ def boxes_within_radius(center,radius):
     box.  The distance is the great circle between the centers.
     """
     # center box indices
-    c_ilat,c_ilon = map(int,center.split('_'))
+    c_ilat,c_ilon = box_indices(name_key(center))
     # retrieve center coords of center box
     c_lon,c_lat,box_size = box_centers(center)
     # box size in km
@@ -346,7 +491,7 @@ def boxes_within_radius(center,radius):
     search_boxes = list()
     for i_lat in i_lats:
         for i_lon in i_lons:
-            search_boxes.append("{}_{}".format(i_lat,i_lon))
+            search_boxes.append(box_key(i_lat,i_lon))
     # find boxes within given radius
     near_boxes = list()
     for center in box_centers(search_boxes):
@@ -457,46 +602,79 @@ def yearly_data_time_series(name,years,hmonth=None,month=None,pentads=None):
     For example, find the SST average for the month of January for every year 
     between 1861-1870.
     """
-    date_min,date_max = process_years(years)
+    day_min,day_max = process_days(years)
     if hmonth:
         pentads = conv_hmth_pentad(hmonth)
-    sql = "select avg(sst), count(sst), strftime('%Y',date) from obsdata "\
-    + "where name = '{}' ".format(name)\
-    + "and pentad between {} and {} ".format(pentads[0],pentads[-1])\
-    + "and date between '{}' and '{}' ".format(date_min,date_max)\
-    + "group by strftime('%Y',date);"
+    if column_store:
+        return store_yearly_means(name,years,
+            list(range(pentads[0],pentads[-1]+1)))
+    params = Params()
+    if summary_ready():
+        first,last = year_range(years)
+        sql = "select {mean}, {count}, cast(year as text) ".format(
+            **summary_values())\
+        + "from obssummary "\
+        + "where {} ".format(box_sql(name,params))\
+        + "and pentad between {} and {} ".format(params(pentads[0]),
+            params(pentads[-1]))\
+        + "and year between {} and {} ".format(params(first),params(last))\
+        + "group by year;"
+        avg_ssts,counts,yrs = zip(*db_box.execute_sql(sql,params.values))
+        return avg_ssts,counts,yrs
+    sql = "select avg({sst}), count(sst), cast(year as text) ".format(
+        **obs_values())\
+    + "from {} ".format(obs_source(db_box,years))\
+    + "where {} ".format(box_sql(name,params))\
+    + "and pentad between {} and {} ".format(params(pentads[0]),
+        params(pentads[-1]))\
+    + "and day between {} and {} ".format(params(day_min),params(day_max))\
+    + "group by year;"
     # print(sql)
-    avg_ssts,counts,yrs = zip(*db_box.execute_sql(sql))
+    avg_ssts,counts,yrs = zip(*db_box.execute_sql(sql,params.values))
     return avg_ssts,counts,yrs
 
 def single_box_dist(name, years):
     """Simple returns coordinates of all data in given box in a given range of
     years.
     """
-    years = process_years(years)
-    sql = "select lon_obs,lat_obs from obsdata "\
-    + "where name = '{}' ".format(name)\
-    + "and date between '{}' and '{}' ".format(*years)\
+    if column_store:
+        cols = column_store.select(years,name,columns=['lon','lat'])
+        return cols['lon'],cols['lat']
+    days = process_days(years)
+    params = Params()
+    sql = "select {lon_obs},{lat_obs} from {obsdata} ".format(
+        obsdata=obs_source(db_box,years),**obs_values())\
+    + "where {} ".format(box_sql(name,params))\
+    + "and day between {} and {} ".format(*map(params,days))\
     + ";"
-    lons,lats = zip(*db_box.execute_sql(sql))
+    lons,lats = zip(*db_box.execute_sql(sql,params.values))
     return lons, lats
 
 def plain_time_series(name,years,hmonth=None,pentad=None):
-    date_min,date_max = process_years(years)
-    sql = "select sst, date from obsdata "\
-    + "where name = '{}' ".format(name)
+    if column_store:
+        pentads = conv_hmth_pentad(hmonth) if hmonth else None
+        if pentad:
+            pentads = [int(pentad)] if not pentads else \
+                [p for p in pentads if p == int(pentad)]
+        cols = column_store.select(years or None,name,pentads,['sst','date'])
+        return cols['sst'],cols['date']
+    day_min,day_max = process_days(years)
+    params = Params()
+    sql = "select {sst}, day from {obsdata} ".format(
+        obsdata=obs_source(db_box,years),**obs_values())\
+    + "where {} ".format(box_sql(name,params))
     if years:
-        sql = sql + "and date between '{}' and '{}' ".format(date_min,date_max)
+        sql = sql + "and day between {} and {} ".format(params(day_min),
+            params(day_max))
     if hmonth:
         pentads = conv_hmth_pentad(hmonth)
-        sql = sql + "and pentad in ({}) ".format(','.join(map(str,pentads)))
+        sql = sql + "and pentad in {} ".format(params.set(pentads))
     if pentad:
-        sql = sql + "and pentad = '{}' ".format(pentad)
-    sql = sql + "order by date;"
-    print(sql)
-    ssts,dates = zip(*db_box.execute_sql(sql))
-    dates = [datetime.strptime(date,'%Y-%m-%d').date() for date in dates ]
-    return ssts,dates
+        sql = sql + "and pentad = {} ".format(params(int(pentad)))
+    sql = sql + "order by day;"
+    # print(sql)
+    ssts,days = zip(*db_box.execute_sql(sql,params.values))
+    return ssts,day_dates(days)
 
 # def ols_by_decade(name,years):
 #     decs = decades(years)
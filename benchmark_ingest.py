@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+"""
+Ingest benchmarks on synthetic IMMA data, see 'icoads3/synthetic_imma.py'.
+
+Each step of ingest is timed on its own:
+    get_value: slicing sst, lat, lon from single lines
+    add_decimal: rebuilding decimal strings of scaled values
+    get_pentad: pentads of single dates, and pentad_calendar.pentads() of the
+        whole array of dates
+    parse: RecordLayout.parse() of a whole file, and parse_chunk(), which adds
+        the quality control checks, dates, pentads and half-months
+    insert: BulkWriter inserts of the parsed columns into an empty table
+    ingest: create_icoads_database.ingest() of the files, end to end
+Every benchmark runs 'repeat' times and the best time is kept.
+
+Results are written as JSON, one entry per benchmark with the number of items,
+seconds, and items per second, along with the run's parameters and library
+versions, so runs can be compared.
+
+Example:
+    python3 benchmark_ingest.py --lines 200000 --report bench.json
+"""
+from icoads3.synthetic_imma import write_synthetic_file
+from icoads3.imma_columns import RecordLayout, imma_dates
+from icoads3.imma_qc import BatchQC
+from icoads3 import pentad_calendar
+from orm.bulk_writer import BulkWriter
+from peewee import SqliteDatabase
+import create_icoads_database as cid
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import tempfile
+import time
+import numpy as np
+
+# synthetic months: a leap February and an ordinary month
+bench_months = [(1864,2),(1865,7)]
+
+def best_time(func,repeat):
+    """Best wall time of repeat calls of func, and its last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best,seconds)
+    return best,result
+
+def record(results,name,items,seconds,source=None):
+    results.append({'name':name, 'source':source, 'items':items,
+        'seconds':seconds,
+        'items_per_second':items/seconds if seconds else None})
+    print('{:24s} {:10d} items {:9.4f} s {:14.0f} items/s'.format(
+        name,items,seconds,items/seconds if seconds else 0))
+
+def bench_lines(results,lines,d,repeat):
+    """Per-line benchmarks: get_value and add_decimal."""
+    seconds,_ = best_time(lambda: [cid.get_value(['sst','lat','lon'],l,d)
+        for l in lines],repeat)
+    record(results,'get_value',len(lines),seconds)
+
+    values = list()
+    for key in ('SST','LAT','LON'):
+        beg,end = d[key]['position']
+        values.extend((l[beg:end].strip(),-1 if key == 'SST' else -2)
+            for l in lines)
+    seconds,_ = best_time(lambda: [cid.add_decimal(v,p) for v,p in values],
+        repeat)
+    record(results,'add_decimal',len(values),seconds)
+
+def bench_pentads(results,dates,repeat):
+    valid = dates[~np.isnat(dates)]
+    single = valid.tolist()
+    seconds,_ = best_time(lambda: [cid.get_pentad(x) for x in single],repeat)
+    record(results,'get_pentad',len(single),seconds)
+    seconds,_ = best_time(lambda: pentad_calendar.pentads(valid),repeat)
+    record(results,'pentads_vectorized',valid.size,seconds)
+
+def bench_parse(results,paths,d,repeat):
+    """Parse the files whole; returns the columns of the last one."""
+    layout = RecordLayout(cid.ingest_keys,d)
+    qc = BatchQC(d)
+    for path in paths:
+        with open(path,'rb') as f:
+            data = f.read()
+        n = data.count(b'\n')
+        buf = np.frombuffer(data,dtype=np.uint8)
+        source = os.path.basename(path)
+        seconds,_ = best_time(lambda: layout.parse(buf),repeat)
+        record(results,'parse_columns',n,seconds,source)
+        seconds,(columns,_,_) = best_time(
+            lambda: cid.parse_chunk(data,layout,qc),repeat)
+        record(results,'parse_chunk',n,seconds,source)
+    return columns
+
+def bench_insert(results,columns,workdir,repeat):
+    """Insert parsed columns into a fresh table of a scratch database."""
+    fields = cid.column_fields
+    def insert():
+        path = os.path.join(workdir,'insert.db')
+        if os.path.exists(path):
+            os.remove(path)
+        db = SqliteDatabase(path)
+        db.execute_sql('create table bench (id integer primary key, '
+            + ', '.join(fields) + ');')
+        with BulkWriter(db,'bench',fields,report=False) as writer:
+            writer.write_columns([columns[f] for f in fields])
+        db.close()
+    seconds,_ = best_time(insert,repeat)
+    record(results,'insert',columns['sst'].size,seconds)
+
+def bench_ingest(results,workdir,n_lines,repeat):
+    """End-to-end ingest of the synthetic files into a scratch database."""
+    location,database = cid.data_location,cid.db_obs.database
+    cid.data_location = workdir+'/'
+    try:
+        def ingest():
+            path = os.path.join(workdir,'ingest.db')
+            cid.db_obs.close()
+            if os.path.exists(path):
+                os.remove(path)
+            cid.db_obs.init(path)
+            cid.ingest(cid.imma_data_files())
+        seconds,_ = best_time(ingest,repeat)
+        record(results,'ingest',n_lines,seconds)
+    finally:
+        cid.db_obs.close()
+        cid.data_location = location
+        cid.db_obs.init(database)
+
+def run(lines=100000,repeat=3,line_sample=20000,seed=0,report=None):
+    """Generate synthetic files, run all benchmarks, write the report."""
+    d = cid.load_dict()
+    workdir = tempfile.mkdtemp(prefix='imma_bench_')
+    results = list()
+    try:
+        paths = [write_synthetic_file(workdir,d,yr,mo,lines,seed+i)
+            for i,(yr,mo) in enumerate(bench_months)]
+        with open(paths[0],'r',encoding='latin-1') as f:
+            sample = [l for _,l in zip(range(line_sample),f)]
+        bench_lines(results,sample,d,repeat)
+        columns = bench_parse(results,paths,d,repeat)
+        layout = RecordLayout(['yr','mo','dy'],d)
+        cols = layout.read(paths[0])
+        bench_pentads(results,imma_dates(cols['yr'],cols['mo'],cols['dy'])[0]
+            [:line_sample],repeat)
+        bench_insert(results,columns,workdir,repeat)
+        bench_ingest(results,workdir,lines*len(paths),repeat)
+    finally:
+        shutil.rmtree(workdir,ignore_errors=True)
+
+    output = {
+        'time':time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parameters':{'lines':lines, 'repeat':repeat,
+            'line_sample':line_sample, 'seed':seed, 'months':bench_months},
+        'versions':{'python':platform.python_version(),
+            'numpy':np.__version__, 'sqlite':sqlite3.sqlite_version,
+            'machine':platform.machine()},
+        'results':results}
+    if report:
+        with open(report,'w') as f:
+            json.dump(output,f,indent=1)
+    return output
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--lines',type=int,default=100000,
+        help='records per synthetic monthly file')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--line-sample',type=int,default=20000,
+        help='lines for the per-line benchmarks')
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--report',default='benchmark_report.json')
+    args = parser.parse_args()
+    run(args.lines,args.repeat,args.line_sample,args.seed,args.report)
@@ -12,22 +12,83 @@ produced in 'create_dictionary.py.'  This dictionary relies on the input from
 full list in 'R3.0-imma1_short.pdf.' To add more variables, copy and paste them
 from the latter into the former, then run 'create_dictionary.py.'
 
-Note: inefficiency in finding field position
-Positions of fields should be stored in a separate file, such as the 
-'stored_dictionary.json' file described above.  Currently, each time a field is
-requested from the input file, e.g., 'SST', the position is recalculated each 
-time, and, thus, very inefficient.
+Note: reading fields
+get_value() slices a single line and is kept for spot checks.  Ingest in main()
+reads files column by column with a RecordLayout, see 
+'icoads3/imma_columns.py', compiled once from the positions stored in
+'stored_dictionary.json'.  The layout also reaches fields in attachments.
+
+Note: memory
+Files are streamed through ingest_files() in chunks of whole lines: a read
+stage, a parse stage and a batched write stage, chained as generators.  Peak
+memory is set by max_memory, not by the size of the monthly file.
+
+Note: compressed archives
+Data files may be stored compressed, '.gz', '.bz2' or '.xz', or in tar 
+archives, e.g., yearly tarballs.  They are decompressed as they are read, on a
+background thread, see 'icoads3/imma_sources.py'.
+
+Note: quality control
+Records are checked a chunk at a time by a BatchQC, see 'icoads3/imma_qc.py':
+impossible dates, missing position or SST, and LAT, LON, SST outside the ranges
+in 'imma.txt'.  Rejections are counted by reason, and a sample of the rejected
+lines, reject_sample_rate of them, can be written to a reject log.
+
+Note: duplicates
+ICOADS releases and decks overlap.  With detect_duplicates, records whose date,
+hour, position, ID and SST were already loaded, from any file in this or an
+earlier run, are dropped, see 'icoads3/imma_duplicates.py'.
+
+Note: re-runs
+Ingest is resumable and incremental: files already loaded are recorded in the
+IngestManifest table and skipped, see plan_ingest().  update() loads whatever
+files were added to data_location since the last run.
 """
-from os import walk
+from collections import deque
+from itertools import groupby
+from multiprocessing import Pool
+from operator import itemgetter
 from orm.icoads_data_tables import *
-from icoads3.create_dictionary import load_yearly_intervals
-from datetime import date, datetime, timedelta
+from orm.bulk_writer import BulkWriter, table_name, column_names
+from icoads3 import pentad_calendar
+from icoads3.imma_columns import RecordLayout, imma_dates
+from icoads3.imma_qc import BatchQC, RejectLog, reject_reasons
+from icoads3.imma_duplicates import DuplicateIndex, record_hashes
+from icoads3 import imma_sources, imma_catalog
+from icoads3.imma_sources import background, source_chunks, seekable
+from datetime import datetime
 from dateutil import relativedelta
+import numpy as np
 import json
-import logging
+import os
 
 data_location = 'data_sets/icoads3.0.0/'
 
+# ceiling on memory used while ingesting a file, in bytes
+max_memory = 256*1024*1024
+
+# parsing a chunk of lines holds temporary arrays of several times its size,
+# see RecordLayout.parse(), so chunks are read max_memory/parse_overhead bytes
+# at a time
+parse_overhead = 16
+min_chunk_bytes = 64*1024
+
+# rows held by the bulk writer before they are written
+write_buffer_rows = 50000
+
+# IMMA fields read during ingest, columns parsed from them, and fields of 
+# IcoadsData written: the parsed columns and the manifest entry of the file;
+# hour and ID only key the duplicate hashes
+ingest_keys = ['lon','lat','sst','yr','mo','dy','hr','id']
+column_fields = ['lon','lat','sst','date','pentad','half_mth']
+ingest_fields = column_fields + ['source_file']
+
+# share of rejected lines written to the reject log, when there is one
+reject_sample_rate = 0.001
+
+# drop records already loaded, see 'icoads3/imma_duplicates.py'
+detect_duplicates = True
+
 def load_dict():
     """Load dictionary, stored_dictionary.json, of metadata according to 
     imma.txt.
@@ -89,10 +150,10 @@ def get_value(keys,line,d):
     return values
 
 def imma_data_files():
-    (_, _, filenames) = next(walk(data_location))
-    filenames = [fn for fn in filenames if '.dat' in fn]
-    filenames.sort()
-    return filenames
+    """Names of the IMMA data sources in data_location: data files, plain or
+    compressed, and data files in tar archives, see 'imma_sources.py'.
+    """
+    return imma_sources.list_sources(data_location)
 
 def icoads_data_dates(month,year):
     """From month and  year, find corresponding ICOADS data file."""
@@ -133,89 +194,397 @@ def date_span(start_mth,start_yr,end_mth,end_yr):
     return file_substrings
 
 def retrieve_data_files(start_mth,start_yr,end_mth,end_yr,filenames):
-    """Retrieve data files in the specified date range."""
+    """Retrieve data files in the specified date range.  Files are looked up
+    by the month in their name, see imma_catalog.month_key(); the first file,
+    in sorted order, of a month is taken.
+    """
+    months = dict()
+    for fn in sorted(filenames):
+        months.setdefault(imma_catalog.month_key(fn),fn)
     extraction_files = list()
-    date_strings = date_span(start_mth,start_yr,end_mth,end_yr)
-    for substring in date_strings:
-        for fn in filenames:
-            if substring in fn:
-                extraction_files.append(fn)
-                break
+    for substring in date_span(start_mth,start_yr,end_mth,end_yr):
+        month = substring[1:5]+'-'+substring[5:7]
+        if month in months:
+            extraction_files.append(months[month])
     return extraction_files
 
-def lookup_pentads(d,date):
-    """Gets pentads corresponding to 'date.'  
-    Funky piece of code:
-        
-        Months:
-        Months in the scheme do not match with normal calender months, so given
-        month may occur in the previous month, so have to search in previous 
-        month if the pentad is not found in the natural month.
-
-            Example: 
-                The first month, '1', has dates Jan 1-30, whereas Jan 31 occurs
-                in second month, '2'.
-
-        Try-Except:
-        Because of the above, have possibility of 0 month, which raises 
-        exception.
-
-        Return:
-        Breaks nested loop and returns pentads.
+def get_pentad(date):
+    """Input date, return the corresponding pentad, from the day-of-year tables
+    in 'pentad_calendar.py'.  Whole arrays of dates are handled by 
+    pentad_calendar.pentads().
     """
-    m = int(date.month)
-    # date may occur in previous or next calender half-month according to this 
-    # scheme 
-    mth_rng = [m,m-1,m+1] #list(range(m,m-2,-1))
-
-    for mth in mth_rng:
-        try:
-            d_month = d[str(mth)]
-            for half_month in d_month:
-                dates = d_month[half_month]['dates']
-                if dates[0] <= date <= dates[1]:
-                    pentads = d_month[half_month]['pentads']
-                    return pentads, dates
-        except:
-            pass
-
-def get_pentad(d,date):
-    """Input date and stored dictionary holding yearly interval data, return the
-    corresponding pentad.
-        
-    Note on input date year:
-    Reset to 2016, which is the default I am using, since the year is 
-    irrelevant, but want to use datetime objects which require all parts of
-    date.  The only exception is that the date must be a leap year, so that 
-    those dates may be handled properly.
+    return int(pentad_calendar.pentads(date))
+
+def new_counts():
+    """Ingest counts: lines, errors (rejected lines), rejections by reason,
+    see 'imma_qc.py', and duplicates dropped.
     """
-    date = date.replace(year=2016)
-    pentads, dates = lookup_pentads(d,date)
-    four_days = timedelta(days=4)
-    five_days = timedelta(days=5)
-    for p in range(len(pentads)-1):
-        beg = dates[0] + p*five_days
-        end = beg + four_days
-        if beg <= date <= end:
-            return pentads[p]
-    return pentads[-1]
-
-def main(start_mth,start_yr,end_mth,end_yr):
-    """Main execution sequence: 
-        load dictionary,
-        retrieve raw lines,
-        get_value(keys,line,dictionary).
+    return dict((key,0) for key in 
+        ['lines','errors'] + reject_reasons + ['duplicates'])
+
+def parse_chunk(chunk,layout,qc):
+    """Parse a block of whole lines into compact columns for the IcoadsData
+    table.  Records failing the checks of qc, a BatchQC, are dropped.
+
+    Returns:
+        columns: dictionary of arrays lon, lat, sst, date, pentad, half_mth,
+            and hash, see record_hashes()
+        counts of the chunk, see new_counts()
+        sample of the rejected lines, list of (reason, line)
+    """
+    buf = np.frombuffer(chunk,dtype=np.uint8)
+    cols = layout.parse(buf)
+    dates,bad_dates = imma_dates(cols['yr'],cols['mo'],cols['dy'])
+    codes = qc.check(cols,bad_dates)
+    keep = codes == 0
+    dates = dates[keep]
+    kept = dict((key,cols[key][keep]) for key in ('lon','lat','sst','hr','id'))
+    columns = {'lon':kept['lon'],
+               'lat':kept['lat'],
+               'sst':kept['sst'],
+               'date':dates,
+               'pentad':pentad_calendar.pentads(dates),
+               'half_mth':pentad_calendar.half_months(dates),
+               'hash':record_hashes(kept,dates)}
+    chunk_counts = qc.tally(codes)
+    chunk_counts['lines'] = keep.size
+    chunk_counts['errors'] = keep.size - int(np.count_nonzero(keep))
+    return columns, chunk_counts, qc.sample(buf,codes)
 
-    Pentad and information of the like loaded from external dictionary via
-    load_yearly_intervals().
+def parse_stage(chunks,layout,qc,counts,samples):
+    """Parse stage: yield the columns of each chunk of lines, adding its 
+    counts to counts and its sampled rejects to samples.
     """
-    # create db table
-    db_obs.create_table(IcoadsData)
+    for chunk in chunks:
+        columns,chunk_counts,chunk_samples = parse_chunk(chunk,layout,qc)
+        add_counts(counts,chunk_counts)
+        samples.extend(chunk_samples)
+        yield columns
+
+def write_stage(column_batches,writer,source,duplicates,counts):
+    """Write stage: hand the columns of each chunk to the bulk writer, tagged
+    with source, the id of the file's manifest entry.  With duplicates, a
+    DuplicateIndex, records already loaded are dropped and counted.
+    """
+    for columns in column_batches:
+        if duplicates:
+            keep = duplicates.add(columns['hash'],source)
+            counts['duplicates'] += keep.size - int(np.count_nonzero(keep))
+            columns = dict((key,value[keep]) for key,value in columns.items())
+        source_column = np.full(columns['sst'].size,source)
+        writer.write_columns(
+            [columns[f] for f in column_fields] + [source_column])
+
+def ingest_file(chunks,entry,layout,qc,writer,duplicates,counts,reject_log):
+    """Stream the chunks of one ICOADS data file into the database, in a 
+    single transaction that also completes its manifest entry.
+    """
+    file_counts = new_counts()
+    samples = list()
+    rows_before = writer.rows
+    with db_obs.atomic():
+        column_batches = parse_stage(chunks,layout,qc,file_counts,samples)
+        write_stage(column_batches,writer,entry.id,duplicates,file_counts)
+        writer.flush()
+        complete_entry(entry,file_counts,writer.rows-rows_before)
+    add_counts(counts,file_counts)
+    reject_log.write(entry.filename,samples)
+
+def ingest_files(to_load,layout,qc,writer,duplicates,counts,reject_log,
+        max_memory=max_memory):
+    """Read stage for all files to load, see plan_ingest(): the files are read,
+    and decompressed, on a background thread in chunks sized so that parsing 
+    stays within max_memory, so memory use does not grow with the size of the
+    file.  Each file's chunks are handed to ingest_file().
+    """
+    chunk_bytes = max(max_memory//parse_overhead,min_chunk_bytes)
+    entries = dict(to_load)
+    chunks = background(source_chunks(data_location,list(entries),chunk_bytes))
+    for data_file,file_chunks in groupby(chunks,key=itemgetter(0)):
+        print(data_file)
+        ingest_file((chunk for _,chunk in file_chunks),entries[data_file],
+            layout,qc,writer,duplicates,counts,reject_log)
+
+"""
+Manifest:
+Every ingested file has a row in IngestManifest with its size, modification 
+time, checksum, counts and status, and every IcoadsData row points to its file 
+through source_file.  A file is marked 'partial', and committed as such, before
+it is loaded, and marked 'complete' in the transaction that commits its rows.
+On a re-run:
+    complete files that are unchanged are skipped,
+    partial files, left by an interrupted run, and files whose contents 
+        changed have their rows deleted and are loaded again,
+    files not in the manifest, e.g., months added to the archive, are loaded.
+Size and mtime are compared first, the checksum is only computed when they
+differ or the file is to be loaded.  For files in tar archives, size and mtime
+are those of the member, the checksum that of the archive.
+"""
+
+def create_tables():
+    """Create the manifest and data tables if they do not exist.  IcoadsData
+    tables from before the manifest get the source_file column, their rows
+    left without a source.
+    """
+    db_obs.create_tables([IngestManifest,IcoadsData,ObsHash],safe=True)
+    table = table_name(IcoadsData)
+    column = column_names(IcoadsData,['source_file'])[0]
+    info = db_obs.execute_sql('pragma table_info("{}");'.format(table))
+    if column not in [row[1] for row in info]:
+        db_obs.execute_sql(
+            'alter table "{}" add column "{}" integer references "{}" (id);'
+            .format(table,column,table_name(IngestManifest)))
+        db_obs.execute_sql(
+            'create index if not exists "{0}_{1}" on "{0}" ("{1}");'
+            .format(table,column))
+
+def plan_ingest(data_files):
+    """Compare data files with the manifest and prepare the ones to load:
+    their manifest entries are created, or reset and their old rows deleted,
+    with status 'partial'.
+
+    Returns:
+        list of (data file, manifest entry) to load, in order
+    """
+    to_load = list()
+    for data_file in data_files:
+        size,mtime = imma_sources.source_stat(data_location,data_file)
+        entry = IngestManifest.select().where(
+            IngestManifest.filename == data_file).first()
+        complete = entry is not None and entry.status == 'complete'
+        if complete and (entry.size,entry.mtime) == (size,mtime):
+            print(data_file,'complete, skipped')
+            continue
+        checksum = imma_sources.source_checksum(data_location,data_file)
+        if complete and (entry.size,entry.checksum) == (size,checksum):
+            # touched, but not changed
+            print(data_file,'unchanged, skipped')
+            entry.mtime = mtime
+            entry.save()
+            continue
+        with db_obs.atomic():
+            if entry is None:
+                entry = IngestManifest.create(filename=data_file,
+                    size=size,mtime=mtime,checksum=checksum)
+            else:
+                print(data_file,'partial, reloading' if not complete 
+                    else 'changed, reloading')
+                IcoadsData.delete().where(
+                    IcoadsData.source_file == entry.id).execute()
+                ObsHash.delete().where(
+                    ObsHash.source_file == entry.id).execute()
+                entry.size = size
+                entry.mtime = mtime
+                entry.checksum = checksum
+                entry.lines = entry.rows = entry.errors = 0
+                entry.status = 'partial'
+                entry.ingested = None
+                entry.save()
+        to_load.append((data_file,entry))
+    return to_load
+
+def complete_entry(entry,file_counts,rows):
+    """Record the counts of a loaded file and mark it complete.  Called in the
+    transaction that writes the file's rows.
+    """
+    entry.lines = file_counts['lines']
+    entry.errors = file_counts['errors']
+    entry.rows = rows
+    entry.status = 'complete'
+    entry.ingested = datetime.now()
+    entry.save()
+
+def add_counts(counts,file_counts):
+    """Add the counts of a file, or chunk, to the totals."""
+    for key in file_counts:
+        counts[key] = counts.get(key,0) + file_counts[key]
+
+"""
+Parallel ingest:
+Worker processes parse and pentad-tag byte ranges of the data files, and send
+back compact columns of NumPy arrays.  Compressed files cannot be split by 
+byte ranges: they are decompressed here, on a background thread, and their 
+chunks of lines sent to the workers.  This process is the single writer: it
+owns the database connection and inserts the columns in file order, one 
+transaction per file.  Ranges are submitted a few at a time per worker, so 
+parsed data waiting to be written stays bounded.
+"""
+
+# per-process state of parse workers, set by init_worker()
+worker_state = dict()
 
-    # set up data structures and data input files for a given time range
+def init_worker(sample_rate=0.):
+    """Load dictionary, compile the layout and set up the checks once per 
+    worker process.
+    """
     d = load_dict()
-    dict_icoads = dict()
-    data_icoads = list()
+    worker_state['layout'] = RecordLayout(ingest_keys,d)
+    worker_state['qc'] = BatchQC(d,sample_rate)
+
+def file_ranges(data_file,chunk_bytes):
+    """Split a plain data file into tasks, byte ranges [begin,end) of about
+    chunk_bytes.  An empty file is a single, empty range.
+    """
+    size = os.path.getsize(data_location+data_file)
+    return [(data_file,beg,min(beg+chunk_bytes,size),None) 
+        for beg in range(0,max(size,1),chunk_bytes)]
+
+def parse_tasks(data_files,chunk_bytes):
+    """Tasks for parse_range(), in file order: byte ranges of plain files, 
+    chunks of lines, read and decompressed on a background thread, of the 
+    others.
+    """
+    for plain,group in groupby(data_files,key=seekable):
+        if plain:
+            for data_file in group:
+                yield from file_ranges(data_file,chunk_bytes)
+        else:
+            chunks = source_chunks(data_location,list(group),chunk_bytes)
+            for data_file,chunk in background(chunks):
+                yield data_file,None,None,chunk
+
+def read_range(filename,beg,end):
+    """Read the whole lines of a file that start in the byte range 
+    [beg,end).  A line starting before beg belongs to the previous range.
+    """
+    with open(filename,'rb') as f:
+        if beg > 0:
+            f.seek(beg-1)
+            f.readline()
+        start = f.tell()
+        if start >= end:
+            return b''
+        data = f.read(end-start)
+        if not data.endswith(b'\n'):
+            data += f.readline()
+    return data
+
+def parse_range(task):
+    """Worker: parse the lines of a byte range of a file, or a chunk of lines,
+    see parse_tasks().
+    """
+    data_file,beg,end,chunk = task
+    if chunk is None:
+        chunk = read_range(data_location+data_file,beg,end)
+    columns,chunk_counts,samples = parse_chunk(chunk,worker_state['layout'],
+        worker_state['qc'])
+    return data_file,columns,chunk_counts,samples
+
+def ordered_results(pool,func,tasks,ahead):
+    """Apply func to tasks in the pool, yielding results in task order with at
+    most 'ahead' tasks submitted but not yet consumed.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func,(task,)))
+        if len(pending) >= ahead:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def tally(results,counts,samples):
+    """Add up the counts and sampled rejects of parse_range() results, yield 
+    their columns.
+    """
+    for filename,columns,chunk_counts,chunk_samples in results:
+        add_counts(counts,chunk_counts)
+        samples.extend(chunk_samples)
+        yield columns
+
+def parallel_ingest(to_load,writer,duplicates,counts,reject_log,
+        processes=None,max_memory=max_memory,sample_rate=0.):
+    """Parse files in a pool of worker processes, write them from this one.
+    to_load is a list of (data file, manifest entry), see plan_ingest().
+    Sampled rejects are sent back with the columns and logged here.
+    """
+    processes = processes or os.cpu_count()
+    chunk_bytes = max(max_memory//(parse_overhead*processes),min_chunk_bytes)
+    entries = dict(to_load)
+    tasks = parse_tasks(list(entries),chunk_bytes)
+    pool = Pool(processes,initializer=init_worker,initargs=(sample_rate,))
+    try:
+        results = ordered_results(pool,parse_range,tasks,ahead=2*processes)
+        for data_file,file_results in groupby(results,key=itemgetter(0)):
+            print(data_file)
+            entry = entries[data_file]
+            file_counts = new_counts()
+            samples = list()
+            rows_before = writer.rows
+            with db_obs.atomic():
+                write_stage(tally(file_results,file_counts,samples),writer,
+                    entry.id,duplicates,file_counts)
+                writer.flush()
+                complete_entry(entry,file_counts,writer.rows-rows_before)
+            add_counts(counts,file_counts)
+            reject_log.write(data_file,samples)
+    finally:
+        pool.close()
+        pool.join()
+
+def ingest(data_files,max_memory=max_memory,processes=1,reject_log=None):
+    """Load data files, given by name in data_location, skipping those the
+    manifest shows as already loaded.
+
+    With processes other than 1, files are parsed in parallel by that many 
+    worker processes (None: one per core) and written by this process, see
+    parallel_ingest().
+
+    With a reject_log file name, a sample of the rejected lines, 
+    reject_sample_rate of them, is appended to it, see 'imma_qc.py'.
+
+    Returns the counts of the files loaded, see new_counts().
+    """
+    # create db tables, plan the files to load against the manifest
+    create_tables()
+    to_load = plan_ingest(data_files)
+    counts = new_counts()
+    sample_rate = reject_sample_rate if reject_log else 0.
+    log = RejectLog(reject_log)
+    duplicates = DuplicateIndex(db_obs,ObsHash) if detect_duplicates else None
+
+    # indexes are rebuilt once, after all files are loaded
+    writer = BulkWriter(db_obs,IcoadsData,ingest_fields,
+        buffer_rows=write_buffer_rows,defer_indexes=True)
+    try:
+        with writer:
+            if processes != 1:
+                parallel_ingest(to_load,writer,duplicates,counts,log,
+                    processes=processes,max_memory=max_memory,
+                    sample_rate=sample_rate)
+            else:
+                d = load_dict()
+                layout = RecordLayout(ingest_keys,d)
+                qc = BatchQC(d,sample_rate)
+                ingest_files(to_load,layout,qc,writer,duplicates,counts,log,
+                    max_memory=max_memory)
+    finally:
+        log.close()
+    db_obs.close()
+    print("Files loaded: ",len(to_load))
+    print("Error count:  ",counts['errors'])
+    for reason in reject_reasons:
+        print("  {:18s}".format(reason),counts[reason])
+    print("Duplicates:   ",counts['duplicates'])
+    print("Insert count: ",writer.rows)
+    print("Lines count:  ",counts['lines'])
+    return counts
+
+def main(start_mth,start_yr,end_mth,end_yr,max_memory=max_memory,
+        processes=1,reject_log=None):
+    """Main execution sequence: 
+        load dictionary,
+        compile the RecordLayout of the fields to extract,
+        check the data files of the date range against the manifest,
+        stream each file to load through ingest_files(): read, parse, write.
+
+    Running main() again for the same range only loads files that are new,
+    changed or were interrupted, see plan_ingest().  For processes, see 
+    ingest().
+
+    Pentads and half-months assigned from the day-of-year tables in
+    'pentad_calendar.py'.
+    """
+    # set up data input files for a given time range
     filenames = imma_data_files()
     extraction_files = retrieve_data_files(
                     start_mth,
@@ -224,66 +593,15 @@ def main(start_mth,start_yr,end_mth,end_yr):
                     end_yr,
                     filenames
                 )
-    d_yearly_intervals = load_yearly_intervals()
-    
-    # loop over all data files
-    err_count = 0
-    insert_count = 0
-    lines_count = 0
-    for data_file in extraction_files:
-
-        # open ICOADS data file
-        with open(data_location+data_file,"r",
-                encoding='utf-8', errors='ignore') as f:
-            print(data_file)
-        
-            # create database transaction
-            with db_obs.atomic():
-                for i,line in enumerate(f.readlines()):
-                    lines_count += 1
-                    extract_values = get_value(
-                        ['lon','lat','sst','yr','mo','dy'],
-                        line,
-                        d)
-
-                    try:
-                        # Store data first in a list before commit
-                        float(extract_values[2])
-                        this_date = date(int(extract_values[3]),
-                                int(extract_values[4]),
-                                int(extract_values[5]))
-                        pentad = get_pentad(d_yearly_intervals,this_date)
-                        dict_icoads.update({'lon':extract_values[0],
-                                'lat':extract_values[1],
-                                'sst':extract_values[2],
-                                'date':this_date,
-                                'pentad':pentad
-                                })
-                        data_icoads.append(dict_icoads.copy())
-                    except ValueError as ve:
-                        print(ve)
-                        err_count += 1
-                    except TypeError as te:
-                        err_count += 1    
-                        print(logging.exception(te))
-
-                    if i % 100 == 50 and data_icoads:
-                        # commit data to savepoint
-                        with db_obs.atomic():
-                            insert_count += len(data_icoads)
-                            IcoadsData.insert_many(data_icoads).execute()
-                            data_icoads[:] = []
-        
-                if data_icoads:    
-                    # pick up leftover data not processed in the savepoints
-                    with db_obs.atomic():
-                        insert_count += len(data_icoads)
-                        IcoadsData.insert_many(data_icoads).execute()
-                        data_icoads[:] = []
-    db_obs.close()
-    print("Error count:  ",err_count)
-    print("Insert count: ",insert_count)
-    print("Lines count:  ",lines_count)
+    ingest(extraction_files,max_memory=max_memory,processes=processes,
+        reject_log=reject_log)
+
+def update(max_memory=max_memory,processes=1,reject_log=None):
+    """Load every data file in data_location that is not yet complete in the
+    database, e.g., months added with a new release of the archive.
+    """
+    ingest(imma_data_files(),max_memory=max_memory,processes=processes,
+        reject_log=reject_log)
 
 if __name__ == '__main__':
     # pass
@@ -291,7 +609,5 @@ if __name__ == '__main__':
     # filenames = imma_data_files()
     main(1,1861,2,1861)
 
-    # d = load_yearly_intervals()
     # date = datetime.strptime('2016-4-6','%Y-%m-%d').date()
-    # print(lookup_pentads(d,date))
-    # print(get_pentad(d,date))
+    # print(get_pentad(date))
@@ -8,6 +8,18 @@ dictionaries contain meta data for that particular field, described as follows:
     description: field description (see imma.txt)
     length: # of spaces field occupies in the data text line
     position: position of the field in the data text line
+    section: 'core' for the location and regular sections, otherwise the
+        number of the attachment holding the field, e.g., '1'
+    type: 'int', 'b36' (base36 digits), or 'text'
+    min, max: scaled minimum and maximum, as stored in the data line, e.g.,
+        -9000 and 9000 for LAT, given to 0.01 degrees; not set for text fields
+    decimals: implied decimal places of the scaled values, e.g., 2 for LAT
+
+Positions of core fields are counted from the start of the line.  Positions of
+attachment fields are counted from the start of their attachment, whose first
+four characters are the attachment ID and length, ATTI and ATTL.  Attachments
+follow the core in a variable order given per record, see RecordLayout in
+'imma_columns.py'.
 
 Creates dictionary in two parts.  First, add_first_fields() sets up the main key
 with nested dictionary containing ['id','length','description'].  Then,
@@ -20,18 +32,27 @@ write_dict().
 
 Examples of key and nested dictionary:
     YR {'id': '1', 'description': 'year UTC 1600 2024 (AAAA)', 'length': '4', 
-        'position': [0, 4]}
+        'position': [0, 4], 'section': 'core', 'type': 'int'}
     MO {'id': '2', 'description': 'month UTC1 1 12 (MM)', 'length': '2', 
         'position': [4, 6]}
     SST {'id': '35', 'description': 'sea surface temp. –99.9 99.9 0.1°C (∆ sn, 
           TwTwTw)', 'length': '4', 'position': [85, 89]}
 """
 import json
+import re
 
-def add_first_fields():
-    """Process input file and create nested dictionary with its info."""
-    with open('imma.txt','r') as f:
+# length of ATTI and ATTL, which start every attachment
+attm_header_length = 4
+
+def add_first_fields(filename='icoads3/lib/imma.txt'):
+    """Process input file and create nested dictionary with its info.  Section
+    headings naming an attachment, e.g., 'ICOADS attachment (attm 1, ...):',
+    switch the following fields to that attachment.
+    """
+    with open(filename,'r') as f:
         d = dict()
+        section = 'core'
+        attm = re.compile(r'attm (\w+)')
         # order for rearranging input, description fields added in a bit
         order = [2,0,1] 
         # keys for nested dictionary => to 0,1 in order, + description field 
@@ -40,17 +61,47 @@ def add_first_fields():
         for line in f.readlines():
             try:
                 rearrange = []
-                if not line[0].isalpha():
+                if line[0].isalpha() and attm.search(line):
+                    section = attm.search(line).group(1)
+                elif not line[0].isalpha():
                     line_split = line.split()
                     rearrange = [line_split[i] for i in order]
                     rearrange.append(" ".join(line_split[3:]))
                     d_nest = dict((key,value) for (key,value) in \
                              zip(labels,rearrange[1:]))
+                    d_nest['section'] = section
+                    d_nest['type'] = field_type(d_nest['description'])
+                    if d_nest['type'] != 'text':
+                        d_nest.update(field_range(d_nest['description']))
                     d[rearrange[0]] = d_nest
             except:
                 pass
     return d
 
+def field_type(description):
+    """Type of field from its description: 'text' for character fields (min.
+    and max. given as 'c c' or 'b b'), 'b36' for base36 fields, else 'int'.
+    """
+    if re.search(r'\s([cb]) \1(\s|$)',description):
+        return 'text'
+    elif '[b36]' in description:
+        return 'b36'
+    return 'int'
+
+def field_range(description):
+    """Scaled min. and max. of a field, and its implied decimal places, from
+    the first two numbers in its description, e.g., 'latitude –90.00 90.00
+    0.01°N' -> {'min': -9000, 'max': 9000, 'decimals': 2}.
+    """
+    number = re.compile(r'^[–-]?\d+(\.\d+)?$')
+    values = [v.replace('–','-') for v in description.split()
+        if number.match(v)][:2]
+    if len(values) < 2:
+        return dict()
+    decimals = max(len(v.split('.')[1]) if '.' in v else 0 for v in values)
+    scaled = [int(round(float(v)*10**decimals)) for v in values]
+    return {'min':scaled[0], 'max':scaled[1], 'decimals':decimals}
+
 def add_position_field(d):
     """Adds position field to the stored dictionary, derived from the 'length'
     field already contained in it.
@@ -61,12 +112,15 @@ def add_position_field(d):
     return d
 
 def get_position(key,sorted_keys,d):
-    """Return the key's space position interval in the line."""
-    start_pos = 0
+    """Return the key's space position interval in the line, or in its
+    attachment for attachment fields.
+    """
+    section = d[key].get('section','core')
+    start_pos = 0 if section == 'core' else attm_header_length
     for sk in sorted_keys:
         if sk == key:
             break
-        else:
+        elif d[sk].get('section','core') == section:
             start_pos += int(d[sk]['length'])
     end_pos = start_pos + int(d[key]['length'])
     pos = [start_pos,end_pos]
@@ -74,9 +128,12 @@ def get_position(key,sorted_keys,d):
 
 def sort_keys(d):
     """Return keys of dictionary sorted accorded to 'id', found in nested 
-    dictionary.
+    dictionary.  Core fields come first, then attachment fields by attachment.
     """
-    return sorted(d,key=lambda x: int(d[x]['id']))
+    def order(x):
+        section = d[x].get('section','core')
+        return (section != 'core', section.zfill(2), int(d[x]['id']))
+    return sorted(d,key=order)
 
 def print_sorted_dict(d):
     """Print out the dictionary with keys in order according to imma.txt."""
@@ -2,13 +2,35 @@
 """
 """
 from get_icoads_data import *
+from icoads3.imma_catalog import DataCatalog, catalog_name
 import codecs
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 
+# catalogs read, by directory, with the modification time of their file
+catalogs = dict()
+
+def directory_catalog(location):
+    """Catalog of the directory location, read again only if its file
+    changed.
+    """
+    path = os.path.join(location,catalog_name)
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    if location not in catalogs or catalogs[location][0] != mtime:
+        catalogs[location] = (mtime,DataCatalog(location))
+    return catalogs[location][1]
 
 def file_len(fname):
-    """Returns the number of lines in a file."""
+    """Returns the number of lines in a file, from the catalog of its archive, 
+    see 'imma_catalog.py', when the file is catalogued and unchanged.
+    """
+    location,source = os.path.split(fname)
+    entry = directory_catalog(os.path.join(location or '.','')).sources.get(
+        source)
+    stat = os.stat(fname)
+    if entry and [entry['size'],entry['mtime']] == [stat.st_size,stat.st_mtime]:
+        return entry['lines']
     with open(fname,'r',encoding='utf-8',errors='ignore') as f:
         for i, l in enumerate(f):
             pass
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+"""
+Catalog of an archive of IMMA data files, built once and stored with the
+archive as 'catalog.json'.  For every source, see 'imma_sources.py', it keeps:
+    size, mtime: of the source when it was scanned
+    month: 'YYYY-MM' of the monthly file, from its 'dYYYYMM' name
+    lines: number of lines
+    first, last: first and last date of its records
+    days: for each date, the byte ranges [begin,end) of its lines and their
+        number of lines, as runs [begin, end, lines]; a file sorted by date has
+        one run per day
+
+Offsets are into the decompressed contents of a source.  Plain data files are
+read straight from those offsets; compressed ones are streamed, and only the
+wanted lines kept.
+
+Sources are scanned on the first build, and again when their size or mtime
+change; build_catalog() brings the catalog up to date with the archive.
+
+Example:
+    catalog = build_catalog('data_sets/icoads3.0.0/',load_dict())
+    catalog.month_files(1,1861,3,1861)  => sources of January-March 1861
+    catalog.line_count(source)          => 20000
+    for source,block in catalog.read_dates('1861-01-05','1861-01-09'):
+        ... block holds the whole IMMA lines of those days in source ...
+"""
+from icoads3.imma_columns import RecordLayout, imma_dates, line_bounds
+from icoads3 import imma_sources
+import json
+import os
+import re
+import numpy as np
+
+catalog_name = 'catalog.json'
+
+# bytes scanned at a time
+scan_bytes = 16*1024*1024
+
+# day number of lines without a valid date
+no_day = np.iinfo(np.int64).min
+
+def month_key(source):
+    """'YYYY-MM' of an ICOADS monthly file name, e.g.,
+    'IMMA-MarineObs_icoads3.0.0_d186101_c2016.dat' -> '1861-01', None if the
+    name has no 'dYYYYMM'.
+    """
+    match = re.search(r'_d(\d{4})(\d{2})',os.path.basename(source))
+    if match:
+        return '{}-{}'.format(*match.groups())
+
+def scan_source(location,source,layout):
+    """Count lines and record the byte ranges of each day in a source."""
+    size,mtime = imma_sources.source_stat(location,source)
+    entry = {'size':size, 'mtime':mtime, 'month':month_key(source),
+        'lines':0, 'first':None, 'last':None, 'days':{}}
+    runs = list()
+    offset = 0
+    chunks = imma_sources.source_chunks(location,[source],scan_bytes)
+    for _,chunk in imma_sources.background(chunks):
+        buf = np.frombuffer(chunk,dtype=np.uint8)
+        starts,ends = line_bounds(buf)
+        cols = layout.parse(buf)
+        dates,bad = imma_dates(cols['yr'],cols['mo'],cols['dy'])
+        entry['lines'] += starts.size
+
+        # each line spans to the start of the next one, the last to the end
+        stops = np.append(starts[1:],buf.size)
+        days = np.where(bad,no_day,dates.astype(np.int64))
+        new_run = np.ones(days.size,dtype=bool)
+        new_run[1:] = days[1:] != days[:-1]
+        firsts = np.flatnonzero(new_run)
+        lasts = np.append(firsts[1:],days.size) - 1
+        for i,j in zip(firsts,lasts):
+            day,beg,end = int(days[i]),offset+int(starts[i]),offset+int(stops[j])
+            if runs and runs[-1][0] == day and runs[-1][2] == beg:
+                runs[-1][2] = end
+                runs[-1][3] += int(j-i+1)
+            else:
+                runs.append([day,beg,end,int(j-i+1)])
+        offset += buf.size
+
+    for day,beg,end,lines in runs:
+        if day == no_day:
+            continue
+        key = str(np.datetime64(day,'D'))
+        entry['days'].setdefault(key,list()).append([beg,end,lines])
+    if entry['days']:
+        entry['first'] = min(entry['days'])
+        entry['last'] = max(entry['days'])
+    return entry
+
+def build_catalog(location,d,sources=None):
+    """Bring the catalog of the archive at location up to date: scan new and
+    changed sources, drop those no longer there, and save it.
+
+    Arguments:
+        location: directory of the archive
+        d: external metadata dictionary, see load_dict()
+        sources: sources to catalog, all sources of the archive if None
+    """
+    catalog = DataCatalog(location)
+    if sources is None:
+        sources = imma_sources.list_sources(location)
+    layout = RecordLayout(['yr','mo','dy'],d)
+    entries = dict()
+    for source in sources:
+        entry = catalog.sources.get(source)
+        stat = list(imma_sources.source_stat(location,source))
+        if entry is None or [entry['size'],entry['mtime']] != stat:
+            print('cataloging',source)
+            entry = scan_source(location,source,layout)
+        entries[source] = entry
+    catalog.sources = entries
+    catalog.save()
+    return catalog
+
+class DataCatalog:
+    """Catalog of the IMMA sources at location, as last built.
+
+    Arguments:
+        location: directory of the archive, holding catalog.json
+    """
+    def __init__(self,location):
+        self.location = location
+        self.path = os.path.join(location,catalog_name)
+        self.sources = dict()
+        if os.path.exists(self.path):
+            with open(self.path,'r') as f:
+                self.sources = json.load(f)
+
+    def save(self):
+        with open(self.path+'.tmp','w') as f:
+            json.dump(self.sources,f)
+        os.replace(self.path+'.tmp',self.path)
+
+    def months(self):
+        """Dictionary of 'YYYY-MM' -> source of that month.  Months with more
+        than one source, e.g., compressed and plain copies, keep the first.
+        """
+        months = dict()
+        for source in sorted(self.sources):
+            month = self.sources[source]['month']
+            if month is not None:
+                months.setdefault(month,source)
+        return months
+
+    def month_files(self,start_mth,start_yr,end_mth,end_yr):
+        """Sources of the months in the range, in order."""
+        months = self.months()
+        first = start_yr*12 + start_mth - 1
+        last = end_yr*12 + end_mth - 1
+        keys = ('{}-{:02d}'.format(m//12,m%12+1) for m in range(first,last+1))
+        return [months[key] for key in keys if key in months]
+
+    def line_count(self,source):
+        return self.sources[source]['lines']
+
+    def date_range(self,source):
+        """First and last date, 'YYYY-MM-DD', of the records of a source."""
+        entry = self.sources[source]
+        return entry['first'],entry['last']
+
+    def day_ranges(self,source,start_date,end_date):
+        """Byte ranges [begin,end) of the lines of a source dated from
+        start_date to end_date, 'YYYY-MM-DD', in file order.  Adjacent ranges
+        are merged.
+        """
+        ranges = sorted(run[:2] for day,runs in
+            self.sources[source]['days'].items()
+            if start_date <= day <= end_date for run in runs)
+        merged = list()
+        for beg,end in ranges:
+            if merged and merged[-1][1] == beg:
+                merged[-1][1] = end
+            else:
+                merged.append([beg,end])
+        return merged
+
+    def files_for_dates(self,start_date,end_date):
+        """Sources with records dated from start_date to end_date."""
+        return [source for source,entry in sorted(self.sources.items())
+            if entry['first'] is not None
+            and entry['first'] <= end_date and start_date <= entry['last']]
+
+    def read_dates(self,start_date,end_date):
+        """Yield (source, block of lines) of the records dated from start_date
+        to end_date, 'YYYY-MM-DD'.  Plain files are read at the byte ranges of
+        those days, the others streamed with the lines outside them skipped.
+        """
+        for source in self.files_for_dates(start_date,end_date):
+            ranges = self.day_ranges(source,start_date,end_date)
+            if imma_sources.seekable(source):
+                with open(self.location+source,'rb') as f:
+                    for beg,end in ranges:
+                        f.seek(beg)
+                        yield source,f.read(end-beg)
+                continue
+            for _,f in imma_sources.open_sources(self.location,[source]):
+                pos = 0
+                for beg,end in ranges:
+                    skip(f,beg-pos)
+                    yield source,f.read(end-beg)
+                    pos = end
+
+def skip(f,n):
+    """Read past n bytes of stream f, scan_bytes at a time."""
+    while n > 0:
+        block = f.read(min(n,scan_bytes))
+        if not block:
+            break
+        n -= len(block)
@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+"""
+Columnar reader for IMMA data files.  Rather than slicing each line with
+get_value() in create_icoads_database.py, a whole file is memory-mapped and the
+requested fields are pulled out of every record at once into NumPy arrays,
+using the 'position' entries of the dictionary in 'stored_dictionary.json'.
+
+IMMA fields are fixed width and right-justified.  A field of width w is
+gathered as an (n_records, w) array of bytes and the digits are summed with
+their powers of ten.  Blank fields are missing values.
+
+Fields with implied decimals (see add_decimal()) are returned as floats with
+NaN for missing values:
+    LAT, LON: hundredths of a degree
+    SST: tenths of a degree C
+Text fields, e.g., ID, are returned as stripped strings, '' when blank.  All
+other fields, including base36 fields, are returned as int32 arrays with
+MISSING for blanks.
+
+Attachments:
+Records may carry attachments after the 108 character core, their number given
+by ATTC.  Each attachment starts with its ID, ATTI, and length, ATTL, so the
+attachment boundaries of a record are only known by walking them in order.
+RecordLayout compiles the dictionary for a set of fields once, then finds the
+attachments of all records in a single scan, one step per attachment.
+
+Example:
+    d = load_dict()
+    layout = RecordLayout(['lon','lat','sst','yr','si','id','dck'],d)
+    cols = layout.read(fname)
+    cols['sst'] => array([ 12.3,   nan,  14.1, ...])
+    cols['yr']  => array([1861, 1861, 1861, ...], dtype=int32)
+    cols['dck'] => deck from the ICOADS attachment, MISSING if not attached
+    layout.extract_line(line) => [lon, lat, sst, yr, si, id, dck] of one line
+"""
+import mmap
+import os
+import numpy as np
+
+# number of implied decimal places of compact IMMA fields
+decimal_places = {'LAT':2,'LON':2,'SST':1}
+
+# value of blank (missing) integer fields
+MISSING = np.iinfo(np.int32).min
+
+# days in month, non-leap year
+month_days = np.array([31,28,31,30,31,30,31,31,30,31,30,31])
+
+# character codes -> base36 digit values, -1 for anything else
+b36_values = np.full(256,-1,dtype=np.int64)
+b36_values[ord('0'):ord('9')+1] = np.arange(10)
+b36_values[ord('A'):ord('Z')+1] = np.arange(10,36)
+b36_values[ord('a'):ord('z')+1] = np.arange(10,36)
+
+# length of ATTI and ATTL, which start every attachment
+attm_header_length = 4
+
+def line_bounds(buf):
+    """Return the start and end offsets of every non-empty line in buf, a
+    uint8 array.  End offsets exclude the line terminator.
+    """
+    newlines = np.flatnonzero(buf == ord('\n'))
+    starts = np.concatenate(([0],newlines+1))
+    ends = np.concatenate((newlines,[buf.size]))
+    # strip carriage returns of DOS line endings
+    if buf.size:
+        cr = buf[np.maximum(ends-1,0)] == ord('\r')
+        ends = ends - (cr & (ends > starts))
+    keep = ends > starts
+    return starts[keep],ends[keep]
+
+def field_chars(buf,base,ends,pos):
+    """Gather the characters of the field at pos, [begin,end], relative to the
+    offsets in base, for all lines.  Characters past the end of a line, or of
+    lines with a negative base (attachment not present), are read as blanks.
+    """
+    offsets = base[:,None] + np.arange(pos[0],pos[1])
+    inside = (base[:,None] >= 0) & (offsets < ends[:,None])
+    chars = buf[np.clip(offsets,0,max(buf.size-1,0))]
+    return np.where(inside,chars,ord(' ')).astype(np.uint8)
+
+def decode_digits(chars,digits,base=10):
+    """Sum right-justified digits, the per-character digit values (negative
+    if not a digit), with their powers of base.
+
+    Returns:
+        values: int64 array, sign applied
+        missing: blank fields, or fields with anything other than digits,
+            blanks and a minus sign
+    """
+    is_digit = digits >= 0
+    is_blank = chars == ord(' ')
+    is_minus = chars == ord('-')
+    # power of each digit is the number of digits to its right
+    powers = np.cumsum(is_digit[:,::-1],axis=1)[:,::-1] - is_digit
+    values = (np.where(is_digit,digits,0)*base**powers).sum(axis=1)
+    values[is_minus.any(axis=1)] *= -1
+    missing = ~is_digit.any(axis=1) | ~(is_digit|is_blank|is_minus).all(axis=1)
+    return values,missing
+
+def decode_integers(chars):
+    """Convert an (n, width) array of characters to integers."""
+    digits = np.where((chars >= ord('0')) & (chars <= ord('9')),
+        chars.astype(np.int64)-ord('0'),-1)
+    return decode_digits(chars,digits)
+
+def decode_field(chars,field,entry):
+    """Decode gathered characters according to the field's dictionary entry."""
+    kind = entry.get('type','int')
+    if kind == 'text':
+        width = chars.shape[1]
+        text = np.ascontiguousarray(chars).view('S{}'.format(width)).ravel()
+        return np.char.strip(np.char.decode(text,'latin-1'))
+    if kind == 'b36':
+        values,missing = decode_digits(chars,b36_values[chars],base=36)
+    else:
+        values,missing = decode_integers(chars)
+    if field in decimal_places:
+        values = values/10.**decimal_places[field]
+        values[missing] = np.nan
+    else:
+        values = values.astype(np.int32)
+        values[missing] = MISSING
+    return values
+
+def decode_value(s,field,entry):
+    """Decode the stripped string of a single field, None if missing."""
+    kind = entry.get('type','int')
+    if kind == 'text':
+        return s
+    try:
+        value = int(s,36 if kind == 'b36' else 10)
+    except ValueError:
+        return None
+    if field in decimal_places:
+        return value/10.**decimal_places[field]
+    return value
+
+class RecordLayout:
+    """Compiled positions of a set of IMMA fields, core and attachment.
+
+    Arguments:
+        keys: fields to extract, returned keyed as given, e.g., 'sst'
+        d: external metadata dictionary, see load_dict()
+    """
+    def __init__(self,keys,d):
+        if isinstance(keys,str):
+            keys = [keys]
+        self.keys = list(keys)
+        self.fields = list()
+        for key in self.keys:
+            field = key.upper()
+            entry = d[field]
+            self.fields.append(
+                (key,field,entry,entry.get('section','core'),
+                 tuple(entry['position'])))
+        self.attachments = sorted(
+            set(f[3] for f in self.fields if f[3] != 'core'),key=int)
+        self.core_length = max(e['position'][1] for e in d.values()
+            if e.get('section','core') == 'core')
+        self.attc = ('ATTC','ATTC',d['ATTC'],'core',tuple(d['ATTC']['position']))
+
+    def attachment_offsets(self,buf,starts,ends):
+        """Walk the attachments of all records at once.  Returns dictionary of
+        attachment -> start offsets of that attachment, -1 where a record does
+        not carry it.
+        """
+        offsets = dict((attm,np.full(starts.size,-1,dtype=np.int64))
+            for attm in self.attachments)
+        count = decode_field(
+            field_chars(buf,starts,ends,self.attc[4]),'ATTC',self.attc[2])
+        count = np.where(count == MISSING,0,count)
+        pos = starts + self.core_length
+        for k in range(int(count.max()) if count.size else 0):
+            active = (count > k) & (pos + attm_header_length <= ends)
+            if not active.any():
+                break
+            atti = decode_integers(field_chars(buf,pos,ends,(0,2)))[0]
+            attl = decode_integers(field_chars(buf,pos,ends,(2,4)))[0]
+            for attm in offsets:
+                found = active & (atti == int(attm))
+                offsets[attm][found] = pos[found]
+            # attachments of unspecified length (blank or 0) run to the end
+            pos = np.where(active & (attl > 0),pos+attl,ends)
+        return offsets
+
+    def parse(self,buf):
+        """Extract the fields from all records in buf, a uint8 array holding
+        whole IMMA lines.  Returns dictionary of arrays keyed as in keys.
+        """
+        starts,ends = line_bounds(buf)
+        bases = {'core':starts}
+        if self.attachments:
+            bases.update(self.attachment_offsets(buf,starts,ends))
+        columns = dict()
+        for key,field,entry,section,pos in self.fields:
+            chars = field_chars(buf,bases[section],ends,pos)
+            columns[key] = decode_field(chars,field,entry)
+        return columns
+
+    def read(self,filename):
+        """Memory-map an IMMA data file and return its columns."""
+        return self.parse(map_file(filename))
+
+    def line_attachments(self,line):
+        """Start offsets of the wanted attachments in a single line."""
+        offsets = dict()
+        attc = decode_value(line[slice(*self.attc[4])].strip(),'ATTC',
+            self.attc[2]) or 0
+        pos = self.core_length
+        for k in range(attc):
+            if pos + attm_header_length > len(line):
+                break
+            atti = line[pos:pos+2].strip()
+            attl = decode_value(line[pos+2:pos+4].strip(),'ATTL',{}) or 0
+            if atti in self.attachments:
+                offsets[atti] = pos
+            if attl <= 0:
+                break
+            pos += attl
+        return offsets
+
+    def extract_line(self,line):
+        """Extract the fields from a single IMMA line.  Returns list of values
+        in the order of keys, None for missing values.
+        """
+        line = line.rstrip('\r\n')
+        bases = {'core':0}
+        if self.attachments:
+            bases.update(self.line_attachments(line))
+        values = list()
+        for key,field,entry,section,pos in self.fields:
+            s = ''
+            if section in bases:
+                s = line[bases[section]+pos[0]:bases[section]+pos[1]].strip()
+            if s or entry.get('type') == 'text':
+                values.append(decode_value(s,field,entry))
+            else:
+                values.append(None)
+        return values
+
+def map_file(filename):
+    """Memory-map a file and return its contents as a read-only uint8 array.
+    The map is released once the array is no longer referenced.
+    """
+    with open(filename,'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return np.zeros(0,dtype=np.uint8)
+        mm = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+    return np.frombuffer(mm,dtype=np.uint8)
+
+def parse_imma_columns(buf,keys,d):
+    """Extract the fields in keys from all records in buf."""
+    return RecordLayout(keys,d).parse(buf)
+
+def read_imma_columns(filename,keys,d):
+    """Memory-map an IMMA data file and return its columns for keys."""
+    return RecordLayout(keys,d).read(filename)
+
+def imma_dates(yr,mo,dy):
+    """Convert year, month, day columns to datetime64[D] dates.  Returns the
+    dates and a mask of the impossible (or missing) ones, whose dates are set
+    to NaT.
+    """
+    yr,mo,dy = (np.asarray(a,dtype=np.int64) for a in (yr,mo,dy))
+    leap = (yr % 4 == 0) & ((yr % 100 != 0) | (yr % 400 == 0))
+    days = month_days[np.clip(mo-1,0,11)] + ((mo == 2) & leap)
+    valid = (yr > 0) & (mo >= 1) & (mo <= 12) & (dy >= 1) & (dy <= days)
+    dates = np.full(yr.shape,np.datetime64('NaT'),dtype='datetime64[D]')
+    dates[valid] = (
+        (yr[valid]-1970).astype('datetime64[Y]').astype('datetime64[M]')
+        + (mo[valid]-1)).astype('datetime64[D]') + (dy[valid]-1)
+    return dates,~valid
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+"""
+Detection of duplicate observations during ingest.  ICOADS releases and decks
+overlap, so the same report may come from several files, or be loaded again
+from another release.  Each record is keyed on its date, hour, position, ID
+and SST, hashed to a signed 64-bit integer by record_hashes(), and the hashes
+of the loaded records are kept in the ObsHash table, whose primary key is the
+hash itself.  A record whose hash is already there is a duplicate.
+
+Lookups are by primary key, in batches, so detection costs a few index probes
+per chunk of records rather than a scan of the observations.  Hashes are
+written in the transaction of their file, and deleted with its rows when the
+file is reloaded, see plan_ingest().  Records loaded before the ObsHash table
+existed have no hashes, and are not matched.
+
+With 64-bit hashes, the chance of a distinct record being taken for a 
+duplicate is about n/2^64 among n loaded records, 5 in 10^11 for a billion.
+
+Example:
+    hashes = record_hashes(cols,dates)
+    index = DuplicateIndex(db_obs,ObsHash)
+    keep = index.add(hashes,source)  => mask of the records seen for the
+                                        first time, in this batch and before
+"""
+from orm.bulk_writer import max_variables, raw_connection, table_name, \
+    column_names
+import numpy as np
+
+# FNV-1a and SplitMix64 constants
+fnv_offset = np.uint64(0xcbf29ce484222325)
+fnv_prime = np.uint64(0x100000001b3)
+mix_multipliers = (np.uint64(0xbf58476d1ce4e5b9),np.uint64(0x94d049bb133111eb))
+
+def mix(h):
+    """SplitMix64 finalizer of uint64 values."""
+    h = (h ^ (h >> np.uint64(30))) * mix_multipliers[0]
+    h = (h ^ (h >> np.uint64(27))) * mix_multipliers[1]
+    return h ^ (h >> np.uint64(31))
+
+def text_hashes(text):
+    """FNV-1a hashes of an array of strings, e.g., the ID column."""
+    raw = np.char.encode(np.asarray(text,dtype=str),'latin-1')
+    width = max(raw.dtype.itemsize,1)
+    chars = np.ascontiguousarray(raw.astype('S{}'.format(width)))
+    chars = chars.view(np.uint8).reshape(-1,width)
+    h = np.full(chars.shape[0],fnv_offset,dtype=np.uint64)
+    for j in range(width):
+        h = (h ^ chars[:,j].astype(np.uint64)) * fnv_prime
+    return h
+
+def record_hashes(cols,dates):
+    """Signed 64-bit hashes of the records' date, hour, position, ID and SST.
+
+    Arguments:
+        cols: columns parsed by RecordLayout, with hr, lat, lon, id and sst;
+            positions and SST are rounded to their IMMA units first
+        dates: datetime64[D] dates of the records, see imma_dates()
+    """
+    keys = [dates.astype('datetime64[D]').astype(np.int64),
+        np.asarray(cols['hr'],dtype=np.int64),
+        np.rint(cols['lat']*100),np.rint(cols['lon']*100),
+        np.rint(cols['sst']*10)]
+    with np.errstate(over='ignore',invalid='ignore'):
+        h = text_hashes(cols['id'])
+        for key in keys:
+            h = mix(h ^ np.asarray(key).astype(np.int64).view(np.uint64))
+    return h.view(np.int64)
+
+class DuplicateIndex:
+    """Hashes of the loaded records, in a table whose primary key is the hash.
+
+    Arguments:
+        database: peewee database holding the table
+        model: peewee model of the table, with fields hash and source_file
+    """
+    def __init__(self,database,model):
+        self.database = database
+        self.table = table_name(model)
+        self.columns = column_names(model,['hash','source_file'])
+        self.batch = max_variables()
+
+    def known(self,hashes):
+        """The hashes already in the table."""
+        conn = raw_connection(self.database)
+        hashes = hashes.tolist()
+        found = list()
+        for i in range(0,len(hashes),self.batch):
+            batch = hashes[i:i+self.batch]
+            sql = 'select "{}" from "{}" where "{}" in ({});'.format(
+                self.columns[0],self.table,self.columns[0],
+                ','.join('?'*len(batch)))
+            found.extend(row[0] for row in conn.execute(sql,batch))
+        return np.array(found,dtype=np.int64)
+
+    def add(self,hashes,source):
+        """Record the new hashes of a batch of records from source, the id of
+        its manifest entry.  Returns mask of the records to keep: not in the
+        table, and first of their hash in the batch.
+        """
+        keep = np.zeros(hashes.size,dtype=bool)
+        unique,first = np.unique(hashes,return_index=True)
+        new = ~np.isin(unique,self.known(unique))
+        keep[first[new]] = True
+        raw_connection(self.database).executemany(
+            'insert into "{}" ("{}", "{}") values (?,?);'.format(
+                self.table,*self.columns),
+            ((h,source) for h in unique[new].tolist()))
+        return keep
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+"""
+Quality control of IMMA records during ingest, on whole batches of parsed
+columns at once.  Each record gets a reason code, 0 if it passes, else the
+first check it fails, in the order of reject_reasons:
+    bad_date: missing or impossible year, month, day, see imma_dates()
+    missing_position: blank LAT or LON
+    missing_sst: blank SST
+    lat_range, lon_range, sst_range: value outside the scaled min. and max. of
+        the field in 'imma.txt', see field_range() in 'create_dictionary.py'
+
+Rejections are tallied by reason.  Optionally, a random sample of the rejected
+lines, sample_rate of them, is kept for a reject log, rather than reporting
+every failure.
+
+Example:
+    qc = BatchQC(d,sample_rate=0.001)
+    codes = qc.check(cols,bad_dates)
+    qc.tally(codes)    => {'bad_date': 12, 'missing_sst': 3044, ...}
+    qc.sample(buf,codes) => [('sst_range', '1861 1 2 ...'), ...]
+"""
+from icoads3.imma_columns import line_bounds
+import numpy as np
+
+reject_reasons = ['bad_date','missing_position','missing_sst','lat_range',
+    'lon_range','sst_range']
+
+# fields range-checked, and the reason code of a value out of range
+range_checks = [('lat','LAT','lat_range'),('lon','LON','lon_range'),
+    ('sst','SST','sst_range')]
+
+def field_limits(d,field):
+    """Min. and max. of a field in its units, e.g., (-90.0, 90.0) for LAT."""
+    entry = d[field]
+    scale = 10.**entry.get('decimals',0)
+    return entry['min']/scale,entry['max']/scale
+
+class BatchQC:
+    """Vectorized checks of parsed IMMA columns.
+
+    Arguments:
+        d: external metadata dictionary, see load_dict()
+        sample_rate: share of rejected lines kept by sample(), 0 for none
+        seed: seed of the sampling
+    """
+    def __init__(self,d,sample_rate=0.,seed=None):
+        self.limits = dict((key,field_limits(d,field))
+            for key,field,_ in range_checks)
+        self.sample_rate = sample_rate
+        self.rng = np.random.default_rng(seed)
+
+    def check(self,cols,bad_dates):
+        """Reason codes of the records: 0 accepted, else 1 + index of the
+        first failed check in reject_reasons.
+        """
+        failed = [bad_dates,
+            np.isnan(cols['lat']) | np.isnan(cols['lon']),
+            np.isnan(cols['sst'])]
+        for key,field,reason in range_checks:
+            low,high = self.limits[key]
+            # comparisons with NaN are False, missing values pass here
+            failed.append((cols[key] < low) | (cols[key] > high))
+        codes = np.zeros(bad_dates.size,dtype=np.uint8)
+        for code,mask in reversed(list(enumerate(failed,1))):
+            codes[mask] = code
+        return codes
+
+    def tally(self,codes):
+        """Dictionary of reason -> number of records rejected for it."""
+        counts = np.bincount(codes,minlength=len(reject_reasons)+1)
+        return dict((reason,int(n))
+            for reason,n in zip(reject_reasons,counts[1:]))
+
+    def sample(self,buf,codes):
+        """Random sample of the rejected lines of buf, the uint8 array the
+        columns were parsed from.  Returns list of (reason, line).
+        """
+        if not self.sample_rate:
+            return list()
+        rejected = np.flatnonzero(codes)
+        rejected = rejected[self.rng.random(rejected.size) < self.sample_rate]
+        if not rejected.size:
+            return list()
+        starts,ends = line_bounds(buf)
+        return [(reject_reasons[codes[i]-1],
+            buf[starts[i]:ends[i]].tobytes().decode('latin-1'))
+            for i in rejected]
+
+class RejectLog:
+    """Tab-separated log of sampled rejects: source, reason, line.
+
+    Arguments:
+        filename: log file, appended to; None for no log
+    """
+    def __init__(self,filename=None):
+        self.f = open(filename,'a') if filename else None
+
+    def write(self,source,samples):
+        if self.f:
+            for reason,line in samples:
+                self.f.write('{}\t{}\t{}\n'.format(source,reason,line))
+
+    def close(self):
+        if self.f:
+            self.f.close()
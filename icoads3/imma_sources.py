@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+"""
+Sources of IMMA data: plain data files, data files compressed with gzip, bzip2
+or xz, and data files inside tar archives, plain or compressed, e.g., yearly
+tarballs of the monthly files.  Compressed sources are decompressed as they are
+read, so the archive never has to be inflated to disk before it is loaded.
+
+A source is named by its file name in the data location.  Members of tar
+archives are named by the archive and the member joined by member_separator:
+    'IMMA-MarineObs_icoads3.0.0_d186101_c2016.dat'
+    'IMMA-MarineObs_icoads3.0.0_d186101_c2016.dat.gz'
+    'icoads3.0.0_1861.tar.gz::IMMA-MarineObs_icoads3.0.0_d186101_c2016.dat'
+Source names keep the date substring of the data file, e.g., 'd186101', which
+retrieve_data_files() in 'create_icoads_database.py' matches on.
+
+Only plain data files can be read from an arbitrary offset, see seekable().
+All others are streams: tar archives are read once, front to back, for all the
+wanted members of a run, and background() moves the decompression onto a
+thread of its own so that it overlaps with parsing.
+
+Example:
+    sources = list_sources(data_location)
+    for source,chunk in background(source_chunks(data_location,sources,2**22)):
+        ... parse chunk, whole IMMA lines of source ...
+"""
+from itertools import groupby
+import bz2
+import gzip
+import hashlib
+import lzma
+import os
+import queue
+import tarfile
+import threading
+
+member_separator = '::'
+
+# compressed data files by suffix, and tar archive suffixes
+compressions = {'.gz':gzip.open, '.bz2':bz2.open, '.xz':lzma.open}
+archive_suffixes = ('.tar','.tar.gz','.tgz','.tar.bz2','.tbz2','.tar.xz',
+    '.txz')
+
+# (size, mtime) of archive members, filled as archives are listed
+member_stats = dict()
+
+# checksums of the files read, by path, with their (size, mtime)
+file_checksums = dict()
+
+def is_archive(filename):
+    return filename.endswith(archive_suffixes)
+
+def is_data_file(filename):
+    """IMMA data file, plain or compressed, e.g., 'xxx.dat' or 'xxx.dat.gz'."""
+    name = os.path.basename(filename)
+    return not is_archive(name) and (name.endswith('.dat')
+        or any(name.endswith('.dat'+suffix) for suffix in compressions))
+
+def split_source(source):
+    """Return the file name of a source, and its member name, None if the
+    source is not in an archive.
+    """
+    if member_separator in source:
+        return tuple(source.split(member_separator,1))
+    return source,None
+
+def join_source(archive,member):
+    return archive + member_separator + member
+
+def seekable(source):
+    """Plain data files can be read by byte ranges, all others are streams."""
+    filename,member = split_source(source)
+    return member is None and os.path.splitext(filename)[1] not in compressions
+
+def open_file(path):
+    """Open a data file for reading bytes, decompressing by its suffix."""
+    opener = compressions.get(os.path.splitext(path)[1],open)
+    return opener(path,'rb')
+
+def archive_members(path):
+    """Stream through a tar archive and return the names of its data files,
+    recording their size and mtime in member_stats.
+    """
+    members = list()
+    archive = os.path.basename(path)
+    with tarfile.open(path,'r|*') as tar:
+        for info in tar:
+            if info.isfile() and is_data_file(info.name):
+                members.append(info.name)
+                member_stats[join_source(archive,info.name)] = (
+                    info.size,float(info.mtime))
+    return members
+
+def list_sources(location):
+    """Return the sorted names of all sources in location: data files, plain or
+    compressed, and the data files inside tar archives.  Listing an archive
+    reads through it once.
+    """
+    (_, _, filenames) = next(os.walk(location))
+    sources = list()
+    for fn in filenames:
+        if is_archive(fn):
+            sources.extend(join_source(fn,member)
+                for member in archive_members(location+fn))
+        elif is_data_file(fn):
+            sources.append(fn)
+    sources.sort()
+    return sources
+
+def source_stat(location,source):
+    """Return (size, mtime) of a source: of the file on disk, or of the
+    member as recorded in its archive.
+    """
+    filename,member = split_source(source)
+    if member is None:
+        stat = os.stat(location+filename)
+        return stat.st_size,stat.st_mtime
+    if source not in member_stats:
+        archive_members(location+filename)
+    return member_stats[source]
+
+def file_checksum(filename,block_bytes=1024*1024):
+    """SHA-1 hex digest of a file, read block_bytes at a time."""
+    sha = hashlib.sha1()
+    with open(filename,'rb') as f:
+        for block in iter(lambda: f.read(block_bytes),b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def source_checksum(location,source):
+    """Checksum of the file holding a source, as stored on disk.  Members of an
+    archive share the checksum of the archive, computed once as long as its
+    size and mtime are unchanged.
+    """
+    path = location+split_source(source)[0]
+    stat = os.stat(path)
+    key = (stat.st_size,stat.st_mtime)
+    if path not in file_checksums or file_checksums[path][0] != key:
+        file_checksums[path] = (key,file_checksum(path))
+    return file_checksums[path][1]
+
+def open_sources(location,sources):
+    """Yield (source, binary file object) for sources, in order.  Members of
+    the same archive that follow each other are read in a single pass through
+    the archive, in the order they are stored.  Raises FileNotFoundError,
+    after the members found, if some are not in their archive.
+    """
+    archive_of = lambda source: split_source(source)[0]
+    for filename,group in groupby(sources,key=archive_of):
+        group = list(group)
+        if split_source(group[0])[1] is None:
+            for source in group:
+                with open_file(location+source) as f:
+                    yield source,f
+            continue
+        wanted = set(split_source(source)[1] for source in group)
+        with tarfile.open(location+filename,'r|*') as tar:
+            for info in tar:
+                if info.name in wanted:
+                    wanted.discard(info.name)
+                    yield join_source(filename,info.name),tar.extractfile(info)
+        if wanted:
+            raise FileNotFoundError('{}: members not found: {}'.format(
+                filename,', '.join(sorted(wanted))))
+
+def read_chunks(f,chunk_bytes):
+    """Yield blocks of whole lines from binary file f, each about chunk_bytes
+    long.  A line cut at the end of a block is carried over to the next one.
+    """
+    tail = b''
+    while True:
+        block = f.read(chunk_bytes)
+        if not block:
+            break
+        block = tail + block
+        cut = block.rfind(b'\n') + 1
+        if cut == 0:
+            # no complete line yet
+            tail = block
+            continue
+        tail = block[cut:]
+        yield block[:cut]
+    if tail:
+        yield tail
+
+def source_chunks(location,sources,chunk_bytes):
+    """Yield (source, block of whole lines) for all sources, in order.  Every
+    source yields at least one block, empty for an empty source.
+    """
+    for source,f in open_sources(location,sources):
+        empty = True
+        for chunk in read_chunks(f,chunk_bytes):
+            empty = False
+            yield source,chunk
+        if empty:
+            yield source,b''
+
+def background(iterable,depth=2):
+    """Run an iterator on a thread of its own, e.g., reading and decompressing
+    sources, handing its items over through a queue of at most depth items.
+    Exceptions of the iterator are raised in the consumer.
+    """
+    items = queue.Queue(depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # give up if the consumer is gone
+        while not stop.is_set():
+            try:
+                items.put(item,timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item,None)):
+                    return
+            put((done,None))
+        except BaseException as e:
+            put((done,e))
+
+    thread = threading.Thread(target=produce,daemon=True)
+    thread.start()
+    try:
+        while True:
+            item,error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+"""
+Day-of-year lookup tables for the yearly time intervals of
+yearly_time_intervals() in 'create_dictionary.py': months, half-months and
+pentads.  The tables are built once, on import, and turn the assignment of a
+pentad or half-month into an array lookup, for single dates or whole arrays of
+them.
+
+Days are indexed by their day in a leap year, 0-365, so that February 29 has
+its own entry and March 1 is day 60 in every year.
+
+Example:
+    dates = np.array(['1861-01-31','1861-03-04'],dtype='datetime64[D]')
+    pentads(dates)          => array([ 7, 13], dtype=int8)
+    half_months(dates)      => array([3, 5], dtype=int8)
+    pentad_half_months(13)  => 5
+    half_month_pentads(5)   => [13, 14, 15, 16]
+"""
+from icoads3.create_dictionary import yearly_time_intervals
+import numpy as np
+
+# first day of each month in a leap year, 0-based
+leap_month_starts = np.cumsum([0,31,29,31,30,31,30,31,31,30,31,30])
+
+def build_tables():
+    """Expand the yearly time intervals into lookup arrays.
+
+    Returns:
+        month_of_day, half_month_of_day, pentad_of_day: 366 entries each,
+            indexed by leap-year day
+        half_month_of_pentad: 74 entries, indexed by pentad (entry 0 unused)
+        pentads_of_half_month: dictionary half-month -> list of pentads
+    """
+    month_of_day = np.zeros(366,dtype=np.int8)
+    half_month_of_day = np.zeros(366,dtype=np.int8)
+    pentad_of_day = np.zeros(366,dtype=np.int8)
+    half_month_of_pentad = np.zeros(74,dtype=np.int8)
+    pentads_of_half_month = dict()
+
+    d = yearly_time_intervals()
+    for month in d:
+        for hmth in d[month]:
+            pentad_list = d[month][hmth]['pentads']
+            beg,end = (day_of_year(np.datetime64(date,'D'))
+                for date in d[month][hmth]['dates'])
+            month_of_day[beg:end+1] = int(month)
+            half_month_of_day[beg:end+1] = int(hmth)
+            # pentads are 5 days long, the last one takes the remaining days
+            for p,pentad in enumerate(pentad_list):
+                first = beg + 5*p
+                last = end if p == len(pentad_list)-1 else first + 4
+                pentad_of_day[first:last+1] = pentad
+                half_month_of_pentad[pentad] = int(hmth)
+            pentads_of_half_month[int(hmth)] = list(pentad_list)
+    return (month_of_day,half_month_of_day,pentad_of_day,
+        half_month_of_pentad,pentads_of_half_month)
+
+def day_of_year(dates):
+    """Leap-year day index, 0-365, of datetime64 dates (or anything
+    np.datetime64 accepts, e.g., datetime.date).
+    """
+    dates = np.asarray(dates,dtype='datetime64[D]')
+    months = dates.astype('datetime64[M]')
+    month = months.astype(np.int64) % 12
+    return leap_month_starts[month] + (dates - months).astype(np.int64)
+
+def pentads(dates):
+    """Pentads, 1-73, of dates."""
+    return pentad_of_day[day_of_year(dates)]
+
+def half_months(dates):
+    """Half-months, 1-24, of dates."""
+    return half_month_of_day[day_of_year(dates)]
+
+def months(dates):
+    """Months of the half-month scheme, 1-12, of dates.  These differ from
+    calendar months near month ends, e.g., January 31 is in month 2.
+    """
+    return month_of_day[day_of_year(dates)]
+
+def pentad_half_months(pentad_values):
+    """Half-months of pentads."""
+    return half_month_of_pentad[np.asarray(pentad_values,dtype=np.int64)]
+
+def half_month_pentads(hmonth):
+    """List of pentads of a half-month."""
+    return list(pentads_of_half_month[int(hmonth)])
+
+(month_of_day,half_month_of_day,pentad_of_day,
+    half_month_of_pentad,pentads_of_half_month) = build_tables()
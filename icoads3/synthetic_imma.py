@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+"""
+Synthetic IMMA data files for benchmarks, laid out after the field positions,
+types and scaled ranges of 'stored_dictionary.json', see 'create_dictionary.py'.
+
+Every core field gets a random scaled value within its min. and max., blank for
+a share of the records, and text fields a random string.  The fields ingest
+depends on are shaped after real data:
+    YR, MO, DY: valid dates, with a share of leap days, February 29
+    LAT, LON, SST: scaled decimals, including small values, e.g., '   5' for
+        0.5 C, which add_decimal() has to pad
+    SST: missing (blank) for a share of the records
+A share of the records carries the ICOADS attachment, ATTC 1.
+
+Example:
+    d = load_dict()
+    write_synthetic_file('bench/',d,1864,2,100000)
+        => 'bench/IMMA-MarineObs_icoads3.0.0_d186402_c00000000000000.dat'
+"""
+import os
+import numpy as np
+
+# share of records with a blank field, with a blank SST, on a leap day, and
+# with the ICOADS attachment
+blank_share = 0.2
+missing_sst_share = 0.15
+leap_day_share = 0.02
+attachment_share = 0.3
+
+# share of LAT, LON, SST values within +-99, i.e., less than three digits
+small_value_share = 0.1
+
+file_pattern = 'IMMA-MarineObs_icoads3.0.0_d{}{:02d}_c00000000000000.dat'
+
+def to_b36(values):
+    """Base36 digit strings of non-negative integers."""
+    digits = np.array(list('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    values = np.asarray(values)
+    out = digits[values % 36]
+    rest = values // 36
+    while rest.any():
+        out = np.where(rest > 0,np.char.add(digits[rest % 36],out),out)
+        rest = rest // 36
+    return out
+
+def field_strings(entry,values):
+    """Right-justified strings of the values of a field, as in the data line."""
+    width = entry['position'][1] - entry['position'][0]
+    if entry['type'] == 'b36':
+        strings = to_b36(values)
+    else:
+        strings = np.char.mod('%d',values)
+    return np.char.rjust(strings,width)
+
+def random_dates(rng,n,year,month=None):
+    """Valid dates in a year, or a month of it, with a share of leap days when
+    the year has one.
+    """
+    beg = np.datetime64('{}-{:02d}'.format(year,month or 1),'D')
+    end = (np.datetime64('{}-{:02d}'.format(year,month),'M') + 1 if month
+        else np.datetime64('{}'.format(year+1),'Y')).astype('datetime64[D]')
+    dates = beg + rng.integers(0,(end-beg).astype(int),n)
+    leap_day = np.datetime64('{}-02-29'.format(year),'D') \
+        if (year % 4 == 0 and year % 100 != 0) or year % 400 == 0 else None
+    if leap_day is not None and beg <= leap_day < end:
+        dates[rng.random(n) < leap_day_share] = leap_day
+    return dates
+
+def synthetic_lines(d,n,year,month=None,seed=0):
+    """Return n synthetic IMMA lines, as bytes, dated in year (and month)."""
+    rng = np.random.default_rng(seed)
+    core = [k for k in d if d[k].get('section','core') == 'core']
+    length = max(d[k]['position'][1] for k in core)
+    attm = sorted((k for k in d if d[k].get('section') == '1'),
+        key=lambda k: d[k]['position'][0])
+    attm_length = max(d[k]['position'][1] for k in attm) if attm else 0
+    lines = np.full((n,length+attm_length),ord(' '),dtype=np.uint8)
+
+    def put(key,strings,rows=slice(None),base=0):
+        beg,end = d[key]['position']
+        chars = np.char.encode(strings,'latin-1').astype('S{}'.format(end-beg))
+        lines[rows,base+beg:base+end] = \
+            chars.view(np.uint8).reshape(-1,end-beg)
+
+    def scaled(key,size):
+        return rng.integers(d[key]['min'],d[key]['max']+1,size)
+
+    # every field first, within its range or random text, some blank
+    for key in core + attm:
+        entry = d[key]
+        base = length if key in attm else 0
+        if entry['type'] == 'text':
+            width = entry['position'][1] - entry['position'][0]
+            codes = rng.integers(ord('A'),ord('Z')+1,(n,width)).astype(np.uint8)
+            strings = codes.view('S{}'.format(width)).ravel().astype(str)
+        else:
+            strings = field_strings(entry,scaled(key,n))
+        keep = rng.random(n) >= blank_share
+        put(key,strings[keep],keep,base)
+
+    # dates, positions and SST as ingest sees them
+    dates = random_dates(rng,n,year,month)
+    months = dates.astype('datetime64[M]')
+    put('YR',field_strings(d['YR'],dates.astype('datetime64[Y]').astype(int)
+        + 1970))
+    put('MO',field_strings(d['MO'],months.astype(int) % 12 + 1))
+    put('DY',field_strings(d['DY'],(dates - months).astype(int) + 1))
+    for key in ('LAT','LON','SST'):
+        values = scaled(key,n)
+        small = rng.random(n) < small_value_share
+        values[small] = rng.integers(-99,100,np.count_nonzero(small))
+        if key == 'LON':
+            values[small] = np.abs(values[small])
+        put(key,field_strings(d[key],values))
+    sst_beg,sst_end = d['SST']['position']
+    lines[rng.random(n) < missing_sst_share,sst_beg:sst_end] = ord(' ')
+
+    # attachment 1: ATTC, then ATTI and ATTL ahead of its fields; lines
+    # without it end with the core
+    attached = rng.random(n) < attachment_share
+    put('ATTC',field_strings(d['ATTC'],attached.astype(int)))
+    header = ' 1{:2d}'.format(attm_length).encode()
+    lines[attached,length:length+4] = np.frombuffer(header,dtype=np.uint8)
+    widths = np.where(attached,length+attm_length,length)
+    return b''.join(row[:width].tobytes() + b'\n'
+        for row,width in zip(lines,widths))
+
+def write_synthetic_file(location,d,year,month,n,seed=0):
+    """Write a monthly file of n synthetic records to location, named like the
+    ICOADS files.  Returns its path.
+    """
+    os.makedirs(location,exist_ok=True)
+    path = os.path.join(location,file_pattern.format(year,month))
+    with open(path,'wb') as f:
+        f.write(synthetic_lines(d,n,year,month,seed))
+    return path
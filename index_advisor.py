@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+"""
+Index maintenance for the obsdata table of the box database.  The analysis
+queries, see 'analysis.py', filter obsdata on:
+    box in (...), day between, pentad in (...): per-box series, e.g.,
+        mean_sst_by_year(), box_sst_data(), plain_time_series()
+    day between, grouped by box or pentad: dense_boxes(),
+        mean_sst_by_pentad(), all_sst_by_pentad()
+    lon_obs/lat_obs between, day between: radius_stats(), also limited to
+        the rows in the R*Trees of the positions, see 'orm/spatial_index.py'
+Each access path gets a composite index that also holds the columns the
+queries select, a covering index, so they are answered from the index alone.
+Every obsdata table, one per decade, see 'orm/obs_partitions.py', gets them,
+e.g., for obsdata_1860:
+    obsdata_1860_box_day: box, day, pentad, sst, lon_obs, lat_obs
+    obsdata_1860_day_box: day, box, pentad, sst
+    obsdata_1860_position: lat_obs, lon_obs, day, pentad, sst, box
+
+refresh_indexes() creates the indexes, recreates those whose columns changed,
+and runs ANALYZE so the query planner has statistics of the tables.  It has to
+be run again after merge_box_obs.py reloads obsdata.
+
+plan_report() runs the library's own queries, the analysis functions on a
+sample box and years, and reports the EXPLAIN QUERY PLAN of every statement.
+Statements that scan obsdata, or one of its indexes, in full are flagged.
+
+Example:
+    python3 index_advisor.py --refresh --report query_plans.json
+"""
+from orm.ocean_box_tables import db_box, ObsData
+from orm.bulk_writer import column_names
+from orm.obs_partitions import obs_tables, obs_source
+from orm.box_keys import box_name
+import argparse
+import json
+import re
+
+# covering indexes of each obsdata table: suffix of the index name, after the
+# table name -> ObsData fields
+covering_indexes = {
+    'box_day':['box','day','pentad','sst','lon_obs','lat_obs'],
+    'day_box':['day','box','pentad','sst'],
+    'position':['lat_obs','lon_obs','day','pentad','sst','box'],
+}
+
+def index_columns(database,index):
+    """Columns of an index, in order, empty if it does not exist."""
+    info = database.execute_sql('pragma index_info("{}");'.format(index))
+    return [row[2] for row in sorted(info)]
+
+def refresh_indexes(database=db_box,indexes=covering_indexes):
+    """Create the covering indexes of the obsdata tables, recreate those whose
+    columns changed, and run ANALYZE.  Returns the names of the indexes built.
+    """
+    built = list()
+    for table in obs_tables(database):
+        for suffix,fields in sorted(indexes.items()):
+            index = '{}_{}'.format(table,suffix)
+            columns = column_names(ObsData,fields)
+            existing = index_columns(database,index)
+            if existing == columns:
+                continue
+            if existing:
+                database.execute_sql('drop index "{}";'.format(index))
+            print('building index',index)
+            database.execute_sql('create index "{}" on "{}" ({});'.format(
+                index,table,','.join('"{}"'.format(c) for c in columns)))
+            built.append(index)
+        database.execute_sql('analyze "{}";'.format(table))
+    return built
+
+def drop_indexes(database=db_box,indexes=covering_indexes):
+    """Drop the covering indexes of the obsdata tables."""
+    for table in obs_tables(database):
+        for suffix in indexes:
+            database.execute_sql('drop index if exists "{}_{}";'.format(
+                table,suffix))
+
+def full_scan(detail,table):
+    """Whether a line of a query plan reads all of table, or all of one of its
+    indexes, e.g., 'SCAN obsdata' ('SCAN TABLE obsdata' before SQLite 3.36)
+    or 'SCAN obsdata_1860 USING INDEX obsdata_1860_box', rather than
+    searching it.
+    """
+    pattern = r'^SCAN (TABLE )?{}\b'.format(re.escape(table))
+    return re.match(pattern,detail.strip()) is not None
+
+def explain(database,sql,params=None):
+    """Details of the EXPLAIN QUERY PLAN of a statement."""
+    cursor = database.execute_sql('explain query plan '+sql,params or ())
+    return [row[-1] for row in cursor]
+
+class QueryRecorder:
+    """Records the select statements run on a database while active.  They are
+    still executed, so the functions run as usual.
+    """
+    def __init__(self,database):
+        self.database = database
+        self.statements = list()
+
+    def __enter__(self):
+        execute_sql = self.database.execute_sql
+        def record(sql,params=None,*args,**kwargs):
+            if sql.lstrip().lower().startswith('select'):
+                self.statements.append((sql,params))
+            return execute_sql(sql,params,*args,**kwargs)
+        self.database.execute_sql = record
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        del self.database.execute_sql
+
+def sample_calls(name,years):
+    """The analysis functions, with arguments, whose queries are reported."""
+    import analysis
+    year = years[0]
+    return [
+        ('box_sst_data',analysis.box_sst_data,([name],years),{}),
+        ('data_locations',analysis.data_locations,(name,years),{}),
+        ('sst_year_hmonth',analysis.sst_year_hmonth,(name,years),{}),
+        ('mean_sst_by_year',analysis.mean_sst_by_year,([name],years),
+            {'pentads':[1,2,3]}),
+        ('mean_sst_by_pentad',analysis.mean_sst_by_pentad,([name],years),{}),
+        ('mean_sst_by_pentad, all boxes',analysis.mean_sst_by_pentad,
+            (None,(year,year)),{}),
+        ('all_sst_by_pentad',analysis.all_sst_by_pentad,((year,year),),{}),
+        ('dense_boxes',analysis.dense_boxes,((year,year),),{}),
+        ('radius_stats',analysis.radius_stats,(500,name,years),{}),
+        ('yearly_data_time_series',analysis.yearly_data_time_series,
+            (name,years),{'hmonth':1}),
+        ('single_box_dist',analysis.single_box_dist,(name,years),{}),
+        ('plain_time_series',analysis.plain_time_series,(name,years),
+            {'hmonth':1}),
+    ]
+
+def plan_report(database=db_box,name=None,years=None,report=None):
+    """Run the analysis queries on a sample box and years and report their
+    query plans.  name: box, the first box of obsdata if None; years:
+    (first, last), the year of that box's first observation if None.
+
+    Returns list of entries with the function, its statements, their plans,
+    and whether any scans an obsdata table in full; written as JSON to report
+    if given.
+    """
+    import analysis
+    tables = obs_tables(database)
+    if name is None or years is None:
+        sql = 'select "{}", min(year) from {} limit 1;'.format(
+            column_names(ObsData,['box'])[0],obs_source(database))
+        first_key,first_year = list(database.execute_sql(sql))[0]
+        name = name or box_name(first_key)
+        years = years or (first_year,)*2
+
+    # the queries of the obsdata tables, not of the column store or summary
+    store,analysis.column_store = analysis.column_store,None
+    summary,analysis.summary = analysis.summary,False
+    entries = list()
+    try:
+        for label,func,args,kwargs in sample_calls(name,years):
+            entry = {'function':label, 'statements':[], 'error':None}
+            with QueryRecorder(database) as recorder:
+                try:
+                    func(*args,**kwargs)
+                except Exception as e:
+                    entry['error'] = repr(e)
+            for sql,params in recorder.statements:
+                plan = explain(database,sql,params)
+                entry['statements'].append({'sql':sql, 'plan':plan,
+                    'full_scan':any(full_scan(p,table)
+                        for p in plan for table in tables)})
+            entry['full_scan'] = any(s['full_scan']
+                for s in entry['statements'])
+            entries.append(entry)
+    finally:
+        analysis.column_store = store
+        analysis.summary = summary
+
+    for entry in entries:
+        flag = 'FULL SCAN' if entry['full_scan'] else 'ok'
+        print('{:32s} {}'.format(entry['function'],flag))
+        for statement in entry['statements']:
+            for detail in statement['plan']:
+                print('    ',detail)
+        if entry['error']:
+            print('     error:',entry['error'])
+    print('full scans:',sum(e['full_scan'] for e in entries),'of',
+        len(entries),'functions')
+    if report:
+        with open(report,'w') as f:
+            json.dump({'name':name, 'years':list(years), 'functions':entries},
+                f,indent=1)
+    return entries
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--refresh',action='store_true',
+        help='create or rebuild the covering indexes and run ANALYZE')
+    parser.add_argument('--drop',action='store_true',
+        help='drop the covering indexes')
+    parser.add_argument('--name',help='box of the sample queries')
+    parser.add_argument('--years',type=int,nargs=2,
+        help='first and last year of the sample queries')
+    parser.add_argument('--report',help='JSON file of the query plans')
+    args = parser.parse_args()
+    if args.drop:
+        drop_indexes()
+    if args.refresh:
+        refresh_indexes()
+    plan_report(name=args.name,years=args.years,report=args.report)
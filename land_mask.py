@@ -0,0 +1,200 @@
+"""
+Rasterized land mask for the on-land tests of grid generation, see
+ocean_grid().  The land polygons of a Basemap, in map coordinates, are
+rasterized once onto a grid of square cells: each cell holds the index of the
+polygon containing it, -1 at sea, or -2 on the coast, where an edge of a
+polygon passes through the cell or a neighbour.  Points are then classified
+with one array lookup; only points in coast cells are tested exactly against
+the polygons, with Path.contains_points().
+
+The raster is cached to disk as a .npz file, with a fingerprint of the
+polygons it was built from and its number of cells across, and rebuilt when
+either changes.
+
+Polygons are filled by scanlines: for each row of cell centers, the
+crossings of the polygon edges, paired left to right (even-odd rule).
+Polygons are expected not to overlap; where they do, a cell holds the lowest
+index, as the first polygon found by poly_bool().
+
+Example:
+    mask = cached_land_mask([p.boundary for p in m.landpolygons],
+        'data_sets/land_mask.npz')
+    mask.polygon_ids(np.array([[x0,y0],[x1,y1]]))   => array([-1, 12])
+    mask.land_counts(vertices[:,[2,3]])           => vertices on land, per box
+"""
+from matplotlib.path import Path
+import hashlib
+import os
+import numpy as np
+
+# cells across the width of the land polygons
+default_cells = 4096
+
+# values of sea and coast cells
+sea = -1
+coast = -2
+
+def polygons_fingerprint(polygons):
+    """Hash of the vertices of the polygons."""
+    digest = hashlib.sha1()
+    for vertices in polygons:
+        digest.update(np.ascontiguousarray(vertices,dtype='<f8').tobytes())
+    return digest.hexdigest()
+
+class LandMask:
+    """Raster of polygon indices over the extent of the polygons.
+
+    Arguments:
+        polygons: (k, 2) arrays of the vertices of the land polygons, in map
+            coordinates
+        cells: number of cells across the width of the polygons
+    """
+    def __init__(self,polygons,cells=default_cells,raster=None,extent=None):
+        self.cells = cells
+        self.polygons = [np.asarray(p,dtype=np.float64) for p in polygons]
+        self.paths = [Path(p) for p in self.polygons]
+        self.bounds = [(p.min(axis=0),p.max(axis=0)) for p in self.polygons]
+        self.fingerprint = polygons_fingerprint(self.polygons)
+        if raster is None:
+            vertices = np.concatenate(self.polygons)
+            x0,y0 = vertices.min(axis=0)
+            x1,y1 = vertices.max(axis=0)
+            self.cell = (x1 - x0)/cells
+            self.origin = (x0,y0)
+            self.shape = (int(np.ceil((y1 - y0)/self.cell))+1,cells+1)
+            self.raster = self.rasterize()
+        else:
+            self.raster = raster
+            self.shape = raster.shape
+            self.origin = tuple(extent[:2])
+            self.cell = extent[2]
+
+    @classmethod
+    def load(cls,path,polygons,cells=default_cells):
+        """Mask cached at path, None if it was built from other polygons or
+        with another number of cells.
+        """
+        with np.load(path) as cached:
+            if str(cached['fingerprint']) != polygons_fingerprint(polygons) \
+                    or 'cells' not in cached or int(cached['cells']) != cells:
+                return None
+            return cls(polygons,cells,raster=cached['raster'],
+                extent=cached['extent'])
+
+    def save(self,path):
+        """Cache the mask at path, a .npz file."""
+        np.savez_compressed(path,raster=self.raster,
+            extent=np.array(self.origin+(self.cell,)),
+            fingerprint=np.array(self.fingerprint),
+            cells=np.array(self.cells))
+
+    def cell_indices(self,pts):
+        """Row and column of the cells of points, (N, 2) arrays of x, y."""
+        pts = np.asarray(pts,dtype=np.float64)
+        cols = np.floor((pts[:,0] - self.origin[0])/self.cell).astype(np.int64)
+        rows = np.floor((pts[:,1] - self.origin[1])/self.cell).astype(np.int64)
+        return rows,cols
+
+    def rasterize(self):
+        """Raster of the polygons: filled, lowest index last, then the cells
+        along their edges marked as coast.
+        """
+        raster = np.full(self.shape,sea,dtype=np.int32)
+        for index in range(len(self.polygons)-1,-1,-1):
+            raster[self.fill(self.polygons[index])] = index
+        edges = np.zeros(self.shape,dtype=bool)
+        for vertices in self.polygons:
+            rows,cols = self.cell_indices(self.edge_points(vertices))
+            edges[rows,cols] = True
+        # neighbours too: an edge may cross a corner of a cell between samples
+        near = edges.copy()
+        near[1:] |= edges[:-1]
+        near[:-1] |= edges[1:]
+        near[:,1:] |= near[:,:-1].copy()
+        near[:,:-1] |= near[:,1:].copy()
+        raster[near] = coast
+        return raster
+
+    def fill(self,vertices):
+        """Cells whose centers are inside a polygon, as a boolean raster."""
+        inside = np.zeros((self.shape[0],self.shape[1]+1),dtype=np.int32)
+        x,y = vertices[:,0],vertices[:,1]
+        x2,y2 = np.roll(x,-1),np.roll(y,-1)
+        # rows of cell centers each edge crosses, with half-open spans
+        low = np.ceil((np.minimum(y,y2) - self.origin[1])/self.cell - 0.5)
+        high = np.ceil((np.maximum(y,y2) - self.origin[1])/self.cell - 0.5)
+        low = np.clip(low,0,self.shape[0]).astype(np.int64)
+        high = np.clip(high,0,self.shape[0]).astype(np.int64)
+        spans = high - low
+        edge = np.repeat(np.arange(x.size),spans)
+        rows = np.repeat(low,spans) + np.arange(spans.sum()) \
+            - np.repeat(np.cumsum(spans) - spans,spans)
+        yc = self.origin[1] + (rows + 0.5)*self.cell
+        xc = x[edge] + (yc - y[edge])*(x2[edge] - x[edge])/(y2[edge] - y[edge])
+        # crossings of each row, left to right, in pairs
+        order = np.lexsort((xc,rows))
+        rows,xc = rows[order],xc[order]
+        cols = np.ceil((xc - self.origin[0])/self.cell - 0.5)
+        cols = np.clip(cols,0,self.shape[1]).astype(np.int64)
+        np.add.at(inside,(rows[0::2],cols[0::2]),1)
+        np.add.at(inside,(rows[1::2],cols[1::2]),-1)
+        return np.cumsum(inside,axis=1)[:,:-1] > 0
+
+    def edge_points(self,vertices):
+        """Points along the edges of a polygon, at most half a cell apart."""
+        start = vertices
+        step = np.roll(vertices,-1,axis=0) - vertices
+        samples = np.ceil(np.hypot(step[:,0],step[:,1])/(self.cell/2))
+        samples = np.maximum(samples,1).astype(np.int64)
+        edge = np.repeat(np.arange(len(vertices)),samples)
+        fraction = (np.arange(samples.sum())
+            - np.repeat(np.cumsum(samples) - samples,samples))\
+            /np.repeat(samples,samples)
+        return start[edge] + fraction[:,None]*step[edge]
+
+    def polygon_ids(self,pts):
+        """Index of the polygon containing each point, -1 at sea."""
+        pts = np.asarray(pts,dtype=np.float64).reshape(-1,2)
+        rows,cols = self.cell_indices(pts)
+        within = (rows >= 0) & (rows < self.shape[0]) \
+            & (cols >= 0) & (cols < self.shape[1])
+        ids = np.full(len(pts),sea,dtype=np.int64)
+        ids[within] = self.raster[rows[within],cols[within]]
+        # exact tests near the coast, lowest index first
+        near = np.flatnonzero(ids == coast)
+        ids[near] = sea
+        for index,(path,(low,high)) in enumerate(zip(self.paths,self.bounds)):
+            if not near.size:
+                break
+            box = np.all((pts[near] >= low) & (pts[near] <= high),axis=1)
+            if not box.any():
+                continue
+            found = np.zeros(near.size,dtype=bool)
+            found[box] = path.contains_points(pts[near[box]])
+            ids[near[found]] = index
+            near = near[~found]
+        return ids
+
+    def land_counts(self,pts):
+        """Number of the points of each box on land, of an (N, k, 2) array of
+        k points of N boxes: those in the first polygon containing any of
+        them, as land_counts() in 'ocean_grid_overlay.py'.
+        """
+        pts = np.asarray(pts)
+        ids = self.polygon_ids(pts).reshape(pts.shape[:2])
+        land = np.where(ids >= 0,ids,len(self.polygons))
+        first = land.min(axis=1)
+        return np.count_nonzero(land == first[:,None],axis=1)*(
+            first < len(self.polygons))
+
+def cached_land_mask(polygons,path,cells=default_cells):
+    """Land mask of polygons, loaded from path if cached there from the same
+    polygons and cells, else built and saved at path.
+    """
+    if os.path.exists(path):
+        mask = LandMask.load(path,polygons,cells)
+        if mask is not None:
+            return mask
+    mask = LandMask(polygons,cells)
+    mask.save(path)
+    return mask
@@ -4,19 +4,22 @@ from matplotlib.patches import Polygon
 import matplotlib.patches as patches
 from matplotlib.collections import PolyCollection
 from observations_on_map import map_lons
-from datetime import date
 from time_series import *
 import matplotlib.pyplot as plt
 import numpy as np
 import math
 import transaction
-import ast
 import sys
 
 # --------------- 
 writing = False #  FLAG FOR OCEAN_BOX_TABLES
 # ---------------  
 from orm.ocean_box_tables import *
+from orm.box_geometry import box_vertices
+from orm.box_keys import box_name
+from orm.obs_partitions import obs_source
+from orm.query_params import Params
+from analysis import obs_values
 from plots import *
 # from analysis import dense_boxes
 # def populated_boxes(m,patches=False):
@@ -63,48 +66,43 @@ from plots import *
 #         m.scatter(x,y,.5,marker='o',color='g')
 
 def reconstruct_grid(m,ax=None):
-    all_vertices = list()
-    for box in Box.select(box.box_x_coords,box.box_y_coords):
-        all_vertices.append(list(zip(ast.literal_eval(box.box_x_coords), 
-            ast.literal_eval(box.box_y_coords))))
+    names,all_vertices = box_vertices(db_box,Box)
     coll = PolyCollection(all_vertices,facecolor='w',closed=True)
     ax.add_collection(coll)
 
 def populated_boxes(m,ax=None,num_pts=0,years=None):
     """Find the boxes that contain required data.  Then, add patches to map."""
-    # select date range of data (by year for now)
-    if years:
-        query = years_query(years)
-    else:
-        # otherwise, select all data
-        query = ObsData.select(ObsData.name)
-
-    populated_boxes = list()
-    for i,dat in enumerate(query.group_by(ObsData.name).having(
-            fn.Count(ObsData.name)>num_pts).iterator()):
-        for box in Box.select().where(Box.name==dat.name).iterator():
-            populated_boxes.append(list(zip(ast.literal_eval(box.box_x_coords), 
-                ast.literal_eval(box.box_y_coords))))
+    # select date range of data (by year for now), otherwise all data
+    params = Params()
+    sql = years_query(years,'box',params)\
+    + "group by box having count(box) > {};".format(params(num_pts))
+
+    names = box_name([row[0] for row in db_box.execute_sql(sql,params.values)])
+    names,populated_boxes = box_vertices(db_box,Box,names)
     coll = PolyCollection(populated_boxes,facecolor='r',closed=True)
     ax.add_collection(coll)
     return populated_boxes
 
-def years_query(years):
-    """Perform query on obsdata for a given range of years and on specific
-    'name' fields.
+def years_query(years,columns,params):
+    """SQL query of columns of obsdata for a given range of years, all years
+    if None, whose bounds are added to params, see 'orm/query_params.py'.
+    Only the obsdata tables of those years are read.
     """
-    date_min = date(years[0],1,1)
-    date_max = date(years[-1],12,31)
-    return ObsData.select().where(ObsData.date.between(date_min,date_max))
+    sql = "select {} from {} ".format(columns,obs_source(db_box,years))
+    if years:
+        sql = sql + "where year between {} and {} ".format(params(years[0]),
+            params(years[-1]))
+    return sql
 
 def data_coordinates(num_pts=0,years=None):
     # data_query = ObsData.select().group_by(ObsData.name).having(
     #     fn.Count(ObsData.name)>num_pts).naive().dicts()
     # account for year selection in the query, if there is any
-    if years:
-        data_query = years_query(years)
-    for dat in data_query.iterator():
-        yield dat['lon_obs'], dat['lat_obs']
+    params = Params()
+    sql = years_query(years,'{lon_obs},{lat_obs}'.format(**obs_values()),
+        params)
+    for lon_obs,lat_obs in db_box.execute_sql(sql,params.values):
+        yield lon_obs, lat_obs
 
 def plot_data(m,years=None):
     try:
@@ -134,57 +132,37 @@ def process_years(years):
 
 
 def mark_predom_boxes(m, ax=None,limit=5,years=None):
-    """Mark boxes that are most predominant on the map."""
-    date_min = date(years[0],1,1)
-    date_max = date(years[-1],12,31)
-    
+    """Mark boxes that are most predominant on the map.  Returns the
+    observations of the limit boxes with the most observations in years.
+    """
     # query most populated boxes
-    subquery = (ObsData
-        .select(ObsData.name)
-        .where(ObsData.date.between(date_min,date_max))
-        .group_by(ObsData.name)
-        .order_by(-fn.Count(ObsData.name))
-        .limit(limit)
-        .alias('subquery')
-    )
+    source = obs_source(db_box,years)
+    dates = "year between ? and ?"
+    subquery = "select box from {} where {} ".format(source,dates)\
+    + "group by box order by count(box) desc limit ?"
+    subquery_params = Params([years[0],years[-1],limit]).values
     
     # main query on time and most populated boxes
-    query = (ObsData
-        .select()
-        .join(subquery, on=(ObsData.name==subquery.c.name))
-        .where(ObsData.date.between(date_min,date_max)
-    ))
+    query = "select * from {} where {} ".format(source,dates)\
+    + "and box in ({});".format(subquery)
+    query_params = Params([years[0],years[-1]]).values + subquery_params
 
-    # for sq in subquery:
-    #     print(sq.name)
-    # print(list(subquery))
-    # print(len(list(query)))
+    # print(list(db_box.execute_sql(subquery,subquery_params)))
+    return list(db_box.execute_sql(query,query_params))
 
 
 def map_boxes(m,boxes,ax=None,centers=False,color='r'):
     """Specify box names, put them on the map."""
-    all_boxes = list()
-    lons = list()
-    lats = list()
-    for box_name in boxes:
-        # print(box_name)    
-        sql = "select box_x_coords,box_y_coords,box_center_lon,box_center_lat "\
-        + "from box "\
-        + "where name = '{}';".format(box_name)
-        try:
-            box_x_coords,box_y_coords,lon,lat = zip(*db_box.execute_sql(sql))
-            all_boxes.append(list(
-                zip(ast.literal_eval(box_x_coords[0]),ast.literal_eval(box_y_coords[0]))
-                )
-            )
-            lons.append(lon[0])
-            lats.append(lat[0])
-        except:
-            pass
+    names,all_boxes = box_vertices(db_box,Box,boxes)
     coll = PolyCollection(all_boxes,facecolor=color,closed=True)
     ax.add_collection(coll)
     # map the center of box marker
-    if centers == True:
+    if centers == True and names:
+        params = Params()
+        sql = "select box_center_lon,box_center_lat "\
+        + "from box "\
+        + "where name in {};".format(params.set(names,cast=str))
+        lons,lats = zip(*db_box.execute_sql(sql,params.values))
         x,y = m(lons,lats)
         m.scatter(x,y,s=100,alpha=.5)
     return all_boxes
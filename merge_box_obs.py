@@ -4,7 +4,13 @@
 
 Merge ocean data databases with the Box database.  Every piece of data is 
 matched by lon/lat coordinates to the respective box in a fixed-sized grid
-covering the ocean.  
+covering the ocean, and tagged with the integer key of the box, see 
+'orm/box_keys.py'.  Observations are stored in one obsdata table per decade,
+see 'orm/obs_partitions.py', and a decade can be reloaded on its own.  Once 
+loaded, each table is rewritten in (box, day) order, so the time series of a
+box is read from consecutive pages, the positions of its rows are indexed in
+an R*Tree, see 'orm/spatial_index.py', and the summary of the decades loaded, 
+see 'orm/obs_summary.py', is updated.
 
 """
 import sys
@@ -12,24 +18,42 @@ import os
 import logging
 from peewee import *
 from orm.ocean_box_tables import *
+from orm.bulk_writer import table_name
+from orm.obs_partitions import PartitionWriter, drop_partitions, decade, \
+    partition_years, migrate_unpartitioned
+from orm.obs_summary import update_summary
+from orm.day_numbers import day_number
+from orm.scaled_values import stored_scales, value_sql
+from orm.box_keys import box_key, box_indices
+from orm.spatial_index import box_extents_exist, box_at, \
+    build_box_extents, build_position_index
+from orm.query_params import Params
 
 def box_lookup(obs_lat,obs_lon):
     """
     Look up the box indices for a measurement taken at coordinates obs_lat 
-    and obs_lon.
+    and obs_lon.  Searches the R*Tree of the box cells when the grid has one, 
+    see 'orm/spatial_index.py'.  Raises LookupError (IndexError without the
+    R*Tree) if no box holds the point.
     
     """
+    if box_extents_exist(db_box):
+        key = box_at(db_box,obs_lat,obs_lon)
+        if key is None:
+            raise LookupError('no box at {}, {}'.format(obs_lat,obs_lon))
+        return box_indices(key)
     index_query = "select lat_index_id, lon_index-1 " \
         + "from longitude " \
         + "where " \
         + "lat_index_id in " \
         +   "(select lat_index-1 " \
-        +   "from latitude where lat_box > {} limit(1)) ".format(obs_lat) \
+        +   "from latitude where lat_box > ? limit(1)) " \
         + "and " \
-        + "lon_box > {} ".format(obs_lon) \
+        + "lon_box > ? " \
         + "limit(1); " 
 
-    i_lat, i_lon = list(db_box.execute_sql(index_query))[0]
+    i_lat, i_lon = list(db_box.execute_sql(index_query,
+        (float(obs_lat),float(obs_lon))))[0]
     return i_lat,i_lon
 
 def map_lons(lons,low=-180.,hi=180.):
@@ -47,81 +71,105 @@ def map_lons(lons,low=-180.,hi=180.):
             new_lons.append(lon)
     return new_lons
 
-def icoads_to_boxes():
+def icoads_to_boxes(years=None):
+    """Merge ICOADS observations into the obsdata tables, one per decade, see
+    'orm/obs_partitions.py'.  years: (first, last), reload only the decades
+    overlapping them, replacing their tables; all decades if None.
+    """
     # Import ICOADS data tables - they only pertain to this function
     from orm.icoads_data_tables import IcoadsData, db_obs
 
-    # Created (recreate) merged box and observations database
-    if ObsData.table_exists():
-        db_box.drop_table(ObsData)
-        db_box.create_table(ObsData)
-    else:
-        db_box.create_table(ObsData)
-
-    # set up objects for database inserts
-    dict_obs = dict()
-    data_obs = list()
+    # bulk writers of the decades' tables, box index built after the load
+    writer = PartitionWriter(db_box,
+        ['box','lat_obs','lon_obs','sst','day','year','pentad','half_mth'],
+        defer_indexes=True)
 
     # counting indices
-    total_icoads_inserts = 0
     icoads_errors = 0
 
-    with db_box.atomic():
-        for i, ic in enumerate(IcoadsData.select().iterator()):
+    # float values, whether the ICOADS table stores them scaled or not
+    scales = stored_scales(db_obs,IcoadsData)
+    query = "select {},{},{},date,pentad,half_mth from {}".format(
+        value_sql('lat',scales),
+        value_sql('lon',scales),
+        value_sql('sst',scales),
+        table_name(IcoadsData))
+    params = Params()
+    if years:
+        decades = list(range(decade(years[0]),years[-1]+1,partition_years))
+        reloaded = (decades[0],decades[-1]+partition_years-1)
+        query = query + " where date between {} and {}".format(
+            params('{}-01-01'.format(reloaded[0])),
+            params('{}-12-31'.format(reloaded[1])))
+    else:
+        decades,reloaded = None,None
+    query = query + ";"
+
+    # cells of the boxes, for grids built without them
+    if not box_extents_exist(db_box):
+        build_box_extents(db_box)
+
+    # Created (recreate) the obsdata tables replaced, in the transaction of 
+    # the load
+    with db_box.atomic(), writer:
+        # decades not reloaded, of a database merged before partitioning,
+        # are kept in their partitions
+        if decades:
+            migrate_unpartitioned(db_box)
+        drop_partitions(db_box,decades)
+        for i, (lat,lon,sst,date,pentad,half_mth) in enumerate(
+                db_obs.execute_sql(query,params.values)):
             try:
-                
-                # raises error if box_lookup does not work, i.e., can't find box
                 # map longitudes to the proper cooridnate system for processing
-                modified_lon = map_lons(ic.lon_obs)[0]
-                
-                name = '_'.join(map(str,box_lookup(ic.lat_obs,modified_lon)))
-                
-                # Creating list of obs data for insert
-                dict_obs.update({
-                    'name':name,
-                    'lat_obs':ic.lat_obs,
-                    'lon_obs':modified_lon,
-                    'sst':ic.sst,
-                    'date':ic.date,
-                    'pentad':ic.pentad,
-                    'half_mth':ic.half_mth}
-                )
-                data_obs.append(dict_obs.copy())
-            except:
+                modified_lon = map_lons(lon)[0]
+
+                # raises LookupError if box_lookup can't find the box
+                key = box_key(*box_lookup(lat,modified_lon))
+            except (LookupError,TypeError):
+                # no box, or no position (TypeError on a null lat or lon)
                 icoads_errors+=1
+            else:
+                # Creating list of obs data for insert; database errors of
+                # the writer propagate and roll the load back
+                writer.write([(key,lat,modified_lon,sst,day_number(date),
+                    int(str(date)[:4]),pentad,half_mth)])
 
-            # populating database tables
-            if i % 10000 == 0 and data_obs:    
-                with db_box.atomic():
-                    insert_limit = 400
-                    n_inserts = 0
-                    last_index = len(data_obs)-1
-                    while n_inserts <= last_index:
-                        upper = n_inserts + insert_limit
-                        if upper >= last_index:
-                            upper = last_index+1
-                        ObsData.insert_many(data_obs[n_inserts:upper]).execute()
-                        n_inserts = upper
-                    total_icoads_inserts += len(data_obs)
-                    print("Total ICOADS inserts: ", total_icoads_inserts)
-                    sys.stdout.flush()
-                    data_obs[:] = []
+            # rows written so far, committed with the whole load
+            if i % 10000 == 0:    
+                print("Total ICOADS inserts: ", writer.rows)
+                sys.stdout.flush()
 
-        # populating database tables, catch leftovers not inserted in the loop
-        with db_box.atomic():
-            if data_obs:
-                n_inserts = 0
-                last_index = len(data_obs)-1
-                while n_inserts <= last_index:
-                    upper = n_inserts + insert_limit
-                    if upper >= last_index:
-                        upper = last_index+1
-                    ObsData.insert_many(data_obs[n_inserts:upper]).execute()
-                    n_inserts = upper
-                total_icoads_inserts += len(data_obs)
-
-    print("total inserts of ICOADS data: ", total_icoads_inserts)
+    print("total inserts of ICOADS data: ", writer.rows)
     print("total errors inserting data:  ", icoads_errors)
+    for table in writer.tables:
+        cluster_obs_data(table)
+        build_position_index(db_box,table)
+    # summary rows of the years reloaded
+    print("summary rows updated:         ", update_summary(db_box,reloaded))
+
+def cluster_obs_data(table):
+    """Rewrite an obsdata table in (box, day) order.  SQLite stores rows in 
+    rowid order, so the rows of a box end up on consecutive pages.  Rows added 
+    later are appended at the end, until the table is clustered again.
+    """
+    old = table + '_unclustered'
+    schema = list(db_box.execute_sql("select sql from sqlite_master "
+        "where type = 'table' and name = ?;",(table,)))[0][0]
+    indexes = [row[0] for row in db_box.execute_sql("select sql "
+        "from sqlite_master where type = 'index' and tbl_name = ? "
+        "and sql is not null;",(table,))]
+    columns = [row[1] for row in 
+        db_box.execute_sql('pragma table_info("{}");'.format(table))
+        if row[1] != 'id']
+    columns = ','.join('"{}"'.format(c) for c in columns)
+    with db_box.atomic():
+        db_box.execute_sql('alter table "{}" rename to "{}";'.format(table,old))
+        db_box.execute_sql(schema)
+        db_box.execute_sql('insert into "{0}" ({2}) select {2} from "{1}" '
+            'order by box, day;'.format(table,old,columns))
+        db_box.execute_sql('drop table "{}";'.format(old))
+        for sql in indexes:
+            db_box.execute_sql(sql)
 
 def wod_to_boxes():
     # import WOD data tables - they only pertain to this function
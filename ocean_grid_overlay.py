@@ -12,6 +12,11 @@ import math
 import transaction
 from orm.ocean_box_tables import *
 from orm.icoads_data_tables import *
+from orm.bulk_writer import BulkWriter
+from orm.box_geometry import pack_coords
+from orm.box_keys import box_key
+from orm.spatial_index import build_box_extents
+from land_mask import cached_land_mask
 from observations_on_map import map_lons
 
 def lon_distance(Proj,pt1,pt2):
@@ -106,11 +111,28 @@ def make_box(proj,lon,lat,delphi,delthe):
     lats = list(lats)
     return lons,lats
 
+def box_corners(lons,lat,delphi,delthe):
+    """Corners of the boxes with lower-left corners at lons, lat, as make_box()
+    for arrays: the angular widths delphi may differ from box to box.
+
+    Returns:
+        (N, 4) arrays of the longitudes and latitudes of the corners, in the 
+        order of make_box()
+    """
+    lons = np.asarray(lons,dtype=np.float64)
+    aug_lon = lons + delphi
+    aug_lat = lat + delthe
+    corner_lons = np.stack([lons,lons,aug_lon,aug_lon],axis=-1)
+    corner_lats = np.empty_like(corner_lons)
+    corner_lats[:] = [lat,aug_lat,aug_lat,lat]
+    return corner_lons,corner_lats
+
 def lon_box_chain(proj,upper_lat,size=100000.,lon_0=0.,lat_0=0.,del_lon=50.):
     """Create adjoining boxes same latitude through specified longitudinal 
     angle.  Boxes start at Prime Meridian and travels East.
 
-    Also, returns the box angular width and height
+    Also, returns the box angular width and height.  The corners of the boxes
+    are (N, 4) arrays of longitudes and latitudes, see box_corners().
     """
     # Calculate increment of longitude (angular width), delta phi
     R = 6371000.
@@ -123,16 +145,13 @@ def lon_box_chain(proj,upper_lat,size=100000.,lon_0=0.,lat_0=0.,del_lon=50.):
     if lat_0 + delthe > upper_lat:
         delthe = upper_lat - lat_0 
     
-    # Calculate lons/lats for ll corner of each box
+    # Calculate lons for ll corner of each box, the last one ends at the
+    # eastern limit
     lons = lon_0 + np.arange(0.,del_lon,delphi)
-    lats = [lat_0 for lon in lons]
-    pts = list(zip(lons,lats))
-    boxes = list()
-    last = len(pts)-1
-    for ipt,pt in enumerate(pts):
-        if ipt == last:
-            delphi = lon_0 + del_lon - lons[-1]
-        boxes.append(make_box(proj,pt[0],lat_0,delphi,delthe))
+    widths = np.full(lons.size,delphi)
+    delphi = lon_0 + del_lon - lons[-1]
+    widths[-1] = delphi
+    boxes = box_corners(lons,lat_0,widths,delthe)
     return delthe,delphi,boxes
 
 def pick_polygons(m,polygons,lat,delthe=1.):
@@ -171,11 +190,34 @@ def poly_bool(pts,closed_paths):
     # return (p.contains_points(pts).any() for p in closed_paths)
     return (p.contains_points(pts) for p in closed_paths)
 
-def ocean_grid(plot=False,with_icoads=False):
+def land_counts(pts,closed_paths):
+    """Number of the points of each box on land: of an (N, k, 2) array of k 
+    points of N boxes, those in the first closed path containing any of them.
+    All points are tested against each path at once, see poly_bool().
+    """
+    pts = np.asarray(pts)
+    counts = np.zeros(len(pts),dtype=np.int64)
+    found = np.zeros(len(pts),dtype=bool)
+    for cp in poly_bool(pts.reshape(-1,2),closed_paths):
+        inside = cp.reshape(pts.shape[:2]).sum(axis=1)
+        first = ~found & (inside > 0)
+        counts[first] = inside[first]
+        found |= first
+    return counts
+
+def ocean_grid(plot=False,with_icoads=False,mask_file=None,lat_0=-80.,
+        del_lat=165.,box_size=100000.):
     """Create plot for creating boxes of (nearly) equal side lengths.  The map
     plot is a visual representation of the most important part, the grid.  The
     grid is an indexed by the lower lefthand corner of the boxes. 
 
+    The grid covers the latitudes from lat_0 through lat_0 + del_lat, with 
+    boxes of sides box_size, in meters.
+
+    With mask_file, box vertices are tested for land on a raster of the land
+    polygons cached there, see 'land_mask.py', and exactly only near the 
+    coast; otherwise against the polygons near each latitude row.
+
     Useful info:
         meters/mile = 1609.344
     """
@@ -193,32 +235,28 @@ def ocean_grid(plot=False,with_icoads=False):
         m = Basemap(projection='hammer',lat_0=50.,lon_0=-40.)
     # get boundaries of all land polygons
     polygons = [p.boundary for p in m.landpolygons]
+    mask = cached_land_mask(polygons,mask_file) if mask_file else None
     # set up sql tables
-    db_box.create_tables([Box,Latitude,Longitude,ObsData])
+    db_box.create_tables([Box,Latitude,Longitude])
     # parameters for ocean grid
-    lon_0 = -180.      # starting lat/lon
-    lat_0 = -80.
-    del_lon = 360.     # lat/lon spanned
-    del_lat = 165.
-    box_size = 100000. # length of each box side in meters
-    # set up for loop
-    d_box, d_lon = dict(), dict()    # dictionaries and lists sql insert 
-    data_box, data_lon = list(), list()
-    # d_
+    lon_0 = -180.      # starting lon
+    del_lon = 360.     # lon spanned
+    # set up for loop, bulk writers for sql insert
+    box_writer = BulkWriter(db_box,Box,['box_id','name','box_x_coords',
+        'box_y_coords','box_lons','box_lats','box_side','on_land'])
+    lon_writer = BulkWriter(db_box,Longitude,['box','lon_box','lon_index',
+        'lat_index'],defer_indexes=True).open()
     upper_lat = lat_0 + del_lat
     all_vertices = list()
     check_verts = [1,2]
     lat = lat_0
-    row, col = -1, -1
+    row = -1
 
     number_of_boxes = 0
     number_near_land = 0
 
     while lat < upper_lat:
-        d_box.clear()   # clear contents of dictionary for db insert
-        d_lon.clear()
         row += 1    # latitude (row) 
-        col = -1    # longitude (col)
         # return angular height, width, and the contiguous boxes
         delthe,delphi,boxes = lon_box_chain(
                     m,
@@ -228,94 +266,63 @@ def ocean_grid(plot=False,with_icoads=False):
                     del_lon=del_lon,
                     upper_lat=upper_lat
                     )
-        # subset of land polynomial within relevant lat range
-        subpolys = pick_polygons(m,polygons,lat,delthe)
         with db_box.transaction():  # add latitude to grid
-            latitude = Latitude.create(lat_box=lat,lat_index=row)
+            Latitude.create(lat_box=lat,lat_index=row)
+        # project the corners of the whole row at once, (N, 4) arrays
+        box_lons,box_lats = boxes
+        x,y = m(box_lons.ravel(),box_lats.ravel())
+        x = np.reshape(x,box_lons.shape)
+        y = np.reshape(y,box_lons.shape)
+        vertices = np.stack([x,y],axis=-1)
+        cols = np.arange(len(box_lons))     # longitude indices (cols)
+
+        # vertices on land: the western side of a box is the eastern side of 
+        # the box before it, checked for the first box only
+        if mask is not None:
+            east_on_land = mask.land_counts(vertices[:,[2,3]])
+            first_on_land = mask.land_counts(vertices[:1,[0,1]])
+        else:
+            # subset of land polynomial within relevant lat range
+            subpolys = pick_polygons(m,polygons,lat,delthe)
+            east_on_land = land_counts(vertices[:,[2,3]],subpolys)
+            first_on_land = land_counts(vertices[:1,[0,1]],subpolys)
+        west_on_land = np.concatenate([first_on_land,east_on_land[:-1]])
+        total_on_land = west_on_land + east_on_land
+
+        # if vertices on land less than specified amount, keep them
+        keep = np.flatnonzero(total_on_land < 2)
+        number_of_boxes += np.count_nonzero(total_on_land == 0)
+        number_near_land += np.count_nonzero(total_on_land == 1)
+        keys = box_key(row,cols[keep]).tolist()     # db keys of boxes
+        names = ['{}_{}'.format(row,c) for c in cols[keep]] # db names
+
         # out atomic, acts as a transaction
         with db_box.atomic():
-            for ibox,box in enumerate(boxes):
-                x,y = m(box[0],box[1])
-                vertices = list(zip(x,y))
-                east_verts = [vertices[i] for i in [2,3]]
-
-                col += 1                        # longitude index (col)
-                name = str(row)+"_"+str(col)    # db name of box
-                if col == 0:            # check western side of the box on land
-                    containing_polygons = poly_bool(
-                        [vertices[i] for i in [0,1]],subpolys
-                        )
-                    last_on_land_count = 0
-                    for cp in containing_polygons:
-                        if cp.any():
-                            last_on_land_count = sum(cp)
-                            break
-
-                # keep if all box vertices are on water
-                containing_polygons = list(poly_bool(east_verts,subpolys))
-                next_on_land_count = 0
-                for cp in containing_polygons:
-                    if cp.any():
-                        next_on_land_count = sum(cp)
-                        break # only one polygon
-
-                # count total vertices on land
-                total_on_land_count = last_on_land_count + next_on_land_count
-
-                # if vertices on land less than specified amount, keep them
-                if total_on_land_count < 2:
-                    
-                    if total_on_land_count == 0:
-                        number_of_boxes +=1 
-                    else:
-                        number_near_land +=1
-
-                    # update box table values
-                    d_box.update({'name':name ,
-                              'box_x_coords':x.__repr__(),
-                              'box_y_coords':y.__repr__(),
-                              'box_lons':box[0].__repr__(),
-                              'box_lats':box[1].__repr__(),
-                              'box_side':box_size,
-                              'on_land':False}
-                            )
-                    data_box.append(d_box.copy())
-
-                    # update longitude table values
-                    d_lon.update({'lat_box':latitude,
-                               'lon_box':box[0][0],
-                               'lon_index':col}
-                            )
-                    data_lon.append(d_lon.copy())
-
-                    # add points to plot
-                    if plot:
-                        all_vertices.append(vertices)
-
-                # update value, next become last on next iteration
-                last_on_land_count = next_on_land_count
-                if ibox % 100 == 0:
-                    if data_box:
-                        with db_box.atomic(): # insert rows atomically - savepoints
-                            Box.insert_many(data_box).execute()
-                            data_box[:] = []
-                    if data_lon:
-                        with db_box.atomic():
-                            Longitude.insert_many(data_lon).execute()
-                            data_lon[:] = []
-
-            # next latitude
-            lat = lat+delthe
-
-            # pick up rest of unstored data
-            if data_box:
-                with db_box.atomic():
-                    Box.insert_many(data_box).execute()
-                    data_box[:] = []
-            if data_lon:
-                with db_box.atomic():
-                    Longitude.insert_many(data_lon).execute()
-                    data_lon[:] = []
+            # box table values
+            box_writer.write(zip(keys,
+                      names,
+                      map(pack_coords,x[keep]),
+                      map(pack_coords,y[keep]),
+                      map(pack_coords,box_lons[keep]),
+                      map(pack_coords,box_lats[keep]),
+                      [box_size]*len(keep),
+                      [False]*len(keep)))
+
+            # longitude table values
+            lon_writer.write(zip(keys,box_lons[keep,0].tolist(),
+                cols[keep].tolist(),[row]*len(keep)))
+
+        # add points to plot
+        if plot:
+            all_vertices.extend(vertices[keep])
+
+        # next latitude
+        lat = lat+delthe
+
+    # pick up rest of unstored data, then index longitudes and box cells
+    box_writer.close()
+    lon_writer.close()
+    build_box_extents(db_box)
     db_box.close()
 
     print("Total number of boxes off land: ", number_of_boxes)
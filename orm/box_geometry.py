@@ -0,0 +1,109 @@
+"""
+Binary geometry of the grid boxes.  The four corners of a box, lower left,
+upper left, upper right, lower right (see make_box()), are stored per
+coordinate as packed little-endian float64 BLOBs of 32 bytes:
+    box_x_coords, box_y_coords: projected map coordinates
+    box_lons, box_lats: geographic coordinates
+
+box_vertices() loads the corners of any set of boxes with one query and
+decodes them all at once into an (N, 4, 2) array, ready for a PolyCollection.
+Tables written before, with repr() strings of the coordinates, are still
+read; convert_box_geometry() rewrites them as BLOBs.
+
+Example:
+    names,vertices = box_vertices(db_box,Box,['739_1853','494_1813'])
+    vertices.shape  => (2, 4, 2)
+    ax.add_collection(PolyCollection(vertices,closed=True))
+"""
+from peewee import BlobField
+from orm.bulk_writer import max_variables, table_name
+import re
+import numpy as np
+
+# corners of a box
+corners = 4
+
+# decimal numbers in repr() strings of coordinates, e.g., '[1.5, -2e-05]'
+number_pattern = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+def pack_coords(values):
+    """BLOB of the coordinates of the corners of a box."""
+    return np.asarray(values,dtype='<f8').tobytes()
+
+def unpack_coords(value):
+    """Coordinates of the corners of a box, from a BLOB or, for tables written
+    before, a repr() string.
+    """
+    if isinstance(value,str):
+        return np.array(number_pattern.findall(value),dtype=np.float64)
+    return np.frombuffer(bytes(value),dtype='<f8')
+
+class GeometryField(BlobField):
+    """Corner coordinates of a box, stored packed, see pack_coords()."""
+    def db_value(self,value):
+        if value is None or isinstance(value,(bytes,str)):
+            return super(GeometryField,self).db_value(value)
+        return super(GeometryField,self).db_value(pack_coords(value))
+
+    def python_value(self,value):
+        if value is None:
+            return None
+        return unpack_coords(value)
+
+def decode_column(values):
+    """(N, corners) array of a column of packed corner coordinates."""
+    if all(isinstance(v,(bytes,memoryview)) for v in values):
+        raw = b''.join(bytes(v) for v in values)
+        return np.frombuffer(raw,dtype='<f8').reshape(-1,corners)
+    return np.array([unpack_coords(v) for v in values]).reshape(-1,corners)
+
+def box_vertices(database,model,names=None,projected=True):
+    """Corners of boxes as an (N, 4, 2) array of (x, y), or (lon, lat) if not
+    projected.
+
+    Arguments:
+        database: peewee database of the box table
+        model: Box model, or the table name
+        names: box names, all boxes of the table if None
+
+    Returns:
+        names of the boxes found, in the order requested
+        their vertices
+    """
+    columns = ('box_x_coords','box_y_coords') if projected \
+        else ('box_lons','box_lats')
+    select = 'select name,{},{} from "{}" '.format(*columns,table_name(model))
+    if names is None:
+        rows = list(database.execute_sql(select+'order by name;'))
+    else:
+        if isinstance(names,str):
+            names = [names]
+        names = list(names)
+        found = dict()
+        batch = max_variables()
+        for i in range(0,len(names),batch):
+            chunk = names[i:i+batch]
+            sql = select + 'where name in ({});'.format(','.join('?'*len(chunk)))
+            for row in database.execute_sql(sql,chunk):
+                found[row[0]] = row
+        rows = [found[n] for n in names if n in found]
+    if not rows:
+        return list(),np.zeros((0,corners,2))
+    found_names,x,y = zip(*rows)
+    vertices = np.stack([decode_column(x),decode_column(y)],axis=-1)
+    return list(found_names),vertices
+
+def convert_box_geometry(database,model):
+    """Rewrite box corners stored as repr() strings as BLOBs."""
+    table = table_name(model)
+    columns = ['box_x_coords','box_y_coords','box_lons','box_lats']
+    sql = 'select name,{} from "{}";'.format(','.join(columns),table)
+    rows = [(row[0],[pack_coords(unpack_coords(v)) for v in row[1:]])
+        for row in database.execute_sql(sql)
+        if any(isinstance(v,str) for v in row[1:])]
+    update = 'update "{}" set {} where name = ?;'.format(table,
+        ','.join('{} = ?'.format(c) for c in columns))
+    with database.atomic():
+        for name,blobs in rows:
+            database.execute_sql(update,blobs+[name])
+    return len(rows)
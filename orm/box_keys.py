@@ -0,0 +1,49 @@
+"""
+Integer keys of the grid boxes.  A box is located by its latitude index (row)
+and longitude index (column), see ocean_grid(); the two are packed into one
+integer key,
+    key = lat_index*key_stride + lon_index
+so box '739_1853' has key 73901853.  Box, Longitude and ObsData refer to boxes
+by key; names, 'lat_index_lon_index', remain for display and as the box
+arguments of the analysis functions.
+
+Every function takes single values or NumPy arrays.
+
+Example:
+    box_key(739,1853)       => 73901853
+    box_indices(73901853)   => (739, 1853)
+    name_key('739_1853')    => 73901853
+    box_name(73901853)      => '739_1853'
+"""
+import numpy as np
+
+# longitude indices per latitude row: above the number of boxes in a row
+key_stride = 100000
+
+def box_key(lat_index,lon_index):
+    """Key of the box at lat_index, lon_index."""
+    return lat_index*key_stride + lon_index
+
+def box_indices(key):
+    """(lat_index, lon_index) of a box key."""
+    return divmod(key,key_stride)
+
+def name_key(name):
+    """Key of a box name, e.g., '739_1853'; keys are returned as they are."""
+    if isinstance(name,str):
+        lat_index,lon_index = map(int,name.split('_'))
+        return box_key(lat_index,lon_index)
+    return int(name)
+
+def name_keys(names):
+    """Keys of a box name, or of a list of names."""
+    if isinstance(names,(str,int,np.integer)):
+        names = [names]
+    return [name_key(n) for n in names]
+
+def box_name(key):
+    """Name of a box key, or list of names of an array of keys."""
+    if np.ndim(key):
+        return [box_name(k) for k in np.asarray(key).tolist()]
+    lat_index,lon_index = box_indices(int(key))
+    return '{}_{}'.format(lat_index,lon_index)
@@ -0,0 +1,198 @@
+"""
+Bulk loading of rows into SQLite tables.  Shared by ingest
+(create_icoads_database.py), grid construction (ocean_grid_overlay.py) and the
+merge of boxes and observations (merge_box_obs.py).
+
+Rows are tuples in the order of 'fields', or columns of NumPy arrays.  They are
+buffered, then written with a prepared multi-row INSERT through executemany(),
+each statement carrying as many rows as SQLite's limit on bound variables
+allows.  With defer_indexes, the indexes of the table are dropped for the load
+and rebuilt once at the end, rather than updated row by row.
+
+Values are given as floats; columns the table stores as scaled integers, see
+'scaled_values.py', are scaled as they are written.
+
+Example:
+    fields = ['lon','lat','sst','date','pentad']
+    with BulkWriter(db_obs,IcoadsData,fields) as writer:
+        writer.write_columns([columns[f] for f in fields])
+        writer.write([(12.5,-30.25,18.3,'1861-01-02',1)])
+    => icoadsdata: 26682 rows in 0.4 s, 66705 rows/s
+"""
+from itertools import chain
+from orm.scaled_values import stored_scales, scale_values
+import sqlite3
+import time
+import numpy as np
+
+def max_variables():
+    """SQLite's limit on bound variables per statement: 999 before version
+    3.32.0, 32766 since.
+    """
+    if sqlite3.sqlite_version_info >= (3,32,0):
+        return 32766
+    return 999
+
+def table_name(model):
+    """Table name of a peewee model (or a table name, returned as is)."""
+    if isinstance(model,str):
+        return model
+    meta = model._meta
+    return getattr(meta,'table_name',None) or meta.db_table
+
+def column_names(model,fields):
+    """Database column names of model fields, e.g., 'lat_index_id' for the
+    foreign key 'lat_index'.
+    """
+    if isinstance(model,str):
+        return list(fields)
+    columns = list()
+    for f in fields:
+        field = model._meta.fields[f]
+        columns.append(getattr(field,'column_name',None) or field.db_column)
+    return columns
+
+def raw_connection(database):
+    """The sqlite3 connection behind a peewee database."""
+    if hasattr(database,'get_conn'):
+        return database.get_conn()
+    return database.connection()
+
+def column_values(column):
+    """Python values of a column for binding: dates as 'YYYY-MM-DD' strings,
+    NumPy scalars as Python numbers.
+    """
+    column = np.asarray(column)
+    if np.issubdtype(column.dtype,np.datetime64):
+        strings = np.datetime_as_string(column,unit='D').astype(object)
+        strings[np.isnat(column)] = None
+        return strings.tolist()
+    return column.tolist()
+
+class BulkWriter:
+    """Buffered bulk insert into a single table.
+
+    Arguments:
+        database: peewee database holding the table
+        model: peewee model, or table name
+        fields: names of the fields of each row, in order
+        buffer_rows: rows buffered before they are written
+        defer_indexes: drop the table's indexes while loading, rebuild at close
+        report: print rows written and rows per second at close
+
+    rows counts the rows written as they are flushed, in a transaction nested
+    in that of the caller, if any: it includes rows that a failing enclosing
+    transaction rolls back.
+    """
+    def __init__(self,database,model,fields,buffer_rows=50000,
+            defer_indexes=False,report=True):
+        self.database = database
+        self.table = table_name(model)
+        self.columns = column_names(model,fields)
+        self.buffer_rows = buffer_rows
+        self.defer_indexes = defer_indexes
+        self.report = report
+        self.rows = 0
+        self.buffer = list()
+        self.deferred = list()
+        self.start_time = time.time()
+
+        # positions and scales of the columns stored as scaled integers
+        scales = stored_scales(database,self.table)
+        self.scaled = [(i,scales[c]) for i,c in enumerate(self.columns)
+            if c in scales]
+
+        # prepared statements, one row and as many rows as variables allow
+        n_cols = len(self.columns)
+        self.rows_per_statement = max(max_variables()//n_cols,1)
+        values = '(' + ','.join('?'*n_cols) + ')'
+        insert = 'insert into "{}" ({}) values '.format(
+            self.table,','.join('"{}"'.format(c) for c in self.columns))
+        self.single_sql = insert + values
+        self.multi_sql = insert + ','.join([values]*self.rows_per_statement)
+
+    def __enter__(self):
+        return self.open()
+
+    def open(self):
+        """Start the load: start timing, drop indexes if deferred."""
+        self.start_time = time.time()
+        if self.defer_indexes:
+            self.drop_indexes()
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        if exc_type is None:
+            self.close()
+        elif self.deferred:
+            self.restore_indexes()
+
+    def drop_indexes(self):
+        """Drop the indexes of the table, keeping their sql to rebuild them.
+        Automatic indexes (primary key, unique constraints) have no sql and
+        stay.
+        """
+        sql = "select name, sql from sqlite_master "\
+        + "where type = 'index' and tbl_name = ? and sql is not null;"
+        self.deferred = list(self.database.execute_sql(sql,(self.table,)))
+        for name,_ in self.deferred:
+            self.database.execute_sql('drop index "{}";'.format(name))
+
+    def restore_indexes(self):
+        """Rebuild the indexes dropped by drop_indexes()."""
+        for _,sql in self.deferred:
+            self.database.execute_sql(sql)
+        self.deferred = list()
+
+    def write(self,rows):
+        """Add rows, tuples of values in the order of fields."""
+        if self.scaled:
+            rows = map(self.scale_row,rows)
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.buffer_rows:
+            self.flush()
+
+    def write_columns(self,columns):
+        """Add rows given as columns, arrays in the order of fields."""
+        columns = list(columns)
+        for i,scale in self.scaled:
+            columns[i] = scale_values(columns[i],scale)
+        self.buffer.extend(zip(*[column_values(c) for c in columns]))
+        if len(self.buffer) >= self.buffer_rows:
+            self.flush()
+
+    def scale_row(self,row):
+        """Row with the values of scaled columns as integers."""
+        row = list(row)
+        for i,scale in self.scaled:
+            if row[i] is not None:
+                row[i] = int(round(row[i]*scale))
+        return tuple(row)
+
+    def flush(self):
+        """Write the buffered rows."""
+        rows = self.buffer
+        if not rows:
+            return
+        n = self.rows_per_statement
+        full = len(rows)//n*n
+        conn = raw_connection(self.database)
+        with self.database.atomic():
+            if full:
+                conn.executemany(self.multi_sql,
+                    (tuple(chain.from_iterable(rows[i:i+n]))
+                        for i in range(0,full,n)))
+            if full < len(rows):
+                conn.executemany(self.single_sql,rows[full:])
+        self.rows += len(rows)
+        self.buffer = list()
+
+    def close(self):
+        """Write the remaining rows, rebuild deferred indexes, report."""
+        self.flush()
+        if self.deferred:
+            self.restore_indexes()
+        if self.report:
+            seconds = time.time() - self.start_time
+            print("{}: {} rows in {:.1f} s, {:.0f} rows/s".format(
+                self.table,self.rows,seconds,self.rows/max(seconds,1e-9)))
@@ -0,0 +1,192 @@
+"""
+Columnar store of the box observations, an alternative to the obsdata table of
+the box database for analysis.  Each column is a NumPy '.npy' file, one
+directory per year, opened memory-mapped, so reading a column costs no copy:
+
+    data_sets/columns/index.json
+    data_sets/columns/1861/name.npy      int32 code of box name, see names
+                          /lat.npy       float64
+                          /lon.npy       float64
+                          /sst.npy       float64
+                          /date.npy      datetime64[D]
+                          /pentad.npy    int8
+
+Within a year, rows are sorted by box and date, so the rows of a box are a
+contiguous slice, found by binary search.  The index holds the column dtypes,
+the number of rows of each year and the box names, whose position in the list
+is their code.
+
+The store is built from the obsdata table with build_column_store().  Years are
+rebuilt as a whole, and the codes of box names already in the store are kept.
+
+Example:
+    build_column_store(db_box)
+    store = ColumnStore()
+    for year,cols in store.partitions((1861,1870),names=['739_1853']):
+        cols['sst'] => memory-mapped slice of the year's sst column
+    store.select((1861,1870),columns=['pentad','sst'])
+        => dictionary of arrays, concatenated over years
+"""
+from orm.ocean_box_tables import ObsData
+from orm.bulk_writer import column_names
+from orm.box_keys import box_name
+from orm.day_numbers import day_dates
+from orm.scaled_values import value_sql
+from orm.obs_partitions import obs_source, obs_scales
+from orm.query_params import Params
+import json
+import os
+import numpy as np
+
+store_location = 'data_sets/columns/'
+
+# columns of the store, their dtypes, and the ObsData fields they come from
+column_dtypes = {'name':'int32', 'lat':'float64', 'lon':'float64',
+    'sst':'float64', 'date':'datetime64[D]', 'pentad':'int8'}
+obsdata_fields = {'name':'box', 'lat':'lat_obs', 'lon':'lon_obs',
+    'sst':'sst', 'date':'day', 'pentad':'pentad'}
+store_columns = ['name','lat','lon','sst','date','pentad']
+
+def year_range(years):
+    """(first, last) year of a year, or of a sequence of years."""
+    if isinstance(years,(list,tuple)):
+        years = sorted(map(int,years))
+        return years[0],years[-1]
+    return int(years),int(years)
+
+def load_index(location=store_location):
+    """Metadata index of a store, an empty index if there is no store yet."""
+    path = os.path.join(location,'index.json')
+    if not os.path.exists(path):
+        return {'columns':column_dtypes, 'years':{}, 'names':[]}
+    with open(path,'r') as f:
+        return json.load(f)
+
+def save_index(index,location=store_location):
+    path = os.path.join(location,'index.json')
+    with open(path+'.tmp','w') as f:
+        json.dump(index,f)
+    os.replace(path+'.tmp',path)
+
+def build_column_store(database,years=None,location=store_location):
+    """Write the obsdata tables of database to the store, one partition per
+    year.  years: (first, last), all years of the tables if None.
+    """
+    names = column_names(ObsData,[obsdata_fields[c] for c in store_columns])
+    # values are read as floats, whether stored scaled or not
+    scales = obs_scales(database)
+    values = [value_sql(name,scales) for name in names]
+    if years is None:
+        sql = "select min(year), max(year) "\
+        + "from {};".format(obs_source(database))
+        years = list(database.execute_sql(sql))[0]
+        if years[0] is None:
+            return
+    first,last = year_range(years)
+
+    index = load_index(location)
+    codes = dict((name,code) for code,name in enumerate(index['names']))
+    for year in range(first,last+1):
+        params = Params()
+        sql = "select {} from {} ".format(','.join(values),
+            obs_source(database,year))\
+        + "where year = {} ".format(params(year))
+
+        rows = list(database.execute_sql(sql,params.values))
+        if not rows:
+            index['years'].pop(str(year),None)
+            continue
+        cols = dict(zip(store_columns,zip(*rows)))
+        cols['name'] = box_name(cols['name'])
+        for name in cols['name']:
+            if name not in codes:
+                codes[name] = len(index['names'])
+                index['names'].append(name)
+        cols['name'] = [codes[name] for name in cols['name']]
+        cols['date'] = day_dates(cols['date'])
+
+        # rows sorted by name code and date, the order of slices in partitions
+        arrays = dict((c,np.array(cols[c],dtype=column_dtypes[c]))
+            for c in store_columns)
+        order = np.lexsort((arrays['date'],arrays['name']))
+        year_dir = os.path.join(location,str(year))
+        os.makedirs(year_dir,exist_ok=True)
+        for c in store_columns:
+            np.save(os.path.join(year_dir,c+'.npy'),arrays[c][order])
+        index['years'][str(year)] = len(rows)
+        print(year,len(rows),'rows')
+    index['columns'] = column_dtypes
+    save_index(index,location)
+
+class ColumnStore:
+    """Read access to a columnar store.
+
+    Arguments:
+        location: directory of the store
+    """
+    def __init__(self,location=store_location):
+        self.location = location
+        self.index = load_index(location)
+        self.names = self.index['names']
+        self.codes = dict((name,code) for code,name in enumerate(self.names))
+
+    def years(self,years=None):
+        """Years of the store, within years, (first, last), if given."""
+        stored = sorted(map(int,self.index['years']))
+        if years is None:
+            return stored
+        first,last = year_range(years)
+        return [y for y in stored if first <= y <= last]
+
+    def column(self,year,column):
+        """Memory-mapped column of a year."""
+        path = os.path.join(self.location,str(year),column+'.npy')
+        return np.load(path,mmap_mode='r')
+
+    def name_codes(self,names):
+        """Codes of box names, names not in the store left out."""
+        if isinstance(names,str):
+            names = [names]
+        return [self.codes[n] for n in names if n in self.codes]
+
+    def partitions(self,years=None,names=None,pentads=None,columns=None):
+        """Yield (year, dictionary of columns) for the years in the store.
+
+        The columns of a whole year, or of a single box, are memory-mapped
+        views.  Selecting several boxes or pentads copies the selected rows.
+        """
+        columns = list(columns or store_columns)
+        codes = None if names is None else sorted(self.name_codes(names))
+        if isinstance(pentads,int):
+            pentads = [pentads]
+        for year in self.years(years):
+            # rows of the boxes: a slice for a single box, else row numbers
+            rows = slice(None)
+            if codes is not None:
+                name = self.column(year,'name')
+                beg = np.searchsorted(name,codes,side='left')
+                end = np.searchsorted(name,codes,side='right')
+                if len(codes) == 1:
+                    rows = slice(beg[0],end[0])
+                else:
+                    rows = np.concatenate([np.arange(b,e)
+                        for b,e in zip(beg,end)] + [np.zeros(0,dtype=int)])
+            if pentads is not None:
+                pentad = self.column(year,'pentad')
+                keep = np.isin(pentad[rows],pentads)
+                rows = np.arange(pentad.size)[rows][keep]
+            yield year,dict((c,self.column(year,c)[rows]) for c in columns)
+
+    def select(self,years=None,names=None,pentads=None,columns=None):
+        """Columns of the selected rows, concatenated over years."""
+        columns = list(columns or store_columns)
+        parts = [cols for _,cols in
+            self.partitions(years,names,pentads,columns)]
+        if len(parts) == 1:
+            return parts[0]
+        return dict((c,np.concatenate([p[c] for p in parts]) if parts
+            else np.zeros(0,dtype=column_dtypes[c])) for c in columns)
+
+    def decode_names(self,codes):
+        """Box names of name codes."""
+        return [self.names[c] for c in codes]
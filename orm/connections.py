@@ -0,0 +1,141 @@
+"""
+Connections to the SQLite databases of the project:
+    obs: ICOADS observations, see 'icoads_data_tables.py'
+    box: ocean box grid and box observations, see 'ocean_box_tables.py'
+    merge: merged boxes and observations, see 'merge_box_icoads_tables.py'
+
+Paths default to default_paths, relative to the working directory.  They are
+set by a JSON file named in CLIMATE_DB_CONFIG, e.g., {"box": "/data/box.db"},
+and by the variables CLIMATE_DB_OBS, CLIMATE_DB_BOX and CLIMATE_DB_MERGE,
+which take precedence; or at run time with configure().
+
+Each thread opens its own connection on its first query and keeps it, and a
+process started with fork drops the connections of its parent, so threads and
+worker processes never share one.  Databases are opened in one of the modes:
+    write: default; WAL journal, so readers go on while a load or merge
+        writes, and they see the last committed state
+    read: read-only URI (mode=ro), query_only, 256 MB page cache and 1 GB
+        memory map, for analysis; safe while another process writes
+    immutable: as read, but SQLite is told the file never changes
+        (immutable=1) and takes no locks; only for databases nothing writes to
+
+Example:
+    configure('box','/data/ocean_box_data.db',mode='read')
+    pool = Pool(8,initializer=open_read_only)  => each worker reads with its
+                                                  own read-only connections
+"""
+from peewee import SqliteDatabase
+from urllib.request import pathname2url
+import json
+import os
+
+default_paths = {
+    'obs':'databases/icoads_1861_1870.db',
+    'box':'data_sets/databases/ocean_box_data.db',
+    'merge':'databases/box_and_obs.db',
+}
+config_variable = 'CLIMATE_DB_CONFIG'
+
+# pragmas of databases opened for writing
+write_pragmas = {
+    'obs':(('journal_mode','WAL'),('synchronous',1)),
+    'box':(
+        ('journal_mode', 'WAL'),
+        ('cache_size', 980000),
+        ('synchronous',0),
+        ('mmap_size', 1024 * 1024 * 32),
+    ),
+    'merge':(('journal_mode','WAL'),('synchronous',1)),
+}
+
+# compiled statements kept by each connection for reuse; the analysis queries
+# bind their values, see 'query_params.py', so repeated calls hit the cache
+statement_cache = 256
+
+# pragmas of read-only databases: cache_size in KiB when negative
+read_pragmas = (
+    ('query_only',1),
+    ('cache_size',-256 * 1024),
+    ('mmap_size',1024 * 1024 * 1024),
+    ('temp_store',2),
+)
+
+modes = ('write','read','immutable')
+
+# open databases and their (path, mode), by name
+databases = dict()
+settings = dict()
+
+def configured_paths():
+    """Paths of the databases, from default_paths, the JSON file named in
+    CLIMATE_DB_CONFIG and the CLIMATE_DB_<NAME> variables.
+    """
+    paths = dict(default_paths)
+    config = os.environ.get(config_variable)
+    if config:
+        with open(config) as f:
+            paths.update(json.load(f))
+    for name in paths:
+        paths[name] = os.environ.get('CLIMATE_DB_'+name.upper(),paths[name])
+    return paths
+
+paths = configured_paths()
+
+def database_uri(path,mode):
+    """Filename given to sqlite3.connect(): the path to write, a URI to read."""
+    if mode == 'write':
+        return path
+    query = 'mode=ro' if mode == 'read' else 'immutable=1'
+    return 'file:{}?{}'.format(pathname2url(os.path.abspath(path)),query)
+
+def configure(name,path=None,mode='write'):
+    """Open database name at path, its configured path if None, in mode.  The
+    connection of the calling thread is closed; the next query opens a new one.
+    Returns the database, the same object the models are bound to.
+    """
+    if mode not in modes:
+        raise ValueError('mode {!r} not in {}'.format(mode,modes))
+    if name not in databases:
+        databases[name] = SqliteDatabase(None)
+    database = databases[name]
+    path = path or paths[name]
+    if not database.is_closed():
+        database.close()
+    if mode == 'write':
+        database.init(database_uri(path,mode),
+            pragmas=list(write_pragmas.get(name,())),
+            cached_statements=statement_cache)
+    else:
+        database.init(database_uri(path,mode),pragmas=list(read_pragmas),
+            uri=True,cached_statements=statement_cache)
+    settings[name] = (path,mode)
+    return database
+
+def database(name):
+    """Database name, opened to write at its configured path on first use."""
+    if name not in databases:
+        configure(name)
+    return databases[name]
+
+def open_read_only(mode='read',names=None):
+    """Reopen databases, all open ones if names is None, read-only, e.g., as
+    the initializer of the worker processes of parallel analysis jobs.
+    """
+    for name in names or list(databases):
+        configure(name,settings.get(name,(None,))[0],mode)
+
+def forget_connections():
+    """Drop the connections inherited from a parent process without closing
+    them: a SQLite connection must not be used across fork().
+    """
+    for database in databases.values():
+        # peewee 3 keeps connection state in _state, peewee 2 in _local
+        state = getattr(database,'_state',None) or database._local
+        state.conn = None
+        state.closed = True
+        for stack in ('ctx','context_stack','transactions'):
+            if hasattr(state,stack):
+                setattr(state,stack,[])
+
+if hasattr(os,'register_at_fork'):
+    os.register_at_fork(after_in_child=forget_connections)
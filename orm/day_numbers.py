@@ -0,0 +1,31 @@
+"""
+Dates of the box observations as integer day numbers: days since 1970-01-01,
+negative before, the integer value of NumPy datetime64[D].  ObsData stores the
+day number and the year of each observation, so queries filter and group on
+plain integer columns, which indexes serve, rather than on strftime() of a
+date string, and dates come back as datetime64 arrays with one cast.
+
+Example:
+    day_number('1861-01-02')      => -39810
+    year_days(1861,1870)          => (-39811, -36160)
+    day_dates([-39810,-39809])    => array(['1861-01-02', '1861-01-03'],
+                                        dtype='datetime64[D]')
+"""
+import numpy as np
+
+def day_number(value):
+    """Day number of a date, datetime64, or date string 'YYYY-MM-DD'."""
+    return int(np.datetime64(str(value)[:10],'D').astype(np.int64))
+
+def day_numbers(dates):
+    """Day numbers of an array of dates or date strings."""
+    return np.asarray(dates,dtype='datetime64[D]').astype(np.int64)
+
+def year_days(first,last):
+    """Day numbers of the first day of year first and the last of year last."""
+    return (day_number('{:04d}-01-01'.format(int(first))),
+        day_number('{:04d}-12-31'.format(int(last))))
+
+def day_dates(days):
+    """datetime64[D] array of day numbers."""
+    return np.asarray(days,dtype=np.int64).astype('datetime64[D]')
@@ -1,16 +1,54 @@
 from peewee import *
+from orm.scaled_values import value_field
+from orm.connections import database
 import os
 
-db_obs = SqliteDatabase('databases/icoads_1861_1870.db')
+# path and mode set in 'connections.py'
+db_obs = database('obs')
 
 class BaseModel(Model):
     class Meta:
         database = db_obs
 
+class IngestManifest(BaseModel):
+    """One row per ingested IMMA data file, see create_icoads_database.py.
+
+    Variable definitions:
+        filename: name of the data file in data_location
+        size/mtime/checksum: file size, modification time and SHA-1 digest
+            when it was ingested
+        lines/rows/errors: lines read, rows inserted and lines rejected by
+            quality control; the rest were dropped as duplicates
+        status: 'partial' while the file is loading, 'complete' once its rows
+            are committed
+        ingested: time the file was completed
+    """
+    filename = CharField(unique=True)
+    size = IntegerField()
+    mtime = FloatField()
+    checksum = CharField()
+    lines = IntegerField(default=0)
+    rows = IntegerField(default=0)
+    errors = IntegerField(default=0)
+    status = CharField(default='partial')
+    ingested = DateTimeField(null=True)
+
 class IcoadsData(BaseModel):
-    lat  = FloatField()
-    lon = FloatField()
-    sst = FloatField()
+    """Observations of the IMMA data files.  lat, lon and sst are scaled
+    integers when created with scaled_storage, see 'scaled_values.py'.
+    """
+    lat  = value_field(100)
+    lon = value_field(100)
+    sst = value_field(10)
     date = DateField()
     pentad = IntegerField(null=True)
-    half_mth = IntegerField(null=True)
\ No newline at end of file
+    half_mth = IntegerField(null=True)
+    source_file = ForeignKeyField(IngestManifest,null=True)
+
+class ObsHash(BaseModel):
+    """Hash of the date, hour, position, ID and SST of every IcoadsData row 
+    loaded since duplicate detection, see 'icoads3/imma_duplicates.py'.  The
+    hash is the primary key, SQLite's rowid, so the table is its own index.
+    """
+    hash = IntegerField(primary_key=True)
+    source_file = ForeignKeyField(IngestManifest)
@@ -1,6 +1,9 @@
 from peewee import *
 
-db_merge = SqliteDatabase('databases/box_and_obs.db')
+from orm.connections import database
+
+# path and mode set in 'connections.py'
+db_merge = database('merge')
 # print('hell', db_merge)
 
 class BoxObs(Model):
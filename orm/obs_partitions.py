@@ -0,0 +1,219 @@
+"""
+Decade partitions of the box observations.  Rows of ObsData are stored in one
+table per decade, obsdata_1850, obsdata_1860, ..., each with the columns and
+indexes of ObsData.  A query for a range of years reads only the partitions
+overlapping it: obs_source() gives the FROM source of the query, a single
+table, or the UNION ALL of the tables, whose WHERE terms SQLite pushes down
+into every table.  Reloading a decade replaces its table alone, see
+icoads_to_boxes() in 'merge_box_obs.py'.
+
+Databases merged before partitioning have the single table obsdata; it is
+read as long as there are no partitions.  Before a reload of some decades
+creates partitions, migrate_unpartitioned() moves its rows into the partitions
+of their decades, so the other decades stay readable.
+
+Example:
+    obs_tables(db_box,(1861,1872))  => ['obsdata_1860', 'obsdata_1870']
+    sql = "select sst from {} where year between 1861 and 1872;".format(
+        obs_source(db_box,(1861,1872)))
+    with PartitionWriter(db_box,fields) as writer:
+        writer.write(rows)          => rows go to the table of their decade
+"""
+from orm.ocean_box_tables import db_box, ObsData
+from orm.bulk_writer import BulkWriter, table_name
+from orm.scaled_values import stored_scales, value_sql
+from orm.spatial_index import rtree_table, build_position_index
+import re
+
+partition_years = 10
+
+# peewee models of the partitions, by decade
+partition_models = dict()
+
+def decade(year):
+    """First year of the decade of year."""
+    return year - year % partition_years
+
+def date_year(value):
+    """Year of a year, a date, or a date string 'YYYY-MM-DD'."""
+    if isinstance(value,int):
+        return value
+    return int(str(value)[:4])
+
+def partition_table(first_year):
+    """Table name of the partition of the decade starting at first_year."""
+    return '{}_{}'.format(table_name(ObsData),first_year)
+
+def partition_model(first_year):
+    """peewee model of the partition of the decade starting at first_year."""
+    if first_year not in partition_models:
+        name = partition_table(first_year)
+        # 'table_name' in peewee 3, 'db_table' in peewee 2
+        key = 'table_name' if hasattr(ObsData._meta,'table_name') \
+            else 'db_table'
+        partition_models[first_year] = type('ObsData{}'.format(first_year),
+            (ObsData,),{'Meta':type('Meta',(),{key:name}),
+                '__module__':__name__})
+    return partition_models[first_year]
+
+def partition_decades(database=db_box):
+    """First years of the decades with a partition, in order."""
+    pattern = re.compile(r'^{}_(\d+)$'.format(re.escape(table_name(ObsData))))
+    sql = "select name from sqlite_master where type = 'table';"
+    matches = [pattern.match(row[0]) for row in database.execute_sql(sql)]
+    return sorted(int(m.group(1)) for m in matches if m)
+
+def obs_tables(database=db_box,years=None):
+    """Tables of the observations of years, (first, last) as years, dates or
+    date strings, or a single year; all if None.  The unpartitioned table if
+    there are no partitions.
+    """
+    decades = partition_decades(database)
+    if not decades:
+        return [table_name(ObsData)]
+    if years is not None:
+        if not isinstance(years,(list,tuple)):
+            years = (years,years)
+        years = sorted(map(date_year,years))
+        decades = [d for d in decades if decade(years[0]) <= d <= years[-1]]
+    return [partition_table(d) for d in decades]
+
+def obs_source(database=db_box,years=None):
+    """FROM source of a query of the observations of years, see obs_tables():
+    a table, or a subquery of the UNION ALL of the tables.
+    """
+    tables = obs_tables(database,years)
+    if len(tables) == 1:
+        return '"{}"'.format(tables[0])
+    if not tables:
+        # no observations in these years: an empty source of the same columns
+        return '(select * from "{}" where 0)'.format(
+            partition_table(partition_decades(database)[0]))
+    return '({})'.format(' union all '.join(
+        'select * from "{}"'.format(table) for table in tables))
+
+def obs_scales(database=db_box):
+    """Columns of the observations stored as scaled integers, see
+    'scaled_values.py'; the partitions are all created alike.
+    """
+    return stored_scales(database,obs_tables(database)[0])
+
+def create_partition(database,first_year):
+    """Create the partition of the decade starting at first_year, if it does
+    not exist.  Returns its model.
+    """
+    model = partition_model(first_year)
+    database.create_tables([model],safe=True)
+    return model
+
+def migrate_unpartitioned(database=db_box):
+    """Move the rows of the unpartitioned table of a database merged before
+    partitioning into the partitions of their decades, in (box, day) order,
+    then drop it.  Values are converted if the storage of the partitions, see
+    'scaled_values.py', differs.  Returns the tables created.
+    """
+    legacy = table_name(ObsData)
+    sql = "select count(*) from sqlite_master where type = 'table' "\
+    + "and name = ?;"
+    if not list(database.execute_sql(sql,(legacy,)))[0][0]:
+        return []
+    columns = [row[1] for row in
+        database.execute_sql('pragma table_info("{}");'.format(legacy))
+        if row[1] != 'id']
+    if 'year' not in columns:
+        raise ValueError('"{}" has no year column: reload all years with '
+            'icoads_to_boxes()'.format(legacy))
+    legacy_scales = stored_scales(database,legacy)
+    sql = 'select distinct year - year % {} from "{}" order by 1;'.format(
+        partition_years,legacy)
+    decades = [row[0] for row in database.execute_sql(sql)]
+    tables = list()
+    with database.atomic():
+        for first_year in decades:
+            model = create_partition(database,first_year)
+            table = table_name(model)
+            scales = stored_scales(database,table)
+            values = list()
+            for column in columns:
+                value = value_sql(column,legacy_scales)
+                if column in scales:
+                    value = 'cast(round({}*{}) as integer)'.format(value,
+                        scales[column])
+                values.append(value)
+            database.execute_sql('insert into "{}" ({}) '.format(table,
+                ','.join('"{}"'.format(c) for c in columns))
+                + 'select {} from "{}" '.format(','.join(values),legacy)
+                + "where year between ? and ? order by box, day;",
+                (first_year,first_year+partition_years-1))
+            tables.append(table)
+        database.execute_sql('drop table "{}";'.format(legacy))
+        database.execute_sql('drop table if exists "{}";'.format(
+            rtree_table(legacy)))
+    for table in tables:
+        build_position_index(database,table)
+    return tables
+
+def drop_partitions(database,decades=None):
+    """Drop the partitions of decades, all partitions and the unpartitioned
+    table if None, and the R*Trees of their positions, see 'spatial_index.py'.
+    """
+    if decades is None:
+        tables = [partition_table(d) for d in partition_decades(database)]
+        tables.append(table_name(ObsData))
+    else:
+        tables = [partition_table(decade(d)) for d in decades]
+    for table in tables:
+        database.execute_sql('drop table if exists "{}";'.format(table))
+        database.execute_sql('drop table if exists "{}";'.format(
+            rtree_table(table)))
+
+class PartitionWriter:
+    """Bulk insert of observations into the partitions of their decades,
+    one BulkWriter per partition, created with the partition on first use.
+
+    Arguments:
+        database: peewee database of the partitions
+        fields: names of the fields of each row, in order, including year
+        writer_args: keyword arguments of the BulkWriters
+    """
+    def __init__(self,database,fields,**writer_args):
+        self.database = database
+        self.fields = fields
+        self.year_index = fields.index('year')
+        self.writer_args = writer_args
+        self.writers = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        for writer in self.writers.values():
+            writer.__exit__(exc_type,exc_value,traceback)
+
+    @property
+    def rows(self):
+        return sum(w.rows for w in self.writers.values())
+
+    @property
+    def tables(self):
+        """Tables written to."""
+        return [w.table for _,w in sorted(self.writers.items())]
+
+    def writer(self,first_year):
+        """BulkWriter of the partition of the decade starting at first_year."""
+        if first_year not in self.writers:
+            model = create_partition(self.database,first_year)
+            self.writers[first_year] = BulkWriter(self.database,model,
+                self.fields,**self.writer_args).open()
+        return self.writers[first_year]
+
+    def write(self,rows):
+        """Add rows, tuples of values in the order of fields."""
+        for row in rows:
+            first_year = decade(row[self.year_index])
+            self.writer(first_year).write([row])
+
+    def close(self):
+        """Write the remaining rows of every partition."""
+        for writer in self.writers.values():
+            writer.close()
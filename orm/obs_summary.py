@@ -0,0 +1,74 @@
+"""
+Summary of the box observations per box, year and pentad: the number of
+observations, and the sum and sum of squares of their SST, in the ObsSummary
+table.  Means and variances over any set of boxes, years and pentads follow
+from sums of these, see summary_values(), so the analysis functions that
+aggregate whole years, e.g., mean_sst_by_year() and dense_boxes(), read a few
+thousand summary rows rather than the observations.
+
+The merge updates the rows of the decades it reloads, see icoads_to_boxes();
+update_summary() recomputes them for any years.  The first update of a
+database merged before the table existed builds it for all years, whatever
+years it is given, so the summary always covers every observation.
+
+Example:
+    update_summary(db_box,(1860,1869))
+    sql = "select year, {mean}, {variance} from obssummary "\\
+        "where box = 73901853 group by year;".format(**summary_values())
+"""
+from orm.ocean_box_tables import db_box, ObsSummary
+from orm.obs_partitions import obs_source, obs_scales
+from orm.bulk_writer import table_name, column_names
+from orm.scaled_values import value_sql
+from orm.query_params import Params
+
+summary_fields = ['box','year','pentad','obs_count','sst_sum','sst_sumsq']
+
+def summary_values():
+    """SQL expressions of the number, mean and variance (population) of SST
+    over the summary rows of a query, used as format fields.
+    """
+    return {
+        'count':'sum(obs_count)',
+        'mean':'sum(sst_sum)/sum(obs_count)',
+        'variance':'(sum(sst_sumsq) - sum(sst_sum)*sum(sst_sum)/sum(obs_count))'\
+            '/sum(obs_count)',
+    }
+
+def summary_exists(database=db_box):
+    """Whether the summary table has been built."""
+    sql = "select count(*) from sqlite_master where type = 'table' "\
+    + "and name = ?;"
+    return list(database.execute_sql(sql,(table_name(ObsSummary),)))[0][0] > 0
+
+def update_summary(database=db_box,years=None):
+    """Recompute the summary rows of years, (first, last), from the obsdata
+    tables; all rows if None, or if the table does not exist yet.  Returns the
+    number of rows written.
+    """
+    if not summary_exists(database):
+        years = None
+    database.create_tables([ObsSummary],safe=True)
+    table = table_name(ObsSummary)
+    sst = value_sql('sst',obs_scales(database))
+    conditions = ['{} is not null'.format(sst)]
+    params = Params()
+    if years is None:
+        delete = 'delete from "{}";'.format(table)
+    else:
+        first,last = min(years),max(years)
+        delete = 'delete from "{}" where year between ? and ?;'.format(table)
+        conditions.append('year between {} and {}'.format(params(first),
+            params(last)))
+    columns = column_names(ObsSummary,summary_fields)
+    insert = 'insert into "{}" ({}) '.format(table,
+        ','.join('"{}"'.format(c) for c in columns))\
+    + "select box, year, pentad, "\
+    + "count({0}), sum({0}), sum({0}*{0}) ".format(sst)\
+    + "from {} ".format(obs_source(database,years))\
+    + "where {} ".format(' and '.join(conditions))\
+    + "group by box, year, pentad;"
+    with database.atomic():
+        database.execute_sql(delete,params.values)
+        cursor = database.execute_sql(insert,params.values)
+    return cursor.rowcount
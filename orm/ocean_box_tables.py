@@ -1,13 +1,11 @@
 from peewee import *
+from orm.scaled_values import value_field
+from orm.box_geometry import GeometryField
+from orm.box_keys import box_key
+from orm.connections import database
 
-db_box = SqliteDatabase('data_sets/databases/ocean_box_data.db',
-    pragmas=(
-    ('journal_mode', 'WAL'),
-    ('cache_size', 980000),
-    ('synchronous',0),
-    ('mmap_size', 1024 * 1024 * 32),
-    )
-)
+# path, mode and pragmas set in 'connections.py'
+db_box = database('box')
 
 class BaseModel(Model):
     class Meta:
@@ -17,22 +15,25 @@ class Box(BaseModel):
     """Class assigning data fields to each box row.
     
     Variable definitions:
+        box_id: integer key of box, see 'box_keys.py'
         name: string id of box, (lat_index)_(lon_index)
         x_coords/y-coords: projected map coordinates of box corners
-        lons/lats: geographic coordinates of box corners
+        lons/lats: geographic coordinates of box corners, both packed as 
+            float64 BLOBs, see 'box_geometry.py'
         area: area of given box
         sst: sea-surface temperature, to be filled from ICOADS data
     """
-    name = CharField(primary_key=True)      
-    box_x_coords = CharField()  
-    box_y_coords = CharField()
-    box_lons = CharField()      
-    box_lats = CharField()
+    box_id = IntegerField(primary_key=True)
+    name = CharField(unique=True)      
+    box_x_coords = GeometryField()  
+    box_y_coords = GeometryField()
+    box_lons = GeometryField()      
+    box_lats = GeometryField()
     box_area = FloatField(null=True) 
     box_side = FloatField() 
     on_land = BooleanField(default=True) 
     class Meta:
-        order_by = ('name',)
+        order_by = ('box_id',)
 
 class Latitude(BaseModel):
     """For each unique latitude a row of boxes are created longitudinally.
@@ -44,11 +45,11 @@ class Latitude(BaseModel):
         order_by = ('lat_box',)
 
 class Longitude(BaseModel):
-    """Longitude boxes reference their fixed latitude value.  'name' is also
+    """Longitude boxes reference their fixed latitude value.  'box' is also
     specified longitude index created.
     """
-    #       reference to Box
-    name = ForeignKeyField(Box,to_field='name',related_name='longitudes') 
+    #       reference to Box, by key
+    box = ForeignKeyField(Box,related_name='longitudes') 
     # lat_box = ForeignKeyField(Latitude,related_name="longitudes") # ref Latitude
     lon_box = FloatField() # the ll corner longitude of box
     lon_index = IntegerField() # longitude index
@@ -60,23 +61,50 @@ class Longitude(BaseModel):
         order_by = ('lon_box',)
 
 class ObsData(BaseModel):
-    """Observational data."""
-    name = ForeignKeyField(Box,to_field='name',related_name='data')
-    lat_obs = FloatField()
-    lon_obs = FloatField()
-    sst = FloatField()
-    date = DateField()
+    """Observational data.  lat_obs, lon_obs and sst are scaled integers 
+    when created with scaled_storage, see 'scaled_values.py'.
+
+    day is the date as a day number, days since 1970-01-01, and year its year,
+    see 'day_numbers.py'.
+
+    box is the integer key of the box, see 'box_keys.py'.  Rows are stored in
+    one table per decade with the fields of ObsData, see 'obs_partitions.py'.
+    Tables are rewritten in (box, day) order after they are loaded, so the
+    observations of a box are stored together, see cluster_obs_data() in 
+    'merge_box_obs.py'.
+    """
+    box = IntegerField(index=True)
+    lat_obs = value_field(100)
+    lon_obs = value_field(100)
+    sst = value_field(10)
+    day = IntegerField()
+    year = IntegerField()
     pentad = IntegerField(null=True)
     half_mth = IntegerField(null=True)
 
+class ObsSummary(BaseModel):
+    """Observations summarized per box, year and pentad: number, sum and sum 
+    of squares of SST, in degrees C, kept up to date by the merges, see 
+    'obs_summary.py'.
+    """
+    box = IntegerField()
+    year = IntegerField()
+    pentad = IntegerField(null=True)
+    obs_count = IntegerField()
+    sst_sum = FloatField()
+    sst_sumsq = FloatField()
+    class Meta:
+        primary_key = CompositeKey('box','year','pentad')
+        indexes = (
+            (('year','pentad'),False),
+        )
+
 if __name__ == '__main__':
 
     """
     !!! 
-        For this example to work, you have to reset the database folder in
-        'db_box' to the right one: '../data_sets/databases/ocean_box_data.db'. 
-
-        Make to set it again properly when done!
+        For this example to work, run it with the database path set to the
+        right one: CLIMATE_DB_BOX=../data_sets/databases/ocean_box_data.db
     !!!
     """
 
@@ -98,11 +126,11 @@ if __name__ == '__main__':
             i_lon = lon.lon_index-1
             break
 
-    # create 'name' from the lat and lon indices
-    name = "_".join([str(i_lat),str(i_lon)])
-    print('name: ',name,'\n')
+    # create the box key from the lat and lon indices
+    key = box_key(i_lat,i_lon)
+    print('box: ',key,'\n')
 
-    for box in Box.select(Box.box_lons,Box.box_lats).where(Box.name==name):
+    for box in Box.select(Box.box_lons,Box.box_lats).where(Box.box_id==key):
         print(lat_obs,lon_obs)
         print('box lats: ',box.box_lats)
         print('box lons: ',box.box_lons)
@@ -0,0 +1,68 @@
+"""
+Parameters of the raw SQL queries.  Values are bound to '?' placeholders
+rather than formatted into the SQL, so a query has the same text whatever the
+boxes, days or pentads asked for, and sqlite3 reuses its compiled statement,
+from the statement cache of each connection, see statement_cache in
+'connections.py'.  A set of values, e.g., the boxes of a region, is bound as a
+single JSON array read by json_each(), not a literal IN list of thousands of
+values; without JSON1, as one placeholder per value.
+
+Values are bound in the order they are added, which must be the order of the
+placeholders in the SQL: add them while building it, left to right.
+
+Example:
+    params = Params()
+    sql = "select sst from obsdata where box in {} and day between {} and {};"\\
+        .format(params.set(keys),params(day_min),params(day_max))
+        => "... box in (select value from json_each(?)) and day between ? ..."
+    db_box.execute_sql(sql,params.values)
+"""
+from datetime import date
+import json
+import sqlite3
+
+def json_available():
+    """Whether the SQLite library has the JSON1 functions."""
+    try:
+        sqlite3.connect(':memory:').execute("select json_array(1);")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+# sets of values bound as JSON arrays
+json_sets = json_available()
+
+def bind_value(value):
+    """Value as a type sqlite3 binds: NumPy scalars as Python numbers, dates
+    as 'YYYY-MM-DD' strings.
+    """
+    if hasattr(value,'item'):
+        value = value.item()
+    if isinstance(value,date):
+        return value.isoformat()[:10]
+    return value
+
+class Params:
+    """Parameters of a query, in the order of their placeholders.
+
+    Arguments:
+        values: initial parameters
+    """
+    def __init__(self,values=()):
+        self.values = [bind_value(v) for v in values]
+
+    def __call__(self,value):
+        """Add a value; returns its placeholder."""
+        self.values.append(bind_value(value))
+        return '?'
+
+    def set(self,values,cast=int):
+        """Add a set of values, each converted by cast; returns the
+        parenthesized source of an IN condition.
+        """
+        values = [cast(bind_value(v)) for v in values]
+        if json_sets:
+            self.values.append(json.dumps(values))
+            return '(select value from json_each(?))'
+        self.values.extend(values)
+        return '({})'.format(','.join('?'*len(values)))
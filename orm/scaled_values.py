@@ -0,0 +1,127 @@
+"""
+Scaled-integer storage of observation values.  IMMA stores positions and SST
+as integers with implied decimals, see add_decimal(); rather than 8-byte REAL
+columns, tables may keep them as integers in those native units:
+    lat, lon, lat_obs, lon_obs: hundredths of a degree
+    sst: tenths of a degree C
+SQLite stores small integers in 1 to 4 bytes, so rows, and the databases, are
+much smaller and more of them fit in the page cache.
+
+With scaled_storage set, IcoadsData and ObsData tables are created with
+scaled columns, see value_field(); it is read from the variable
+CLIMATE_DB_SCALED, e.g., CLIMATE_DB_SCALED=1, and may be changed at any time
+before the tables are created.  Tables already created keep their storage,
+whatever scaled_storage: the ORM fields decode the values by the storage of
+their table, and code reading or writing the tables without the ORM looks it up
+with stored_scales(), so both kinds of tables can be read.  Values are
+converted to floats only when they are read for analysis: by the ORM, by
+value_sql() expressions in raw SQL, and by the column store.
+
+Example:
+    scales = stored_scales(db_box,ObsData)      => {'sst': 10, ...} or {}
+    "select avg({}) from obsdata;".format(value_sql('sst',scales))
+        => "select avg((sst/10.0)) from obsdata;"
+    value_between('sst',10,12,scales)  => 'sst between 100 and 120'
+"""
+from peewee import FloatField
+import numpy as np
+import os
+
+scaled_variable = 'CLIMATE_DB_SCALED'
+
+# store newly created observation tables with scaled integers
+scaled_storage = os.environ.get(scaled_variable,'') not in ('','0')
+
+# scale of the values of each column, stored value = round(value*scale)
+value_scales = {'lat':100, 'lon':100, 'lat_obs':100, 'lon_obs':100, 'sst':10}
+
+# stored scales of the tables found, by (id, filename) of their database and
+# table name, see stored_scales()
+table_scales = dict()
+
+class ValueField(FloatField):
+    """Float value, stored as a float or as an integer, value*scale, e.g., an
+    SST of 18.3 C as 183.  The column is created as an integer if
+    scaled_storage is set when its table is created.  Values are decoded by
+    the storage of the table: SQLite returns floats from REAL columns, so
+    integers read come from scaled columns.
+    """
+    def __init__(self,scale,*args,**kwargs):
+        self.scale = scale
+        super(ValueField,self).__init__(*args,**kwargs)
+
+    # column type of the DDL: 'field_type' in peewee 3, 'db_field' in peewee 2
+    @property
+    def field_type(self):
+        return 'INT' if scaled_storage else 'FLOAT'
+
+    @property
+    def db_field(self):
+        return 'int' if scaled_storage else 'float'
+
+    def table_scaled(self):
+        """Whether the column is stored scaled in the table of its model."""
+        model = getattr(self,'model',None) or self.model_class
+        database = model._meta.database
+        meta = model._meta
+        table = getattr(meta,'table_name',None) or meta.db_table
+        key = (id(database),database.database,table)
+        if key not in table_scales:
+            stored_scales(database,table)
+        return self.name in table_scales.get(key,())
+
+    def db_value(self,value):
+        if value is None:
+            return None
+        if self.table_scaled():
+            return int(round(float(value)*self.scale))
+        return float(value)
+
+    def python_value(self,value):
+        if isinstance(value,int):
+            return value/float(self.scale)
+        return value if value is None else float(value)
+
+def value_field(scale,**kwargs):
+    """Field of an observation value, see ValueField."""
+    return ValueField(scale,**kwargs)
+
+def stored_scales(database,table):
+    """Dictionary of column -> scale of the value columns of table (a name or
+    a model) stored as scaled integers, empty for float storage.
+    """
+    if not isinstance(table,str):
+        meta = table._meta
+        table = getattr(meta,'table_name',None) or meta.db_table
+    info = list(database.execute_sql('pragma table_info("{}");'.format(table)))
+    scales = dict((name,value_scales[name]) for _,name,kind,_,_,_ in info
+        if name in value_scales and kind.upper().startswith('INT'))
+    if info:
+        table_scales[(id(database),database.database,table)] = scales
+    return scales
+
+def value_sql(column,scales):
+    """SQL expression of the float value of a column, see stored_scales()."""
+    if column in scales:
+        return '({}/{:.1f})'.format(column,scales[column])
+    return column
+
+def stored_bounds(column,low,high,scales):
+    """Bounds low, high of the value of a column in its stored units."""
+    if column in scales:
+        return low*scales[column],high*scales[column]
+    return low,high
+
+def value_between(column,low,high,scales,params=None):
+    """SQL condition that the value of a column is within [low,high].  The
+    bounds are scaled rather than the column, so an index on it can be used.
+    With params, see 'query_params.py', the bounds are bound to placeholders.
+    """
+    low,high = stored_bounds(column,low,high,scales)
+    if params is not None:
+        low,high = params(low),params(high)
+    return '{} between {} and {}'.format(column,low,high)
+
+def scale_values(values,scale):
+    """Scaled integers of an array of float values."""
+    return np.rint(np.asarray(values,dtype=np.float64)*scale).astype(np.int64)
@@ -0,0 +1,137 @@
+"""
+R*Tree indexes of the box grid and of the observation positions, SQLite
+virtual tables answering rectangle queries in logarithmic time.
+
+box_extent holds the cell of each box key in lat/lon: the rectangle that
+box_lookup() in 'merge_box_obs.py' resolves to the key, between a latitude of
+the grid and the next, and between the longitude of the previous box of the
+row and that of the box.  box_at() finds the cell of a point with one R*Tree
+search, rather than a search of latitude and a scan of the longitudes of its
+row.  The R*Tree keeps 32-bit floats, rounded outwards, so the exact float
+bounds are kept as auxiliary columns and the cell is checked against them.
+ocean_grid() builds it with the grid, and the merge for a grid built before.
+
+Every obsdata table, e.g., obsdata_1860, has the R*Tree obsdata_1860_rtree of
+the positions of its rows, by rowid, in the stored units of the table, see
+'scaled_values.py'.  position_source() reads the rows within a rectangle, e.g.,
+the candidates of radius_stats() in 'analysis.py'.  The merge builds it after
+the table is loaded and clustered, since clustering renumbers the rows.
+
+Example:
+    build_box_extents(db_box)
+    box_at(db_box,5.0,-150.0)           => key of the box, see 'box_keys.py'
+    build_position_index(db_box,'obsdata_1860')
+    "select * from {};".format(position_source(db_box,['obsdata_1860'],
+        (400,600),(-15300,-14700),params))
+"""
+from orm.box_keys import key_stride
+import sqlite3
+
+# table of the box cells
+extent_table = 'box_extent'
+
+# lower bound of the longitude of the first cell of a row
+unbounded = -1.0e6
+
+# databases, by (id, filename), known to have box_extent
+extent_databases = set()
+
+def rtree_available():
+    """Whether the SQLite library has the R*Tree module."""
+    try:
+        sqlite3.connect(':memory:').execute(
+            "create virtual table temp.rtree_check using rtree(id,x0,x1);")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+def rtree_table(table):
+    """Name of the R*Tree of the positions of an obsdata table."""
+    return '{}_rtree'.format(table)
+
+def table_names(database):
+    """Names of the tables of database, virtual tables included."""
+    sql = "select name from sqlite_master where type = 'table';"
+    return set(row[0] for row in database.execute_sql(sql))
+
+def box_extents_exist(database):
+    """Whether database has the box cells, remembered once found."""
+    key = (id(database),database.database)
+    if key not in extent_databases and extent_table in table_names(database):
+        extent_databases.add(key)
+    return key in extent_databases
+
+def build_box_extents(database):
+    """(Re)build the box cells from the latitude and longitude tables.
+    Returns the number of cells, None without the R*Tree module.
+    """
+    if not rtree_available():
+        return None
+    cells = "select lon.lat_index_id*{}+lon.lon_index-1 as id, ".format(
+        key_stride)\
+    + "low.lat_box as lat_low, high.lat_box as lat_high, "\
+    + "coalesce(lag(lon.lon_box) over (partition by lon.lat_index_id "\
+    + "order by lon.lon_box),{}) as lon_low, ".format(unbounded)\
+    + "lon.lon_box as lon_high "\
+    + "from longitude lon "\
+    + "join latitude low on low.lat_index = lon.lat_index_id "\
+    + "join latitude high on high.lat_index = lon.lat_index_id+1"
+    with database.atomic():
+        database.execute_sql('drop table if exists "{}";'.format(extent_table))
+        database.execute_sql('create virtual table "{}" using rtree('
+            'id,min_lat,max_lat,min_lon,max_lon,'
+            '+lat_low,+lat_high,+lon_low,+lon_high);'.format(extent_table))
+        cursor = database.execute_sql('insert into "{}" '.format(extent_table)
+            + "select id,lat_low,lat_high,lon_low,lon_high,"
+            + "lat_low,lat_high,lon_low,lon_high from ({});".format(cells))
+    extent_databases.add((id(database),database.database))
+    return cursor.rowcount
+
+def box_at(database,lat,lon):
+    """Key of the box whose cell contains lat, lon; None if there is none."""
+    sql = 'select id from "{}" '.format(extent_table)\
+    + "where min_lat <= ?1 and max_lat >= ?1 "\
+    + "and min_lon <= ?2 and max_lon >= ?2 "\
+    + "and lat_low <= ?1 and lat_high > ?1 "\
+    + "and lon_low <= ?2 and lon_high > ?2 "\
+    + "limit 1;"
+    for row in database.execute_sql(sql,(float(lat),float(lon))):
+        return row[0]
+    return None
+
+def build_position_index(database,table):
+    """(Re)build the R*Tree of the positions of an obsdata table.  Returns
+    the number of positions, None without the R*Tree module.
+    """
+    if not rtree_available():
+        return None
+    rtree = rtree_table(table)
+    with database.atomic():
+        database.execute_sql('drop table if exists "{}";'.format(rtree))
+        database.execute_sql('create virtual table "{}" using rtree('
+            'id,min_lat,max_lat,min_lon,max_lon);'.format(rtree))
+        cursor = database.execute_sql('insert into "{}" '.format(rtree)
+            + "select rowid,lat_obs,lat_obs,lon_obs,lon_obs "
+            + 'from "{}" '.format(table)
+            + "where lat_obs is not null and lon_obs is not null;")
+    return cursor.rowcount
+
+def position_source(database,tables,lats,lons,params):
+    """FROM source of the rows of obsdata tables whose position is within
+    lats, (low, high), and lons, in the stored units of the tables, as
+    obs_source() in 'obs_partitions.py'; the bounds are added to params, see
+    'query_params.py'.  None if a table has no R*Tree.  The R*Trees round
+    outwards, so the source holds all rows within, and possibly a few more.
+    """
+    existing = table_names(database)
+    if not tables or any(rtree_table(t) not in existing for t in tables):
+        return None
+    selects = list()
+    for table in tables:
+        selects.append('select * from "{}" where rowid in '.format(table)
+            + '(select id from "{}" '.format(rtree_table(table))
+            + "where max_lat >= {} and min_lat <= {} ".format(
+                params(lats[0]),params(lats[1]))
+            + "and max_lon >= {} and min_lon <= {})".format(
+                params(lons[0]),params(lons[1])))
+    return '({})'.format(' union all '.join(selects))
@@ -9,6 +9,11 @@ writing = False #  FLAG FOR OCEAN_BOX_TABLES
 from orm.ocean_box_tables import *
 from time_series import *
 from analysis import *
+import analysis
+from orm.obs_partitions import obs_source
+from orm.obs_summary import summary_values
+from orm.column_store import year_range
+from orm.query_params import Params
 
 def process_years(years):
     """Utility to handle different inputs for years and generate title of 
@@ -26,12 +31,23 @@ def obs_per_year(years,fig=None):
     """Get number of observations by year, add data to the fig, and return the 
     years and number data.
     """
-    date_min,date_max = process_years(years)
-    sql = "select strftime('%Y',date), count(name) "\
-    + "from obsdata "\
-    + "where date between '{}' and '{}' ".format(date_min,date_max) \
-    + "group by strftime('%Y',date);"
-    yrs, num = zip(*db_box.execute_sql(sql))
+    if analysis.column_store:
+        yrs, num = zip(*[(str(year),cols['name'].size) for year,cols in 
+            analysis.column_store.partitions(years,columns=['name'])])
+    elif analysis.summary_ready():
+        sql = "select cast(year as text), {count} ".format(**summary_values())\
+        + "from obssummary "\
+        + "where year between ? and ? "\
+        + "group by year;"
+        yrs, num = zip(*db_box.execute_sql(sql,
+            Params(year_range(years)).values))
+    else:
+        sql = "select cast(year as text), count(box) "\
+        + "from {} ".format(obs_source(db_box,years))\
+        + "where year between ? and ? "\
+        + "group by year;"
+        yrs, num = zip(*db_box.execute_sql(sql,
+            Params(year_range(years)).values))
 
     if not fig:
         plt.figure()
@@ -46,16 +62,35 @@ def obs_per_year(years,fig=None):
         plt.show()
     return yrs, num
 
+def distinct_sorted(values):
+    """Number of distinct values of a sorted array, 0 if it is empty."""
+    if not values.size:
+        return 0
+    return np.count_nonzero(np.diff(values))+1
+
 def boxes_per_year(years,fig=None):
     """Get number of boxes with (so far) any amount of data by year, add data to 
     the fig, and return the years and number data.
     """
-    date_min,date_max = process_years(years)
-    sql = "select strftime('%Y',date),count(distinct name) " \
-    + "from obsdata "\
-    + "where date between '{}' and '{}' ".format(date_min,date_max)\
-    + "group by strftime('%Y',date);"
-    yrs, num = zip(*db_box.execute_sql(sql))
+    if analysis.column_store:
+        # rows are sorted by box, so distinct boxes are changes of name
+        yrs, num = zip(*[(str(year),distinct_sorted(cols['name']))
+            for year,cols in 
+            analysis.column_store.partitions(years,columns=['name'])])
+    elif analysis.summary_ready():
+        sql = "select cast(year as text), count(distinct box) "\
+        + "from obssummary "\
+        + "where year between ? and ? "\
+        + "group by year;"
+        yrs, num = zip(*db_box.execute_sql(sql,
+            Params(year_range(years)).values))
+    else:
+        sql = "select cast(year as text),count(distinct box) " \
+        + "from {} ".format(obs_source(db_box,years))\
+        + "where year between ? and ? "\
+        + "group by year;"
+        yrs, num = zip(*db_box.execute_sql(sql,
+            Params(year_range(years)).values))
 
     if not fig:
         plt.figure()
@@ -0,0 +1,42 @@
+"""
+Fixtures of the tests: databases in temporary directories, configured through
+'orm/connections.py', so the tests never touch the project databases.
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from orm.connections import configure
+from orm.obs_partitions import PartitionWriter
+from orm.day_numbers import year_days
+
+obs_fields = ['box','lat_obs','lon_obs','sst','day','year','pentad','half_mth']
+
+@pytest.fixture
+def box_db(tmp_path):
+    """Box database in a temporary directory."""
+    database = configure('box',str(tmp_path/'ocean_box_data.db'))
+    yield database
+    database.close()
+
+@pytest.fixture
+def obs_db(tmp_path):
+    """ICOADS database in a temporary directory."""
+    database = configure('obs',str(tmp_path/'icoads.db'))
+    yield database
+    database.close()
+
+@pytest.fixture
+def write_obs():
+    """Function writing three observations of box 100001 in each of years,
+    sst 15, 16 and 17, to the partitions of a database.
+    """
+    def write(database,years):
+        with PartitionWriter(database,obs_fields,report=False) as writer:
+            for year in years:
+                day = year_days(year,year)[0]
+                writer.write([(100001,10.5,20.5,15.0+i,day+i,year,1,1)
+                    for i in range(3)])
+    return write
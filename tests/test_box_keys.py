@@ -0,0 +1,49 @@
+import numpy as np
+from orm.box_keys import box_key, box_indices, box_name, name_key, \
+    name_keys, key_stride
+from orm.obs_partitions import PartitionWriter
+from merge_box_obs import cluster_obs_data
+
+def test_key_round_trip():
+    last = key_stride - 1
+    for lat_index,lon_index in [(0,0),(739,1853),(0,last),(1999,last),
+            (-1,0),(-1,last),(-80,17)]:
+        key = box_key(lat_index,lon_index)
+        assert box_indices(key) == (lat_index,lon_index)
+        name = box_name(key)
+        assert name == '{}_{}'.format(lat_index,lon_index)
+        assert name_key(name) == key
+    assert box_key(739,1853) == 73901853
+
+def test_key_arrays():
+    lat_index = np.array([0,739,-1,-80])
+    lon_index = np.array([0,1853,key_stride-1,17])
+    keys = box_key(lat_index,lon_index)
+    rows,cols = box_indices(keys)
+    assert (rows == lat_index).all() and (cols == lon_index).all()
+    names = box_name(keys)
+    assert names == ['0_0','739_1853','-1_99999','-80_17']
+    assert name_keys(names) == keys.tolist()
+    assert name_keys(73901853) == [73901853]
+
+def schema(database,table):
+    sql = "select type, name, sql from sqlite_master where tbl_name = ? "\
+    + "order by type, name;"
+    return list(database.execute_sql(sql,(table,)))
+
+def test_cluster_keeps_schema(box_db):
+    fields = ['box','lat_obs','lon_obs','sst','day','year','pentad','half_mth']
+    rows = [(box,10.5,20.5,float(day),day,1970,1,1)
+        for day,box in [(3,200),(1,100),(2,200),(0,300),(2,100),(1,200)]]
+    with PartitionWriter(box_db,fields,report=False) as writer:
+        writer.write(rows)
+    table = 'obsdata_1970'
+    before = schema(box_db,table)
+    assert any(kind == 'index' for kind,_,_ in before)
+    cluster_obs_data(table)
+    assert schema(box_db,table) == before
+    stored = list(box_db.execute_sql('select box, day, sst from "{}" '
+        'order by rowid;'.format(table)))
+    assert stored == sorted((r[0],r[4],r[3]) for r in rows)
+    assert [row[0] for row in box_db.execute_sql('select id from "{}" '
+        'order by rowid;'.format(table))] == list(range(1,len(rows)+1))
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from orm import bulk_writer
+from orm.bulk_writer import BulkWriter, raw_connection
+
+def create_obs(database,sst_type='real'):
+    database.execute_sql('create table obs (box integer, day integer, '
+        'sst {});'.format(sst_type))
+    database.execute_sql('create index obs_box on obs (box);')
+
+def table_rows(database):
+    return list(database.execute_sql('select box, day, sst from obs '
+        'order by rowid;'))
+
+def index_names(database):
+    return [row[0] for row in database.execute_sql("select name from "
+        "sqlite_master where type = 'index' and tbl_name = 'obs';")]
+
+def test_batches_of_max_variables(box_db,monkeypatch):
+    create_obs(box_db)
+    # three rows of three columns per statement
+    monkeypatch.setattr(bulk_writer,'max_variables',lambda: 9)
+    inserts = list()
+    raw_connection(box_db).set_trace_callback(
+        lambda sql: inserts.append(sql) if sql.startswith('insert') else None)
+    rows = [(i,i+1,float(i)) for i in range(10)]
+    with BulkWriter(box_db,'obs',['box','day','sst'],report=False) as writer:
+        assert writer.rows_per_statement == 3
+        writer.write(rows)
+    raw_connection(box_db).set_trace_callback(None)
+    assert table_rows(box_db) == rows
+    assert writer.rows == 10
+    # three statements of three rows, and the single-row tail
+    assert [sql.count('),(') + 1 for sql in inserts] == [3,3,3,1]
+
+def test_buffer_flushed_at_buffer_rows(box_db):
+    create_obs(box_db)
+    writer = BulkWriter(box_db,'obs',['box','day','sst'],buffer_rows=4,
+        report=False)
+    writer.write([(i,i,0.) for i in range(5)])
+    assert writer.rows == 5 and not writer.buffer
+    writer.write([(5,5,0.)])
+    assert writer.rows == 5
+    writer.close()
+    assert len(table_rows(box_db)) == 6
+
+def test_deferred_indexes(box_db):
+    create_obs(box_db)
+    with BulkWriter(box_db,'obs',['box','day','sst'],defer_indexes=True,
+            report=False) as writer:
+        assert index_names(box_db) == []
+        writer.write([(1,1,1.)])
+    assert index_names(box_db) == ['obs_box']
+    # restored when the load fails too
+    with pytest.raises(RuntimeError):
+        with BulkWriter(box_db,'obs',['box','day','sst'],defer_indexes=True,
+                report=False):
+            raise RuntimeError
+    assert index_names(box_db) == ['obs_box']
+
+def test_scaled_columns(box_db):
+    create_obs(box_db,'int')
+    box_db.execute_sql('alter table obs add column date text;')
+    with BulkWriter(box_db,'obs',['box','day','sst','date'],
+            report=False) as writer:
+        assert writer.scaled == [(2,10)]
+        writer.write_columns([np.array([1,2]),np.array([10,11]),
+            np.array([18.3,-0.5]),
+            np.array(['1861-01-02','NaT'],dtype='datetime64[D]')])
+        writer.write([(3,12,7.25,None)])
+    assert list(box_db.execute_sql('select box, day, sst, date from obs;')) \
+        == [(1,10,183,'1861-01-02'),(2,11,-5,None),(3,12,72,None)]
+
+def test_rollback_of_enclosing_transaction(box_db):
+    create_obs(box_db)
+    with pytest.raises(RuntimeError):
+        with box_db.atomic():
+            with BulkWriter(box_db,'obs',['box','day','sst'],
+                    report=False) as writer:
+                writer.write([(1,1,1.),(2,2,2.)])
+                writer.flush()
+                raise RuntimeError
+    assert table_rows(box_db) == []
+    # counted when flushed, though rolled back
+    assert writer.rows == 2
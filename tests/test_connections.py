@@ -0,0 +1,53 @@
+import os
+import pytest
+from peewee import OperationalError
+from orm import connections
+from orm.connections import configure, forget_connections
+from orm.bulk_writer import raw_connection
+
+def pragma(database,name):
+    return list(database.execute_sql('pragma {};'.format(name)))[0][0]
+
+def test_modes(box_db):
+    box_db.execute_sql('create table t (x integer);')
+    assert pragma(box_db,'journal_mode') == 'wal'
+    assert pragma(box_db,'query_only') == 0
+    assert pragma(box_db,'synchronous') == 0
+    path = connections.settings['box'][0]
+    for mode in ('read','immutable'):
+        database = configure('box',path,mode=mode)
+        assert database is box_db
+        assert pragma(database,'query_only') == 1
+        assert pragma(database,'cache_size') == -256*1024
+        with pytest.raises(OperationalError):
+            database.execute_sql('insert into t values (1);')
+    configure('box',path)
+    box_db.execute_sql('insert into t values (1);')
+    assert pragma(box_db,'query_only') == 0
+
+def test_unknown_mode(box_db):
+    with pytest.raises(ValueError):
+        configure('box',connections.settings['box'][0],mode='append')
+
+def test_forget_connections(box_db):
+    conn = raw_connection(box_db)
+    forget_connections()
+    assert box_db.is_closed()
+    # the next query opens a connection of its own
+    assert raw_connection(box_db) is not conn
+    assert pragma(box_db,'journal_mode') == 'wal'
+    conn.close()
+
+@pytest.mark.skipif(not hasattr(os,'fork'),reason='no fork')
+def test_fork_drops_connections(box_db):
+    conn = raw_connection(box_db)
+    read,write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # child: a connection of its own, not the parent's
+        ok = box_db.is_closed() and raw_connection(box_db) is not conn
+        os.write(write,b'1' if ok else b'0')
+        os._exit(0)
+    os.waitpid(pid,0)
+    assert os.read(read,1) == b'1'
+    assert raw_connection(box_db) is conn
@@ -0,0 +1,48 @@
+import json
+import os
+import numpy as np
+from create_icoads_database import get_value
+from icoads3.imma_columns import RecordLayout, MISSING
+from icoads3.synthetic_imma import synthetic_lines
+
+dictionary_file = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))),'icoads3','lib','stored_dictionary.json')
+
+def load_dictionary():
+    with open(dictionary_file,'r') as f:
+        return json.load(f)
+
+def line_value(s,key,d):
+    """Value of a string of get_value(), as the columnar parser returns it."""
+    if d[key.upper()]['type'] == 'text':
+        return s
+    if key in ('lat','lon','sst'):
+        return float(s) if s else np.nan
+    return int(s) if s else MISSING
+
+def test_columns_match_line_parser():
+    d = load_dictionary()
+    keys = ['lat','lon','sst','yr','mo','dy','hr','id']
+    buf = synthetic_lines(d,2000,1864,2)
+    cols = RecordLayout(keys,d).parse(np.frombuffer(buf,dtype=np.uint8))
+    lines = buf.decode('latin-1').splitlines()
+    assert all(len(cols[key]) == len(lines) for key in keys)
+    for i,line in enumerate(lines):
+        expected = [line_value(s,k,d) for s,k in zip(get_value(keys,line,d),keys)]
+        found = [cols[key][i] for key in keys]
+        np.testing.assert_equal(found,expected)
+
+def test_attachment_matches_extract_line():
+    d = load_dictionary()
+    keys = ['sst','dck','sid']
+    layout = RecordLayout(keys,d)
+    buf = synthetic_lines(d,500,1861,7,seed=1)
+    cols = layout.parse(np.frombuffer(buf,dtype=np.uint8))
+    for i,line in enumerate(buf.decode('latin-1').splitlines()):
+        values = layout.extract_line(line)
+        for key,value in zip(keys,values):
+            if value is None:
+                assert np.isnan(cols[key][i]) if key == 'sst' \
+                    else cols[key][i] == MISSING
+            else:
+                assert cols[key][i] == value
@@ -0,0 +1,45 @@
+import numpy as np
+from orm.icoads_data_tables import IngestManifest, ObsHash
+from icoads3.imma_duplicates import DuplicateIndex, record_hashes
+
+def manifest(database,filename):
+    database.create_tables([IngestManifest,ObsHash],safe=True)
+    return IngestManifest.create(filename=filename,size=0,mtime=0.,
+        checksum='').id
+
+def columns(ids,ssts):
+    n = len(ids)
+    return {'hr':np.full(n,12),'lat':np.full(n,10.25),'lon':np.full(n,200.5),
+        'id':np.array(ids),'sst':np.array(ssts)}
+
+def test_record_hashes():
+    dates = np.array(['1861-01-02']*4,dtype='datetime64[D]')
+    h = record_hashes(columns(['A','A','B','A'],[15.,15.,15.,15.1]),dates)
+    assert h.dtype == np.int64
+    assert h[0] == h[1] and len(set(h.tolist())) == 3
+    other_day = record_hashes(columns(['A'],[15.]),
+        np.array(['1861-01-03'],dtype='datetime64[D]'))
+    assert other_day[0] != h[0]
+
+def test_duplicates_dropped(obs_db):
+    first = manifest(obs_db,'d186101.dat')
+    index = DuplicateIndex(obs_db,ObsHash)
+    # duplicates within a batch: the first occurrence is kept
+    keep = index.add(np.array([5,7,5,9,7],dtype=np.int64),first)
+    assert keep.tolist() == [True,True,False,True,False]
+    # against the hashes stored before, from another file
+    second = manifest(obs_db,'d186102.dat')
+    keep = index.add(np.array([11,7,11,12],dtype=np.int64),second)
+    assert keep.tolist() == [True,False,False,True]
+    assert dict(obs_db.execute_sql('select hash, source_file_id from obshash '
+        'order by hash;')) == {5:first,7:first,9:first,11:second,12:second}
+
+def test_lookup_batches(obs_db):
+    source = manifest(obs_db,'d186101.dat')
+    index = DuplicateIndex(obs_db,ObsHash)
+    index.batch = 3
+    hashes = np.arange(-5,5,dtype=np.int64)
+    assert index.add(hashes,source).all()
+    assert sorted(index.known(np.arange(-10,10,dtype=np.int64)).tolist()) \
+        == hashes.tolist()
+    assert not index.add(hashes[::-1],source).any()
@@ -0,0 +1,54 @@
+import json
+import os
+import numpy as np
+from icoads3.imma_qc import BatchQC, reject_reasons
+
+dictionary_file = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))),'icoads3','lib','stored_dictionary.json')
+
+nan = np.nan
+
+# records, with the reason of the first check they fail, None if they pass:
+# bad date, lat, lon, sst
+records = [
+    (False,10.,20.,15.,None),
+    (True,nan,20.,nan,'bad_date'),
+    (True,95.,20.,99.,'bad_date'),
+    (False,nan,20.,nan,'missing_position'),
+    (False,10.,nan,120.,'missing_position'),
+    (False,95.,20.,nan,'missing_sst'),
+    (False,95.,400.,120.,'lat_range'),
+    (False,-90.,-180.,120.,'lon_range'),
+    (False,90.,359.99,-99.95,'sst_range'),
+    (False,-90.,-179.99,-99.9,None),
+]
+
+def batch():
+    with open(dictionary_file,'r') as f:
+        d = json.load(f)
+    bad_dates = np.array([r[0] for r in records])
+    cols = dict((key,np.array([r[i] for r in records]))
+        for i,key in enumerate(['lat','lon','sst'],1))
+    buf = b''.join('line {}\n'.format(i).encode()
+        for i in range(len(records)))
+    return d,cols,bad_dates,np.frombuffer(buf,dtype=np.uint8)
+
+def test_first_failed_check():
+    d,cols,bad_dates,_ = batch()
+    codes = BatchQC(d).check(cols,bad_dates)
+    reasons = [reject_reasons[c-1] if c else None for c in codes]
+    assert reasons == [r[-1] for r in records]
+
+def test_tally_and_sample():
+    d,cols,bad_dates,buf = batch()
+    qc = BatchQC(d,sample_rate=1.,seed=0)
+    codes = qc.check(cols,bad_dates)
+    tally = qc.tally(codes)
+    assert sorted(tally) == sorted(reject_reasons)
+    assert tally == dict((reason,sum(r[-1] == reason for r in records))
+        for reason in reject_reasons)
+    # every rejected line, with its reason
+    samples = qc.sample(buf,codes)
+    assert samples == [(r[-1],'line {}'.format(i))
+        for i,r in enumerate(records) if r[-1]]
+    assert BatchQC(d).sample(buf,codes) == []
@@ -0,0 +1,32 @@
+import io
+import tarfile
+import pytest
+from icoads3 import imma_sources
+from icoads3.imma_sources import open_sources, source_checksum, join_source
+
+def write_archive(path,members):
+    with tarfile.open(str(path),'w:gz') as tar:
+        for name,data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info,io.BytesIO(data))
+
+def test_archive_checksum_computed_once(tmp_path,monkeypatch):
+    write_archive(tmp_path/'a.tar.gz',{'d186101.dat':b'x\n','d186102.dat':b'y\n'})
+    calls = list()
+    checksum = imma_sources.file_checksum
+    monkeypatch.setattr(imma_sources,'file_checksum',
+        lambda path: calls.append(path) or checksum(path))
+    location = str(tmp_path)+'/'
+    sums = [source_checksum(location,join_source('a.tar.gz',member))
+        for member in ['d186101.dat','d186102.dat']]
+    assert sums[0] == sums[1] and len(calls) == 1
+
+def test_missing_member(tmp_path):
+    write_archive(tmp_path/'a.tar.gz',{'d186101.dat':b'x\n'})
+    sources = [join_source('a.tar.gz',m) for m in ['d186101.dat','d186102.dat']]
+    read = list()
+    with pytest.raises(FileNotFoundError,match='d186102.dat'):
+        for source,f in open_sources(str(tmp_path)+'/',sources):
+            read.append((source,f.read()))
+    assert read == [(sources[0],b'x\n')]
@@ -0,0 +1,53 @@
+import gzip
+import os
+import shutil
+import pytest
+import create_icoads_database as cid
+from orm.connections import configure
+from orm.icoads_data_tables import IngestManifest, IcoadsData
+from icoads3.imma_qc import reject_reasons
+from icoads3.synthetic_imma import write_synthetic_file
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def data_files(tmp_path,monkeypatch):
+    """Two plain monthly files, and a compressed copy of the first under
+    another name, all of whose records are duplicates.
+    """
+    # load_dict() reads the dictionary relative to the repository
+    monkeypatch.chdir(repository)
+    location = tmp_path/'icoads'
+    d = cid.load_dict()
+    first = write_synthetic_file(str(location),d,1864,2,3000,seed=1)
+    write_synthetic_file(str(location),d,1864,3,2000,seed=2)
+    copy = first.replace('c00000000000000.dat','c11111111111111.dat.gz')
+    with open(first,'rb') as f, gzip.open(copy,'wb') as g:
+        shutil.copyfileobj(f,g)
+    monkeypatch.setattr(cid,'data_location',str(location)+'/')
+    return cid.imma_data_files()
+
+def run_ingest(path,data_files,processes):
+    configure('obs',path)
+    # small chunks: several byte ranges and chunks per file
+    counts = cid.ingest(data_files,max_memory=1024*1024,processes=processes)
+    db_obs = configure('obs',path)
+    manifest = [(e.filename,e.lines,e.rows,e.errors,e.status)
+        for e in IngestManifest.select().order_by(IngestManifest.filename)]
+    rows = IcoadsData.select().count()
+    db_obs.close()
+    return counts,manifest,rows
+
+def test_serial_and_parallel_ingest_agree(tmp_path,data_files):
+    assert len(data_files) == 3
+    serial = run_ingest(str(tmp_path/'serial.db'),data_files,1)
+    parallel = run_ingest(str(tmp_path/'parallel.db'),data_files,2)
+    assert serial == parallel
+    counts,manifest,rows = serial
+    assert counts['lines'] == 8000
+    assert counts['errors'] == sum(counts[r] for r in reject_reasons) > 0
+    assert counts['lines'] == rows + counts['errors'] + counts['duplicates']
+    assert rows == sum(entry[2] for entry in manifest)
+    assert all(entry[4] == 'complete' for entry in manifest)
+    # the compressed copy of the first file
+    assert [entry[2] for entry in manifest if entry[0].endswith('.gz')] == [0]
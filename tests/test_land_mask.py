@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+pytest.importorskip('matplotlib')
+from land_mask import LandMask, cached_land_mask, sea
+
+def star(center,radius,points=7):
+    """Concave polygon, a star around center."""
+    angles = np.linspace(0,2*np.pi,2*points,endpoint=False)
+    radii = np.where(np.arange(2*points) % 2,radius/2.5,radius)
+    return np.column_stack((center[0] + radii*np.cos(angles),
+        center[1] + radii*np.sin(angles)))
+
+# disjoint land polygons, in map coordinates
+polygons = [
+    star((2.0e6,2.0e6),1.5e6),
+    np.array([[4.0e6,0.5e6],[7.5e6,0.8e6],[6.0e6,3.5e6]]),
+    np.array([[0.5e6,4.5e6],[3.0e6,4.5e6],[3.0e6,5.0e6],[1.0e6,5.0e6],
+        [1.0e6,7.0e6],[0.5e6,7.0e6]]),
+]
+
+def exact_ids(mask,pts):
+    ids = np.full(len(pts),sea)
+    for index in range(len(mask.paths)-1,-1,-1):
+        ids[mask.paths[index].contains_points(pts)] = index
+    return ids
+
+def random_points(n,seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-0.5e6,8.0e6,(n,2))
+
+def test_polygon_ids_match_paths():
+    mask = LandMask(polygons,cells=256)
+    pts = random_points(50000)
+    ids = mask.polygon_ids(pts)
+    assert (ids == exact_ids(mask,pts)).all()
+    assert set(ids.tolist()) == {sea,0,1,2}
+
+def test_land_counts_match_paths():
+    ocean_grid_overlay = pytest.importorskip('ocean_grid_overlay')
+    mask = LandMask(polygons,cells=256)
+    # boxes of four vertices, many across the coasts
+    corners = random_points(5000,seed=1)
+    pts = np.stack([corners + offset for offset in
+        ([0,0],[2.0e5,0],[2.0e5,2.0e5],[0,2.0e5])],axis=1)
+    counts = mask.land_counts(pts)
+    assert (counts == ocean_grid_overlay.land_counts(pts,mask.paths)).all()
+    assert 0 < np.count_nonzero(counts == 4) < len(counts)
+    assert np.count_nonzero((counts > 0) & (counts < 4))
+
+def test_cached_mask(tmp_path):
+    path = str(tmp_path/'land_mask.npz')
+    mask = cached_land_mask(polygons,path,cells=128)
+    cached = cached_land_mask(polygons,path,cells=128)
+    assert (cached.raster == mask.raster).all()
+    # other polygons: rebuilt
+    moved = [p + 1.0e5 for p in polygons]
+    rebuilt = cached_land_mask(moved,path,cells=128)
+    pts = random_points(2000)
+    assert (rebuilt.polygon_ids(pts) == exact_ids(rebuilt,pts)).all()
+
+def test_cached_mask_of_other_cells(tmp_path):
+    path = str(tmp_path/'land_mask.npz')
+    coarse = cached_land_mask(polygons,path,cells=64)
+    fine = cached_land_mask(polygons,path,cells=256)
+    assert fine.raster.shape != coarse.raster.shape
+    assert fine.cell == pytest.approx(coarse.cell/4)
+    assert (cached_land_mask(polygons,path,cells=256).raster
+        == fine.raster).all()
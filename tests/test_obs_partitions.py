@@ -0,0 +1,44 @@
+from orm.ocean_box_tables import ObsData
+from orm.obs_partitions import obs_tables, obs_source, drop_partitions, \
+    migrate_unpartitioned
+from orm.day_numbers import year_days
+
+def legacy_obs(database,years):
+    """Unpartitioned table with three observations of box 100001 in each of
+    years, as merged before partitioning.
+    """
+    database.create_tables([ObsData])
+    columns = ['box','lat_obs','lon_obs','sst','day','year','pentad','half_mth']
+    sql = 'insert into obsdata ({}) values ({});'.format(','.join(columns),
+        ','.join('?'*len(columns)))
+    for year in years:
+        day = year_days(year,year)[0]
+        for i in range(3):
+            database.execute_sql(sql,(100001,10.5,20.5,15.0+i,day+i,year,1,1))
+
+def year_counts(database):
+    sql = "select year, count(*) from {} group by year;".format(
+        obs_source(database))
+    return dict(database.execute_sql(sql))
+
+def test_legacy_table_is_read(box_db):
+    legacy_obs(box_db,[1855,1865])
+    assert obs_tables(box_db) == ['obsdata']
+    assert year_counts(box_db) == {1855:3, 1865:3}
+
+def test_partial_reload_keeps_legacy_decades(box_db,write_obs):
+    legacy_obs(box_db,[1855,1865])
+    assert migrate_unpartitioned(box_db) == ['obsdata_1850','obsdata_1860']
+    # a reload of the 1860s, as icoads_to_boxes()
+    drop_partitions(box_db,[1860])
+    write_obs(box_db,[1866])
+    assert obs_tables(box_db) == ['obsdata_1850','obsdata_1860']
+    assert year_counts(box_db) == {1855:3, 1866:3}
+    sql = "select sum(sst) from {} where year = 1855;".format(
+        obs_source(box_db))
+    assert list(box_db.execute_sql(sql))[0][0] == 48.0
+
+def test_migration_without_legacy_table(box_db,write_obs):
+    write_obs(box_db,[1855])
+    assert migrate_unpartitioned(box_db) == []
+    assert year_counts(box_db) == {1855:3}
@@ -0,0 +1,21 @@
+from orm.obs_summary import update_summary, summary_exists
+
+def summary_counts(database):
+    sql = "select year, sum(obs_count) from obssummary group by year;"
+    return dict(database.execute_sql(sql))
+
+def test_first_update_covers_all_years(box_db,write_obs):
+    write_obs(box_db,[1855,1865])
+    assert not summary_exists(box_db)
+    # a reload of the 1860s on a database without a summary
+    update_summary(box_db,(1860,1869))
+    assert summary_counts(box_db) == {1855:3, 1865:3}
+
+def test_update_replaces_years(box_db,write_obs):
+    write_obs(box_db,[1855,1865])
+    update_summary(box_db)
+    write_obs(box_db,[1866])
+    update_summary(box_db,(1860,1869))
+    assert summary_counts(box_db) == {1855:3, 1865:3, 1866:3}
+    sql = "select sum(sst_sum)/sum(obs_count) from obssummary where year = ?;"
+    assert list(box_db.execute_sql(sql,(1855,)))[0][0] == 16.0
@@ -0,0 +1,15 @@
+import pytest
+
+pytest.importorskip('mpl_toolkits.basemap')
+
+from ocean_grid_overlay import ocean_grid
+from orm.ocean_box_tables import Box, Latitude, Longitude
+from orm.box_keys import box_indices
+
+def test_ocean_grid_narrow_band(box_db):
+    # rows of 100 km boxes are 0.8993 degrees high: 30, 30.9, ..., 33.6
+    ocean_grid(lat_0=30.,del_lat=4.)
+    assert Latitude.select().count() == 5
+    keys = [b.box_id for b in Box.select(Box.box_id)]
+    assert keys and len(keys) == Longitude.select().count()
+    assert set(box_indices(k)[0] for k in keys) == set(range(5))
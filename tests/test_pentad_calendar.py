@@ -0,0 +1,54 @@
+import os
+from datetime import date, timedelta
+import numpy as np
+from create_icoads_database import get_pentad
+from icoads3 import pentad_calendar
+from icoads3.create_dictionary import load_yearly_intervals
+
+intervals_file = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))),'icoads3','lib',
+    'yearly_time_intervals_store.json')
+
+def lookup_pentads(d,day):
+    """Pentads and dates of the half-month of a day, as looked up before the
+    day-of-year tables.
+    """
+    m = day.month
+    for mth in [m,m-1,m+1]:
+        d_month = d.get(str(mth),{})
+        for half_month in d_month:
+            dates = d_month[half_month]['dates']
+            if dates[0] <= day <= dates[1]:
+                return d_month[half_month]['pentads'],dates,int(half_month)
+
+def reference_pentad(d,day):
+    """Pentad and half-month of a day, as get_pentad() assigned them before
+    the day-of-year tables.
+    """
+    day = day.replace(year=2016)
+    pentads,dates,half_month = lookup_pentads(d,day)
+    for p in range(len(pentads)-1):
+        beg = dates[0] + p*timedelta(days=5)
+        if beg <= day <= beg + timedelta(days=4):
+            return pentads[p],half_month
+    return pentads[-1],half_month
+
+def year_dates(year):
+    first = date(year,1,1)
+    return [first + timedelta(days=i)
+        for i in range((date(year+1,1,1) - first).days)]
+
+def test_tables_match_interval_lookup():
+    d = load_yearly_intervals(intervals_file)
+    for year in (1861,1864,1900,2000):
+        days = year_dates(year)
+        expected = [reference_pentad(d,day) for day in days]
+        dates = np.array(days,dtype='datetime64[D]')
+        assert list(zip(pentad_calendar.pentads(dates).tolist(),
+            pentad_calendar.half_months(dates).tolist())) == expected
+        assert [get_pentad(day) for day in days] == [p for p,_ in expected]
+
+def test_half_month_pentads():
+    for pentad in range(1,74):
+        half_month = pentad_calendar.pentad_half_months(pentad)
+        assert pentad in pentad_calendar.half_month_pentads(half_month)
@@ -0,0 +1,29 @@
+from orm import scaled_values
+from orm.obs_partitions import create_partition
+from orm.scaled_values import stored_scales
+
+def write_row(model,sst):
+    model.create(box=100001,lat_obs=10.25,lon_obs=-20.5,sst=sst,day=0,
+        year=1865,pentad=1,half_mth=1)
+
+def test_scaled_table_read_without_flag(box_db,monkeypatch):
+    monkeypatch.setattr(scaled_values,'scaled_storage',True)
+    model = create_partition(box_db,1860)
+    # the flag is off in the process reading the table
+    monkeypatch.setattr(scaled_values,'scaled_storage',False)
+    assert stored_scales(box_db,model) == {'lat_obs':100,'lon_obs':100,
+        'sst':10}
+    write_row(model,18.3)
+    assert list(box_db.execute_sql('select sst, lat_obs from obsdata_1860;'))\
+        == [(183,1025)]
+    row = model.select().where(model.sst > 18.0).get()
+    assert (row.sst,row.lat_obs,row.lon_obs) == (18.3,10.25,-20.5)
+
+def test_float_table(box_db,monkeypatch):
+    monkeypatch.setattr(scaled_values,'scaled_storage',False)
+    model = create_partition(box_db,1850)
+    assert stored_scales(box_db,model) == {}
+    write_row(model,18.3)
+    assert list(box_db.execute_sql('select sst from obsdata_1850;')) \
+        == [(18.3,)]
+    assert model.select().where(model.sst < 18.5).get().sst == 18.3
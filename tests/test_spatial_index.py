@@ -0,0 +1,54 @@
+import pytest
+from orm.ocean_box_tables import Box, Latitude, Longitude
+from orm.spatial_index import build_box_extents, box_extents_exist, \
+    rtree_available
+from merge_box_obs import box_lookup
+
+pytestmark = pytest.mark.skipif(not rtree_available(),reason='no R*Tree')
+
+# latitudes of the rows, and the last upper bound
+lat_boxes = [-10.,-5.,0.,5.,10.]
+
+def row_lons(row):
+    """Longitudes of the boxes of a row, east edges, up to the antimeridian;
+    rows have different widths, and edges not exact in binary.
+    """
+    step = 360./(7+row)
+    return [-180.+step*(i+1) for i in range(7+row)]
+
+@pytest.fixture
+def grid(box_db):
+    box_db.create_tables([Box,Latitude,Longitude])
+    for index,lat in enumerate(lat_boxes):
+        box_db.execute_sql('insert into latitude (lat_box, lat_index) '
+            'values (?,?);',(lat,index))
+    for row in range(len(lat_boxes)-1):
+        for i,lon in enumerate(row_lons(row)):
+            box_db.execute_sql('insert into longitude (box_id, lon_box, '
+                'lon_index, lat_index_id) values (?,?,?,?);',
+                (row*100000+i,lon,i+1,row))
+    return box_db
+
+def lookup(lat,lon):
+    try:
+        return box_lookup(lat,lon)
+    except LookupError:
+        return None
+
+def test_rtree_matches_fallback(grid):
+    lats = sorted(set(lat_boxes + [v+d for v in lat_boxes
+        for d in (-1e-9,1e-9)] + [-7.5,2.5,7.5]))
+    lons = [-180.,-179.9,180.,179.999,0.]
+    for row in range(len(lat_boxes)-1):
+        lons.extend(v+d for v in row_lons(row) for d in (-1e-9,0.,1e-9))
+    points = [(lat,lon) for lat in lats for lon in lons]
+    assert not box_extents_exist(grid)
+    fallback = [lookup(lat,lon) for lat,lon in points]
+    assert build_box_extents(grid) == sum(len(row_lons(r)) for r in range(4))
+    assert box_extents_exist(grid)
+    found = [lookup(lat,lon) for lat,lon in points]
+    assert found == fallback
+    # boxes found on both sides of edges, none outside the grid
+    assert sum(f is None for f in found) < len(found)//2
+    assert lookup(10.,0.) is None and lookup(-10.,0.) == (0,3)
+    assert lookup(0.,-180.) == (2,0) and lookup(0.,180.) is None